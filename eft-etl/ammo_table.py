@@ -0,0 +1,290 @@
+from operator import itemgetter
+import numpy as np
+
+# --- ESQUEMA DE LA TABLA COLUMNAR ---
+# Campos numéricos del registro aplanado (Item + Ammo de e.py) y su tipo en la tabla.
+NUMERIC_FIELDS = {
+    'basePrice': np.int64,
+    'projectileCount': np.int64,
+    'damage': np.int64,
+    'armorDamage': np.int64,
+    'fragmentationChance': np.float64,
+    'penetrationChance': np.float64,
+    'penetrationPower': np.int64,
+    'penetrationPowerDeviation': np.float64,
+    'accuracyModifier': np.float64,
+    'recoilModifier': np.float64,
+    'lightBleedModifier': np.float64,
+    'heavyBleedModifier': np.float64,
+    'staminaBurnPerDamage': np.float64,
+    'finalScore': np.float64,
+    'normalized': np.float64,
+}
+# Tipos que se guardan directamente en las columnas numéricas (bool, None, textos... no)
+_NUMBER_TYPES = {int, float}
+# Textos con pocos valores distintos: se guardan como códigos + lista de valores únicos
+CATEGORY_FIELDS = ('ammoType', 'caliber', 'tier')
+# Listas de ofertas (Trade): se guardan aplanadas con un array de offsets por bala
+TRADE_FIELDS = ('buyFor', 'sellFor')
+TRADE_NUMERIC_FIELDS = ('price', 'priceRUB')
+TRADE_CATEGORY_FIELDS = ('currency', 'source')
+# Columna interna con el índice (dentro de buyFor) de la oferta más barata, -1 si no hay
+MIN_BUY_FIELD = 'minBuyOffer'
+
+
+def _intern(values: list) -> tuple[np.ndarray, list]:
+    """Convierte una lista de textos en (códigos int32, valores únicos)."""
+    categories = list(dict.fromkeys(values))
+    lookup = {value: code for code, value in enumerate(categories)}
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=np.int32, count=len(values))
+    return codes, categories
+
+
+class AmmoTable:
+    """
+    Representación columnar de la lista de municiones aplanada.
+
+    - Campos numéricos en arrays de NumPy con tipo fijo.
+    - 'ammoType', 'caliber' y 'tier' como códigos + valores únicos (internados).
+    - 'buyFor'/'sellFor' aplanados: un array de offsets por bala y columnas por campo.
+    - Cualquier otro campo (id, name, iconLink...) en una lista de Python.
+    - Valores no numéricos en un campo numérico (None, textos...): NaN en la columna,
+      y el valor original aparte para devolverlo tal cual.
+
+    Solo se convierte a diccionarios al llegar a MongoDB (iter_records / to_records).
+    """
+
+    def __init__(self, size: int = 0):
+        self.size = size
+        self.columns = {}      # nombre -> np.ndarray (numéricos y códigos de categoría) o list
+        self.categories = {}   # nombre -> lista de valores únicos
+        self.trades = {}       # 'buyFor'/'sellFor' -> {'offsets': ..., 'price': ..., ...}
+        self.field_order = []  # Orden de los campos al volver a diccionario
+        self.raw = {}          # nombre -> {fila: valor original} de las celdas no numéricas
+
+    def __len__(self) -> int:
+        return self.size
+
+    # --- CONSTRUCCIÓN ---
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "AmmoTable":
+        """Construye la tabla a partir de la lista de diccionarios aplanados."""
+        table = cls(len(records))
+        if not records:
+            return table
+
+        for field in records[0]:
+            try:
+                values = list(map(itemgetter(field), records))
+            except KeyError:
+                values = [record.get(field) for record in records]
+            if field in TRADE_FIELDS:
+                table._set_trades(field, values)
+            elif field in CATEGORY_FIELDS:
+                table.set_category(field, values)
+            elif field in NUMERIC_FIELDS:
+                table._set_numeric(field, values)
+            elif field == 'minBuyPrice':
+                # Se recalcula en tl.calculate_finalScore a partir de buyFor
+                continue
+            else:
+                table.set_column(field, values)
+        return table
+
+    def _set_numeric(self, field: str, values: list):
+        if set(map(type, values)) <= _NUMBER_TYPES:
+            self.set_column(field, np.array(values, dtype=NUMERIC_FIELDS[field]))
+            return
+        # np.array(..., int64) falla con None y convierte "50" en 50: esas celdas quedan
+        # como NaN (puntúan 0, como el TypeError de la vía de listas) y se guarda el original
+        raw = {row: value for row, value in enumerate(values) if type(value) not in _NUMBER_TYPES}
+        self.set_column(field, np.array([float(value) if isinstance(value, (int, float)) else np.nan
+                                         for value in values], dtype=np.float64))
+        self.raw[field] = raw
+
+    def _set_trades(self, field: str, values: list):
+        lengths = [len(trades or []) for trades in values]
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        flat = [trade for trades in values for trade in (trades or [])]
+        trade_columns = {'offsets': offsets}
+        for name in TRADE_NUMERIC_FIELDS:
+            trade_columns[name] = np.array(list(map(itemgetter(name), flat)), dtype=np.int64)
+        for name in TRADE_CATEGORY_FIELDS:
+            trade_columns[name] = _intern(list(map(itemgetter(name), flat)))
+
+        self.trades[field] = trade_columns
+        self._remember(field)
+
+    def _remember(self, field: str):
+        if field not in self.field_order:
+            self.field_order.append(field)
+
+    # --- ACCESO Y MODIFICACIÓN DE COLUMNAS ---
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.columns or field in self.trades
+
+    def column(self, field: str):
+        """Array (o lista) de la columna. Para categorías, sus códigos."""
+        return self.columns[field]
+
+    def set_column(self, field: str, values):
+        self.columns[field] = values
+        self.raw.pop(field, None)
+        self._remember(field)
+
+    def raw_mask(self, fields) -> np.ndarray:
+        """Filas con algún valor no numérico (None, texto, bool...) en alguno de 'fields'."""
+        mask = np.zeros(self.size, dtype=bool)
+        for field in fields:
+            mask[list(self.raw.get(field, ()))] = True
+        return mask
+
+    def strings(self, field: str) -> list:
+        """Valores de una columna de categoría, ya decodificados."""
+        categories = self.categories[field]
+        return [categories[code] for code in self.columns[field].tolist()]
+
+    def set_category(self, field: str, values: list):
+        codes, categories = _intern(values)
+        self.columns[field] = codes
+        self.categories[field] = categories
+        self._remember(field)
+
+    def map_category(self, field: str, func) -> np.ndarray:
+        """
+        Aplica 'func' a cada valor único de una categoría (no a cada fila) y vuelve a
+        internar el resultado. Retorna la máscara de filas cuyo valor cambió.
+        """
+        old_categories = self.categories[field]
+        new_values = [func(value) for value in old_categories]
+        changed = np.array([old != new for old, new in zip(old_categories, new_values)], dtype=bool)
+
+        remap, categories = _intern(new_values)
+        codes = self.columns[field]
+        self.columns[field] = remap[codes] if len(remap) else codes
+        self.categories[field] = categories
+        return changed[codes] if len(changed) else np.zeros(self.size, dtype=bool)
+
+    def trade_owners(self, field: str) -> np.ndarray:
+        """Para cada oferta aplanada de 'field', el índice de la bala a la que pertenece."""
+        offsets = self.trades[field]['offsets']
+        return np.repeat(np.arange(self.size), np.diff(offsets))
+
+    def take(self, order: np.ndarray) -> "AmmoTable":
+        """Nueva tabla con las filas en el orden indicado."""
+        order = np.asarray(order, dtype=np.int64)
+        table = AmmoTable(len(order))
+        table.field_order = list(self.field_order)
+        table.categories = dict(self.categories)
+        rows = order.tolist()
+        for field, raw in self.raw.items():
+            table.raw[field] = {new: raw[old] for new, old in enumerate(rows) if old in raw}
+
+        for field, values in self.columns.items():
+            if isinstance(values, np.ndarray):
+                table.columns[field] = values[order]
+            else:
+                table.columns[field] = [values[i] for i in rows]
+
+        for field, trade_columns in self.trades.items():
+            offsets = trade_columns['offsets']
+            starts, ends = offsets[:-1][order], offsets[1:][order]
+            lengths = ends - starts
+            new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=new_offsets[1:])
+            # Índices de las ofertas en el nuevo orden
+            flat = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+
+            reordered = {'offsets': new_offsets}
+            for name in TRADE_NUMERIC_FIELDS:
+                reordered[name] = trade_columns[name][flat]
+            for name in TRADE_CATEGORY_FIELDS:
+                codes, categories = trade_columns[name]
+                reordered[name] = (codes[flat], categories)
+            table.trades[field] = reordered
+
+            if field == 'buyFor' and MIN_BUY_FIELD in self.columns:
+                # El índice de la oferta más barata es global: lo pasamos al nuevo orden
+                local = self.columns[MIN_BUY_FIELD][order] - starts
+                table.columns[MIN_BUY_FIELD] = np.where(local >= 0, new_offsets[:-1] + local, -1)
+        return table
+
+    # --- CONVERSIÓN A DICCIONARIOS (frontera con MongoDB) ---
+
+    def _trade_lists(self, field: str, start: int, stop: int) -> list[list[dict]]:
+        trade_columns = self.trades[field]
+        offsets = trade_columns['offsets']
+        first, last = int(offsets[start]), int(offsets[stop])
+
+        values = {name: trade_columns[name][first:last].tolist() for name in TRADE_NUMERIC_FIELDS}
+        for name in TRADE_CATEGORY_FIELDS:
+            codes, categories = trade_columns[name]
+            values[name] = [categories[code] for code in codes[first:last].tolist()]
+
+        result = []
+        bounds = (offsets[start:stop + 1] - first).tolist()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            result.append([
+                {'price': values['price'][k], 'currency': values['currency'][k],
+                 'priceRUB': values['priceRUB'][k], 'source': values['source'][k]}
+                for k in range(a, b)
+            ])
+        return result
+
+    def _min_buy_prices(self, start: int, stop: int) -> list[dict]:
+        trade_columns = self.trades['buyFor']
+        currency_codes, currencies = trade_columns['currency']
+        source_codes, sources = trade_columns['source']
+
+        result = []
+        for offer in self.columns[MIN_BUY_FIELD][start:stop].tolist():
+            if offer >= 0:
+                result.append({
+                    'price': int(trade_columns['price'][offer]),
+                    'currency': currencies[currency_codes[offer]],
+                    'source': sources[source_codes[offer]]
+                })
+            else:
+                result.append({'price': 'N/A', 'currency': 'N/A', 'source': 'N/A'})
+        return result
+
+    def _raw_values(self, field: str, start: int, stop: int) -> list:
+        """Columna numérica con valores no numéricos: los originales y el resto con su tipo."""
+        raw = self.raw[field]
+        cast = int if NUMERIC_FIELDS.get(field) is np.int64 else float
+        return [raw[row] if row in raw else cast(value)
+                for row, value in enumerate(self.columns[field][start:stop].tolist(), start)]
+
+    def iter_records(self, start: int = 0, stop: int = None):
+        """Genera los diccionarios de las filas [start, stop), igual que la lista original."""
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return
+
+        fields, columns = [], []
+        for field in self.field_order:
+            if field in self.trades:
+                values = self._trade_lists(field, start, stop)
+            elif field == MIN_BUY_FIELD:
+                field, values = 'minBuyPrice', self._min_buy_prices(start, stop)
+            elif field in self.categories:
+                categories = self.categories[field]
+                values = [categories[code] for code in self.columns[field][start:stop].tolist()]
+            elif field in self.raw:
+                values = self._raw_values(field, start, stop)
+            elif isinstance(self.columns[field], np.ndarray):
+                values = self.columns[field][start:stop].tolist()
+            else:
+                values = self.columns[field][start:stop]
+            fields.append(field)
+            columns.append(values)
+
+        for row in zip(*columns):
+            yield dict(zip(fields, row))
+
+    def to_records(self, start: int = 0, stop: int = None) -> list[dict]:
+        return list(self.iter_records(start, stop))
@@ -1,76 +1,121 @@
-from flask import Flask, jsonify, render_template_string
-from pymongo import MongoClient
-from collections import defaultdict
+from flask import Flask, Response, g, jsonify, request
+from datetime import datetime, timezone
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import metrics
+import mondongo
+import profiles
+from mongo_client import get_db, COLLECTION_NAME
+
+try:
+    import brotli  # Opcional: si no está instalado solo se sirve gzip
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
 # --- CONFIGURACIÓN ---
-MONGO_URI = "mongodb://mongo:27017/"
-DATABASE_NAME = "ammo_data"
-COLLECTION_NAME = "bullets"
+# La conexión a MongoDB (URI, base de datos, colección, pool) se configura en mongo_client.py
+# Segundos máximos que se sirve la caché aunque la versión de datos no haya cambiado
+# (por si alguien escribe en Mongo sin pasar por el ETL)
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "300"))
+# Campos de control del ETL (_id, hash de contenido, last_updated) que la API nunca devuelve
+API_HIDDEN_PROJECTION = {field: 0 for field in mondongo.HASH_EXCLUDED_FIELDS}
+
+# --- CACHÉS DE LOS MODELOS DE LECTURA ---
+# Estructuras clasificadas ya agrupadas y ordenadas, compartidas por todas las peticiones.
+# Cada una se invalida cuando cambia la versión de datos de lo que lee o al pasar CACHE_TTL:
+#   _cache:     página principal, desde la vista materializada que mantiene el ETL
+#               (mondongo.VIEW_COLLECTION): balas recortadas a lo que enseña la página.
+#   _api_cache: /api/ammo sin parámetros, con los documentos completos de la colección.
+# 'generation' cambia cada vez que se recarga, para que la caché de la página sepa que debe re-renderizar.
+_cache = {"version": None, "loaded_at": 0.0, "data": None, "count": 0, "generation": 0}
+_cache_lock = threading.Lock()
+_api_cache = {"version": None, "loaded_at": 0.0, "data": None, "count": 0, "generation": 0}
+_api_cache_lock = threading.Lock()
 
-# --- FUNCIÓN DE UTILIDAD: ENCONTRAR MEJOR PRECIO ---
-def get_best_trader_offer(bullet):
+def get_classified_data():
     """
-    Busca la opción de compra más barata basándose en priceRUB.
-    Retorna: { 'price': 123, 'currency': 'RUB', 'source': 'Prapor' } o None
+    Devuelve (estructura clasificada con los documentos completos, total) para /api/ammo.
+    Solo recorre la colección si la versión de datos ha cambiado desde la última vez
+    (o ha caducado la caché).
     """
-    offers = bullet.get('buyFor', [])
-    
-    if not offers:
-        return None
-        
-    # Encontramos el mínimo basándonos en el valor normalizado en Rublos (priceRUB)
-    # Usamos float('inf') para ignorar entradas sin precio válido
-    best_offer = min(offers, key=lambda x: x.get('priceRUB', float('inf')))
-    
-    # Mapeo de símbolos de divisa para que quede bonito
-    currency_map = {"RUB": "₽", "USD": "$", "EUR": "€"}
-    currency_sym = currency_map.get(best_offer.get('currency'), best_offer.get('currency'))
+    db = get_db()
+    read_model = _read_model(_api_cache, _api_cache_lock, mondongo.get_data_version(db, COLLECTION_NAME),
+                             lambda: _load_full_classified_data(db[COLLECTION_NAME]))
+    return read_model["data"], read_model["count"]
 
-    return {
-        "price": best_offer.get('price'),
-        "symbol": currency_sym,
-        "source": best_offer.get('source').capitalize() # Ej: 'prapor' -> 'Prapor'
-    }
 
+def _get_read_model() -> dict:
+    """Modelo de la página principal (vista materializada), recargándolo si hace falta."""
+    db = get_db()
+    return _read_model(_cache, _cache_lock, mondongo.get_data_version(db, mondongo.VIEW_COLLECTION),
+                       lambda: _load_classified_data(db))
 
-def get_classified_data():
-    client = MongoClient(MONGO_URI)
-    db = client[DATABASE_NAME]
-    collection = db[COLLECTION_NAME]
-
-    cursor = collection.find({}, {"_id": 0})
-
-    classified_data = defaultdict(lambda: defaultdict(list))
 
+def _read_model(cache: dict, lock: threading.Lock, version, load) -> dict:
+    """
+    Copia consistente de 'cache' (datos, total y generación), recargándola si hace falta.
+    load() retorna (estructura, total, cacheable): lo no cacheable se vuelve a cargar en la siguiente petición.
+    """
+    with lock:
+        fresh = time.monotonic() - cache["loaded_at"] < CACHE_TTL
+        if cache["data"] is None or cache["version"] != version or not fresh:
+            final_structure, count, cacheable = load()
+            cache.update(version=version if cacheable else None, loaded_at=time.monotonic(),
+                         data=final_structure, count=count, generation=cache["generation"] + 1)
+        return dict(cache)
+
+
+def _load_full_classified_data(collection):
+    """Recorre toda la colección y agrupa por tipo y calibre los documentos completos, por penetración."""
+    # El orden (tipo > calibre > penetración) lo da el índice 'type_caliber_pen'
+    final_structure = {}
     count = 0
-    for bullet in cursor:
+    for bullet in collection.find({}, API_HIDDEN_PROJECTION).sort(mondongo.CLASSIFIED_SORT + [(mondongo.ID_FIELD, 1)]):
         count += 1
         a_type = bullet.get("ammoType", "Desconocido")
         cal = bullet.get("caliber", "Desconocido")
-        classified_data[a_type][cal].append(bullet)
+        final_structure.setdefault(a_type, {}).setdefault(cal, []).append(bullet)
+    return final_structure, count, True
 
-    client.close()
 
+def _load_classified_data(db):
+    """
+    Lee la vista materializada: una sola consulta sobre el índice 'view_type_caliber' que
+    devuelve un documento por tipo y calibre con sus balas ya ordenadas y recortadas.
+    Retorna (estructura, total, cacheable).
+    """
     final_structure = {}
-    for tipo, calibres in classified_data.items():
-        final_structure[tipo] = {}
-        for calibre, balas in calibres.items():
-            # Ordenamos por penetración
-            balas_ordenadas = sorted(balas, key=lambda x: x.get('penetrationPower', 0), reverse=True)
-            final_structure[tipo][calibre] = balas_ordenadas
+    count = 0
+    for group in db[mondongo.VIEW_COLLECTION].find({}, {"_id": 0}).sort(mondongo.VIEW_SORT):
+        a_type = group.get("ammoType") or "Desconocido"
+        cal = group.get("caliber") or "Desconocido"
+        final_structure.setdefault(a_type, {})[cal] = group["bullets"]
+        count += group["count"]
 
-    return final_structure, count
+    if not final_structure:
+        # Vista aún sin construir (ETL anterior a la vista): se agrupa la colección de balas.
+        # No se cachea: la versión de la vista no cambia con lo que el ETL escribe en las balas
+        docs = (db[COLLECTION_NAME].find({}, mondongo.VIEW_SOURCE_PROJECTION)
+                .sort(mondongo.CLASSIFIED_SORT + [(mondongo.ID_FIELD, 1)]))
+        for (a_type, cal), bullets in mondongo.group_view_rows(docs).items():
+            final_structure.setdefault(a_type or "Desconocido", {})[cal or "Desconocido"] = bullets
+            count += len(bullets)
+        return final_structure, count, False
 
+    return final_structure, count, True
 
-# --- VISTA WEB ---
-@app.route('/')
-def index():
-    data, total = get_classified_data()
 
-    # Pasamos la función 'get_best_trader_offer' al contexto del template
-    html_template = """
+# --- VISTA WEB ---
+# Plantilla de la página principal. Se compila una sola vez al arrancar (ver más abajo);
+# cada bala ya trae su mejor oferta resuelta en 'bestOffer' (mondongo.view_row).
+INDEX_TEMPLATE = """
     <!DOCTYPE html>
     <html lang="es">
     <head>
@@ -101,6 +146,7 @@ def index():
 
             .high-pen { color: #ff6b6b; font-weight: bold; }
             .stat-box { display:inline-block; padding: 2px 8px; border-radius: 4px; font-size: 0.85em; text-align: center; min-width: 25px; }
+            .stk { background: #333; color: #e0e0e0; margin: 1px; min-width: 30px; }
 
             .tier-s { background: #d4af37; color: black; font-weight: bold; box-shadow: 0 0 5px #d4af37; }
             .tier-a { background: #ff4500; color: white; }
@@ -111,7 +157,7 @@ def index():
         </style>
     </head>
     <body>
-        <h1>📦 Tarkov Ammo Database ({total} items)</h1>
+        <h1>📦 Tarkov Ammo Database ({{ total }} items)</h1>
 
         {% for tipo, calibres in data.items() %}
             <div class="type-container">
@@ -130,13 +176,14 @@ def index():
                                     <th>Armor Dmg</th>
                                     <th>Score</th>
                                     <th>Tier</th>
+                                    <th>Shots to kill (class 1-6)</th>
                                 </tr>
                             </thead>
                             <tbody>
                                 {% for bala in balas %}
-                                {% set img_url = bala.get('iconLink') or bala.get('item', {}).get('iconLink') %}
+                                {% set img_url = bala.get('iconLink') %}
 
-                                {% set best_deal = get_price_func(bala) %}
+                                {% set best_deal = bala.get('bestOffer') %}
 
                                 <tr>
                                     <td>
@@ -178,6 +225,13 @@ def index():
                                             </span>
                                         {% endif %}
                                     </td>
+                                    <td>
+                                        {% set stk = bala.get('shotsToKill') or {} %}
+                                        {% set pen = bala.get('penChance') or {} %}
+                                        {% for clase, disparos in stk.items() %}
+                                            <span class="stat-box stk" title="Class {{ clase }}: {{ (pen.get(clase, 0) * 100) | round(1) }}% pen. (1st hit)">{{ disparos }}</span>
+                                        {% endfor %}
+                                    </td>
                                 </tr>
                                 {% endfor %}
                             </tbody>
@@ -189,17 +243,255 @@ def index():
     </body>
     </html>
     """
-    # IMPORTANTE: Pasamos la función python 'get_best_trader_offer' al template con el nombre 'get_price_func'
-    return render_template_string(html_template, data=data, total=total, get_price_func=get_best_trader_offer)
+
+index_template = app.jinja_env.from_string(INDEX_TEMPLATE)
+
+# --- CACHÉ DE LA PÁGINA RENDERIZADA ---
+# HTML ya renderizado (y comprimido) para la versión de datos actual, con su ETag y
+# Last-Modified para responder 304 a quien ya lo tiene.
+_page_cache = {"generation": None, "etag": None, "last_modified": None, "bodies": {}}
+_page_lock = threading.Lock()
+
+
+def _compressed_bodies(html: bytes) -> dict:
+    """Cuerpo sin comprimir, en gzip y, si está instalado el paquete 'brotli', en br."""
+    bodies = {"identity": html, "gzip": gzip.compress(html, compresslevel=6)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(html)
+    return bodies
+
+
+def _rendered_index() -> dict:
+    """Página principal renderizada para la versión de datos en caché (solo se renderiza al cambiar)."""
+    read_model = _get_read_model()
+    generation = read_model["generation"]
+
+    with _page_lock:
+        if _page_cache["generation"] != generation or not _page_cache["bodies"]:
+            html = index_template.render(data=read_model["data"], total=read_model["count"])
+            html = html.encode("utf-8")
+            _page_cache.update(
+                generation=generation,
+                etag=hashlib.sha1(html).hexdigest(),
+                last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+                bodies=_compressed_bodies(html),
+            )
+        return dict(_page_cache)
+
+
+@app.route('/')
+def index():
+    page = _rendered_index()
+    accepted = request.accept_encodings
+    encoding = next((e for e in ("br", "gzip") if e in page["bodies"] and accepted[e]), "identity")
+    # ETag fuerte distinta por codificación: cada cuerpo es una representación distinta
+    etag = page["etag"] if encoding == "identity" else f"{page['etag']}-{encoding}"
+
+    # El navegador ya tiene esta versión: 304 sin cuerpo
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and request.if_modified_since >= page["last_modified"]):
+        response = Response(status=304)
+    else:
+        response = Response(page["bodies"][encoding], mimetype="text/html")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    response.last_modified = page["last_modified"]
+    response.headers["Cache-Control"] = "no-cache"  # Siempre revalidar: el 304 es barato
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 # --- API JSON ---
+# Sin parámetros, /api/ammo devuelve la estructura clasificada completa (desde la caché).
+# Con parámetros, la consulta se traduce a un filtro/proyección/orden de MongoDB:
+#   ammoType, caliber, tier            -> igualdad (admiten varios valores separados por comas)
+#   minPenetrationPower, maxPenetrationPower -> rango sobre penetrationPower
+#   sort=campo | -campo                -> orden (por defecto -penetrationPower)
+#   fields=campo1,campo2               -> proyección (siempre incluye 'id')
+#   limit, cursor                      -> paginación por cursor (keyset sobre sort + id)
+#   profile=nombre                     -> finalScore, normalized y tier del perfil (profiles.py):
+#                                         filtros y orden usan los suyos (por defecto -normalized)
+API_FILTER_FIELDS = ("ammoType", "caliber", "tier")
+API_SORT_FIELDS = ("penetrationPower", "damage", "armorDamage", "finalScore", "normalized",
+                   "basePrice", "name")
+API_DEFAULT_SORT = "-penetrationPower"
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 500
+API_QUERY_PARAMS = API_FILTER_FIELDS + ("minPenetrationPower", "maxPenetrationPower",
+                                        "sort", "fields", "limit", "cursor", "profile")
+# Campos que con ?profile= se leen del subdocumento del perfil
+PROFILE_SCORE_FIELDS = ("finalScore", "normalized", "tier")
+API_PROFILE_DEFAULT_SORT = "-normalized"
+
+
+def _encode_cursor(sort_value, last_id: str) -> str:
+    raw = json.dumps([sort_value, last_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Parámetro 'cursor' no válido.")
+    return sort_value, last_id
+
+
+def build_ammo_query(args) -> dict:
+    """
+    Traduce los parámetros de /api/ammo a filtro, proyección, orden y límite de MongoDB.
+    Lanza ValueError si algún parámetro no es válido.
+    """
+    profile = args.get("profile") or None
+    if profile is not None and profile not in profiles.PROFILES:
+        raise ValueError(f"Perfil '{profile}' desconocido. Opciones: {', '.join(profiles.PROFILES)}.")
+
+    def path(field: str) -> str:
+        if profile is not None and field in PROFILE_SCORE_FIELDS:
+            return f"{profiles.PROFILE_FIELD}.{profile}.{field}"
+        return field
+
+    query = {}
+    for field in API_FILTER_FIELDS:
+        values = [v for raw in args.getlist(field) for v in raw.split(",") if v]
+        if values:
+            query[path(field)] = values[0] if len(values) == 1 else {"$in": values}
+
+    pen_range = {}
+    for param, operator in (("minPenetrationPower", "$gte"), ("maxPenetrationPower", "$lte")):
+        if args.get(param):
+            try:
+                pen_range[operator] = float(args[param])
+            except ValueError:
+                raise ValueError(f"Parámetro '{param}' no es un número.")
+    if pen_range:
+        query["penetrationPower"] = pen_range
+
+    sort = args.get("sort", API_DEFAULT_SORT if profile is None else API_PROFILE_DEFAULT_SORT)
+    sort_field = sort.lstrip("-")
+    if sort_field not in API_SORT_FIELDS:
+        raise ValueError(f"No se puede ordenar por '{sort_field}'. Opciones: {', '.join(API_SORT_FIELDS)}.")
+    direction = -1 if sort.startswith("-") else 1
+
+    if args.get("fields"):
+        fields = [f for f in args["fields"].split(",") if f]
+        # '_id' (ObjectId) no se puede serializar a JSON: los campos internos no se exponen
+        if not all(f.isidentifier() and not f.startswith("_") for f in fields):
+            raise ValueError("Parámetro 'fields' no válido.")
+        projection = {"_id": 0, **{path(f): 1 for f in fields + [mondongo.ID_FIELD, sort_field]}}
+    else:
+        # Documento completo sin los campos de control; los perfiles solo si se pide uno
+        projection = dict(API_HIDDEN_PROJECTION)
+        if profile is None:
+            projection[profiles.PROFILE_FIELD] = 0
+
+    try:
+        limit = int(args.get("limit", API_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("Parámetro 'limit' no es un entero.")
+    limit = max(1, min(limit, API_MAX_LIMIT))
+
+    if args.get("cursor"):
+        # Keyset: lo que va detrás de (último valor de orden, último id) en este mismo orden.
+        # MongoDB ordena null/ausente antes que cualquier número o texto, pero $gt/$lt contra
+        # null no casan con nada: esos documentos se tratan aparte.
+        sort_value, last_id = _decode_cursor(args["cursor"])
+        keys = [{path(sort_field): sort_value, mondongo.ID_FIELD: {"$gt": last_id}}]
+        if sort_value is None:
+            if direction > 0:
+                keys.append({path(sort_field): {"$ne": None}})
+        else:
+            keys.append({path(sort_field): {"$lt" if direction < 0 else "$gt": sort_value}})
+            if direction < 0:
+                keys.append({path(sort_field): None})
+        keyset = {"$or": keys}
+        query = {"$and": [query, keyset]} if query else keyset
+
+    return {
+        "filter": query,
+        "projection": projection,
+        "sort": [(path(sort_field), direction), (mondongo.ID_FIELD, 1)],
+        "sort_field": sort_field,
+        "limit": limit,
+        "profile": profile,
+    }
+
+
+def _apply_profile(doc: dict, profile: str) -> dict:
+    """Sustituye finalScore/normalized/tier del documento por los del perfil."""
+    scores = (doc.pop(profiles.PROFILE_FIELD, None) or {}).get(profile, {})
+    for field in PROFILE_SCORE_FIELDS:
+        doc.pop(field, None)
+        if field in scores:
+            doc[field] = scores[field]
+    doc["profile"] = profile
+    return doc
+
+
+def query_ammo(args) -> dict:
+    """Ejecuta en MongoDB la consulta de /api/ammo y devuelve una página de resultados."""
+    plan = build_ammo_query(args)
+    collection = get_db()[COLLECTION_NAME]
+    # Pedimos uno de más para saber si hay página siguiente
+    cursor = (collection.find(plan["filter"], plan["projection"])
+              .sort(plan["sort"]).limit(plan["limit"] + 1))
+    page = list(cursor)
+    if plan["profile"] is not None:
+        page = [_apply_profile(doc, plan["profile"]) for doc in page]
+
+    next_cursor = None
+    if len(page) > plan["limit"]:
+        page = page[:plan["limit"]]
+        last = page[-1]
+        next_cursor = _encode_cursor(last.get(plan["sort_field"]), last.get(mondongo.ID_FIELD))
+
+    return {"count": len(page), "data": page, "next_cursor": next_cursor}
+
+
 @app.route('/api/ammo')
 def api_ammo():
-    data, count = get_classified_data()
-    return jsonify({"total": count, "data": data})
+    if not any(param in request.args for param in API_QUERY_PARAMS):
+        data, count = get_classified_data()
+        return jsonify({"total": count, "data": data})
+
+    try:
+        return jsonify(query_ammo(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# --- MÉTRICAS (Prometheus) ---
+# Latencia de las rutas de la web y de la API; /metrics añade el último informe del ETL
+# (metrics.METRICS_FILE, compartido con update.py a través del volumen de /eft-etl).
+TIMED_ROUTES = ("/", "/api/ammo")
+REQUEST_LATENCY = metrics.LatencyHistogram(
+    "eft_http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta y código.",
+    ("path", "status"))
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_latency(response):
+    rule = request.url_rule.rule if request.url_rule else None
+    if rule in TIMED_ROUTES and "request_started" in g:
+        REQUEST_LATENCY.observe((rule, str(response.status_code)), time.perf_counter() - g.request_started)
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    body = metrics.render_prometheus(metrics.load_runs(), (REQUEST_LATENCY,))
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == '__main__':
+    mondongo.ensure_indexes()
     print("Servidor Flask activo: http://localhost:5001")
     app.run(debug=True, port=5000, host="0.0.0.0")
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import numpy as np
+import metrics
+from ammo_table import AmmoTable
+
+# --- SIMULACIÓN MUNICIÓN CONTRA BLINDAJE ---
+# finalScore es una suma ponderada; esto simula de verdad cómo rinde cada bala contra una
+# armadura de clase 1 a 6 en el tórax: Monte Carlo con SIM_TRIALS disparos seguidos por
+# bala y clase, con la armadura perdiendo durabilidad en cada impacto. Para cada clase:
+#   shotsToKill: media de disparos hasta matar (SIM_MAX_SHOTS si no muere antes)
+#   penChance:   probabilidad de penetrar la armadura nueva en el primer impacto
+#
+# Todo va en bloque con numpy: el estado son todas las combinaciones (clase, bala, intento)
+# a la vez y solo se itera sobre los disparos. Los números aleatorios se generan una vez
+# con SIM_SEED y los comparten todas las balas (common random numbers): el resultado de
+# una bala no depende de con qué otras se simule, así que se puede guardar en caché por el
+# hash de sus campos balísticos y solo se re-simula la munición que cambia.
+
+SIM_TRIALS = int(os.environ.get("SIM_TRIALS", "500"))
+SIM_MAX_SHOTS = int(os.environ.get("SIM_MAX_SHOTS", "60"))
+SIM_SEED = int(os.environ.get("SIM_SEED", "1234"))
+SIM_CACHE_FILE = os.environ.get("SIM_CACHE_FILE", "armor_sim_cache.json")
+SIM_CACHE_MAX = int(os.environ.get("SIM_CACHE_MAX", "5000"))  # Entradas (las menos usadas se descartan)
+# Balas simuladas a la vez: la memoria crece con clases × balas × SIM_TRIALS, así que se
+# simula por trozos (el resultado no depende del trozo: los números aleatorios son comunes)
+SIM_CHUNK = int(os.environ.get("SIM_CHUNK", "64"))
+SIM_VERSION = 1  # Cambiarlo si cambia el modelo: invalida la caché
+
+ARMOR_CLASSES = (1, 2, 3, 4, 5, 6)
+# Durabilidad máxima de una armadura representativa de cada clase
+ARMOR_DURABILITY = (30.0, 40.0, 50.0, 60.0, 70.0, 80.0)
+ARMOR_DESTRUCTIBILITY = 0.5  # Pérdida de durabilidad por punto de penetración * armorDamage
+BLUNT_THROUGHPUT = 0.15      # Fracción del daño que pasa cuando la armadura para la bala
+FRAGMENTATION_BONUS = 0.5    # Daño extra si la bala se fragmenta tras penetrar
+THORAX_HP = 85.0
+MAX_PELLETS = 8              # Perdigones simulados por disparo como máximo
+
+# Campos de la bala que entran en la simulación (y en su hash de caché)
+BALLISTIC_FIELDS = ('damage', 'projectileCount', 'penetrationPower', 'penetrationPowerDeviation',
+                    'armorDamage', 'fragmentationChance')
+SIM_FIELDS = ('shotsToKill', 'penChance')
+
+
+def ballistic_hash(values: dict) -> str:
+    """Hash de los campos balísticos de una bala y de los parámetros de la simulación."""
+    payload = {
+        "fields": [values.get(field) for field in BALLISTIC_FIELDS],
+        "sim": [SIM_VERSION, SIM_TRIALS, SIM_MAX_SHOTS, SIM_SEED],
+    }
+    canonical = json.dumps(payload, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _random_draws(seed: int = SIM_SEED) -> dict[str, np.ndarray]:
+    """Números aleatorios compartidos por todas las balas: (disparos, perdigones, intentos)."""
+    rng = np.random.default_rng(seed)
+    shape = (SIM_MAX_SHOTS, MAX_PELLETS, SIM_TRIALS)
+    return {
+        "deviation": rng.standard_normal(shape),   # Desviación de la penetración
+        "penetrate": rng.random(shape),            # ¿Penetra?
+        "fragment": rng.random(shape),             # ¿Se fragmenta?
+    }
+
+
+def penetration_chance(penetration: np.ndarray, armor_class: np.ndarray, durability_pct: np.ndarray) -> np.ndarray:
+    """
+    Probabilidad (0..1) de penetrar según la fórmula del juego: la resistencia efectiva
+    baja con la durabilidad, y por debajo de la penetración la probabilidad sube rápido.
+    """
+    armor = (121 - 5000 / (45 + 2 * durability_pct)) * armor_class * 10 / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chance = np.where(armor >= penetration + 15, 0.0,
+                          np.where(armor >= penetration, 0.4 * (armor - penetration - 15) ** 2,
+                                   100 + penetration / (0.9 * armor - penetration)))
+    return np.clip(chance / 100, 0.0, 1.0)
+
+
+def simulate(columns: dict[str, np.ndarray], chunk_size: int = SIM_CHUNK) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Simula las balas contra las clases ARMOR_CLASSES, de 'chunk_size' en 'chunk_size'.
+    Retorna (shotsToKill, penChance), ambos (balas × clases).
+    """
+    n, n_classes = len(columns['damage']), len(ARMOR_CLASSES)
+    if n == 0:
+        return np.zeros((0, n_classes)), np.zeros((0, n_classes))
+
+    draws = _random_draws()
+    col = {field: np.nan_to_num(np.asarray(columns[field], dtype=np.float64)) for field in BALLISTIC_FIELDS}
+    chunk_size = max(chunk_size, 1)
+    results = [_simulate_chunk({field: values[start:start + chunk_size] for field, values in col.items()}, draws)
+               for start in range(0, n, chunk_size)]
+    return (np.concatenate([shots_to_kill for shots_to_kill, _ in results]),
+            np.concatenate([pen_chance for _, pen_chance in results]))
+
+
+def _simulate_chunk(col: dict[str, np.ndarray], draws: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Simula a la vez todas las balas de 'col' (columnas float ya limpias)."""
+    n, n_classes = len(col['damage']), len(ARMOR_CLASSES)
+    pellets = np.clip(col['projectileCount'].astype(np.int64), 1, MAX_PELLETS)
+    armor_class = np.array(ARMOR_CLASSES, dtype=np.float64)
+    max_durability = np.array(ARMOR_DURABILITY)
+
+    # Estado aplanado de las combinaciones (clase, bala, intento) que siguen vivas; tras
+    # cada disparo se quitan las muertas, así que cada vuelta trabaja solo con lo que queda
+    cls, bullet, trial = (index.ravel() for index in
+                          np.meshgrid(np.arange(n_classes), np.arange(n), np.arange(SIM_TRIALS), indexing="ij"))
+    slot = np.arange(len(cls))
+    hp = np.full(len(cls), THORAX_HP)
+    durability = max_durability[cls]
+    shots_to_kill = np.full(len(cls), float(SIM_MAX_SHOTS))
+    first_pen = None
+
+    for shot in range(SIM_MAX_SHOTS):
+        if not len(slot):
+            break
+        for pellet in range(int(pellets[bullet].max())):
+            # Los perdigones extra solo afectan a la munición con varios proyectiles
+            sel = slice(None) if pellet == 0 else np.flatnonzero((pellets[bullet] > pellet) & (hp > 0))
+            b, t = bullet[sel], trial[sel]
+            penetration = np.maximum(col['penetrationPower'][b] + draws["deviation"][shot, pellet, t]
+                                     * col['penetrationPowerDeviation'][b], 0)
+            chance = penetration_chance(penetration, armor_class[cls[sel]],
+                                        100 * durability[sel] / max_durability[cls[sel]])
+            if shot == 0 and pellet == 0:
+                first_pen = chance.reshape(n_classes, n, SIM_TRIALS).mean(axis=2)
+            penetrated = draws["penetrate"][shot, pellet, t] < chance
+            fragmented = penetrated & (draws["fragment"][shot, pellet, t] < col['fragmentationChance'][b])
+            damage = col['damage'][b] * np.where(penetrated, 1 + FRAGMENTATION_BONUS * fragmented, BLUNT_THROUGHPUT)
+            hp[sel] -= damage
+            durability[sel] = np.maximum(
+                durability[sel] - penetration * col['armorDamage'][b] / 100 * ARMOR_DESTRUCTIBILITY, 0)
+
+        killed = hp <= 0
+        shots_to_kill[slot[killed]] = shot + 1
+        keep = ~killed
+        cls, bullet, trial, slot, hp, durability = (array[keep] for array in
+                                                    (cls, bullet, trial, slot, hp, durability))
+
+    return shots_to_kill.reshape(n_classes, n, SIM_TRIALS).mean(axis=2).T, first_pen.T
+
+
+# --- CACHÉ POR HASH BALÍSTICO ---
+
+def load_cache(filename: str = SIM_CACHE_FILE) -> dict:
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache: dict, filename: str = SIM_CACHE_FILE):
+    """Guarda la caché de forma atómica, quedándose con las SIM_CACHE_MAX entradas más recientes."""
+    if len(cache) > SIM_CACHE_MAX:
+        for key in list(cache)[:len(cache) - SIM_CACHE_MAX]:
+            del cache[key]
+    tmp = f"{filename}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, filename)
+
+
+def _result(shots_to_kill: np.ndarray, pen_chance: np.ndarray) -> dict:
+    """Campos SIM_FIELDS de una bala, por clase ('1'..'6')."""
+    return {
+        'shotsToKill': {str(c): round(v, 2) for c, v in zip(ARMOR_CLASSES, shots_to_kill.tolist())},
+        'penChance': {str(c): round(v, 3) for c, v in zip(ARMOR_CLASSES, pen_chance.tolist())},
+    }
+
+
+@metrics.instrumented("armor_sim.simulate_armor", count_input=True)
+def simulate_armor(data, cache: dict = None):
+    """
+    Añade 'shotsToKill' y 'penChance' a cada bala (AmmoTable o lista de dicts).
+    Solo se simulan las balas cuyo hash balístico no está en la caché. Si no se pasa
+    'cache' se usa (y se guarda) la de SIM_CACHE_FILE.
+    """
+    if not data:
+        return data
+    own_cache = cache is None
+    if own_cache:
+        cache = load_cache()
+
+    is_table = isinstance(data, AmmoTable)
+    if is_table:
+        columns = {field: data.column(field) for field in BALLISTIC_FIELDS}
+        rows = [dict(zip(BALLISTIC_FIELDS, values))
+                for values in zip(*(columns[field].tolist() for field in BALLISTIC_FIELDS))]
+    else:
+        rows = [{field: item.get(field, 1 if field == 'projectileCount' else 0) for field in BALLISTIC_FIELDS}
+                for item in data]
+    hashes = [ballistic_hash(row) for row in rows]
+
+    # Solo las balas que no están en caché (una vez por hash)
+    missing = list(dict.fromkeys(h for h in hashes if h not in cache))
+    if missing:
+        first_row = {h: i for i, h in reversed(list(enumerate(hashes)))}
+        pending = [rows[first_row[h]] for h in missing]
+        pending_columns = {}
+        for field in BALLISTIC_FIELDS:
+            try:
+                pending_columns[field] = np.array([row[field] for row in pending], dtype=np.float64)
+            except (TypeError, ValueError):
+                # Valores no numéricos: se simulan como 0 (igual que en el finalScore)
+                pending_columns[field] = np.array([row[field] if isinstance(row[field], (int, float)) else 0
+                                                   for row in pending], dtype=np.float64)
+            # En una AmmoTable los valores no numéricos llegan como NaN: también se simulan como 0
+            pending_columns[field] = np.nan_to_num(pending_columns[field], nan=0.0)
+        shots_to_kill, pen_chance = simulate(pending_columns)
+        for i, h in enumerate(missing):
+            cache[h] = _result(shots_to_kill[i], pen_chance[i])
+    metrics.count("simuladas", len(missing))
+    metrics.count("en_cache", len(hashes) - len(missing))
+
+    # Las usadas pasan al final: son las últimas en descartarse
+    results = []
+    for h in hashes:
+        results.append(cache.pop(h))
+        cache[h] = results[-1]
+
+    for field in SIM_FIELDS:
+        values = [result[field] for result in results]
+        if is_table:
+            data.set_column(field, values)
+        else:
+            for item, value in zip(data, values):
+                item[field] = value
+    if own_cache:
+        save_cache(cache)
+    print(f"Simulación contra blindaje: {len(missing)} balas simuladas, {len(hashes) - len(missing)} desde caché.")
+    return data
+
+
+if __name__ == "__main__":
+    # Coste de la simulación y determinismo con munición sintética
+    import time
+    from synthetic import synthetic_records
+
+    for count in (170, 1700):
+        table = AmmoTable.from_records(synthetic_records(count))
+        columns = {field: table.column(field) for field in BALLISTIC_FIELDS}
+        start = time.perf_counter()
+        stk, pen = simulate(columns)
+        elapsed = time.perf_counter() - start
+        again, _ = simulate({field: values[::-1] for field, values in columns.items()})
+        print(f"{count:>6} balas | {elapsed:.3f} s | determinista: {np.array_equal(stk, again[::-1])} | "
+              f"shotsToKill medio por clase: {np.round(stk.mean(axis=0), 2).tolist()}")
@@ -0,0 +1,78 @@
+"""
+Benchmark de los códecs del snapshot (codec.py): tamaño, tiempo de codificación y de
+decodificación, en claro y dentro de ade.bin cifrado.
+
+Uso (desde /eft-etl, con un 'ade.bin' ya descargado):
+    python bench_codec.py [ade.bin] [--repeat 3] [--factor 100]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import os
+import tempfile
+import time
+
+import codec
+import crypt
+
+
+def synthetic_copy(records: list, factor: int) -> list:
+    """Dataset 'factor' veces mayor: copias de los registros reales con ids y precios distintos."""
+    result = []
+    for n in range(factor):
+        for record in records:
+            clone = copy.deepcopy(record)
+            clone['id'] = f"{record.get('id')}-{n}"
+            for trade in clone.get('buyFor', []) + clone.get('sellFor', []):
+                trade['price'] += n
+                trade['priceRUB'] += n
+            result.append(clone)
+    return result
+
+
+def _best_of(func, repeat: int) -> tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_dataset(label: str, records: list, repeat: int):
+    print(f"\n=== {label}: {len(records)} registros ===")
+    print(f"{'CÓDEC':<8} | {'EN CLARO':>12} | {'ADE.BIN':>12} | {'ENCODE (s)':>10} | {'DECODE (s)':>10} | "
+          f"{'SAVE (s)':>9} | {'LOAD (s)':>9}")
+    print("-" * 90)
+
+    for name, codec_id in codec.CODECS.items():
+        chunks = [records[i:i + crypt.CHUNK_RECORDS] for i in range(0, len(records), crypt.CHUNK_RECORDS)]
+
+        encode_time, payloads = _best_of(lambda: [codec.encode(chunk, codec_id) for chunk in chunks], repeat)
+        decode_time, decoded = _best_of(lambda: [codec.decode(payload) for payload in payloads], repeat)
+        assert [r for chunk in decoded for r in chunk] == records, f"El códec {name} no es reversible"
+
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            path = os.path.join(tmp, "ade.bin")
+            save_time, _ = _best_of(lambda: crypt.save_encrypted_variable(records, path, codec_name=name), repeat)
+            load_time, _ = _best_of(lambda: list(crypt.iter_decrypted_records(path)), repeat)
+            file_size = os.path.getsize(path)
+        plain_size = sum(len(payload) for payload in payloads)
+        print(f"{name:<8} | {plain_size:>12,} | {file_size:>12,} | {encode_time:>10.4f} | {decode_time:>10.4f} | "
+              f"{save_time:>9.4f} | {load_time:>9.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("snapshot", nargs="?", default="ade.bin")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--factor", type=int, default=100)
+    args = parser.parse_args()
+
+    current = crypt.load_and_decrypt_data(args.snapshot)
+    if not current:
+        raise SystemExit(f"No hay datos en '{args.snapshot}'. Ejecuta antes main.py o update.py.")
+
+    bench_dataset("Dataset actual", current, args.repeat)
+    bench_dataset(f"Sintético x{args.factor}", synthetic_copy(current, args.factor), args.repeat)
@@ -0,0 +1,86 @@
+"""
+Benchmark de la descarga (fetch_client.py) contra stub_graphql.py, sin red: latencia de
+la petición completa y condicional, y cuántos intentos hacen falta con errores o cuelgues.
+
+Uso (desde /eft-etl):
+    python bench_fetch.py [--count 200] [--requests 20] [--latency 0.05] [--fail-rate 0.3]
+                          [--hang-rate 0.05] [--read-timeout 1]
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+import requests
+
+import fetch_client
+from stub_graphql import StubState, start_stub_server
+from synthetic import synthetic_ammo
+
+QUERY = "{ ammo(lang: en) { item { id } } }"
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+def bench_case(label: str, url: str, stub: StubState, n_requests: int, conditional: bool,
+               read_timeout: float, max_retries: int):
+    timings, failures = [], 0
+    validators = None
+    stub.requests = 0
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = fetch_client.post_graphql(QUERY, url=url, validators=validators,
+                                                     timeout=(fetch_client.CONNECT_TIMEOUT, read_timeout),
+                                                     max_retries=max_retries)
+            if conditional:
+                validators = fetch_client.response_validators(response)
+            size = len(response.content)
+        except requests.exceptions.RequestException:
+            failures += 1
+            size = 0
+        timings.append(time.perf_counter() - start)
+
+    print(f"{label:<28} | {statistics.median(timings):>9.4f} | {_percentile(timings, 0.95):>9.4f} | "
+          f"{max(timings):>9.4f} | {stub.requests / n_requests:>9.2f} | {failures:>7} | {size:>10,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="Balas sintéticas de la respuesta.")
+    parser.add_argument("--requests", type=int, default=20, help="Descargas por escenario.")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    parser.add_argument("--hang-rate", type=float, default=0.05)
+    parser.add_argument("--read-timeout", type=float, default=1.0)
+    parser.add_argument("--max-retries", type=int, default=fetch_client.MAX_RETRIES)
+    args = parser.parse_args()
+
+    # Esperas de backoff cortas: medimos el comportamiento, no queremos esperar 30s
+    fetch_client.BACKOFF_BASE, fetch_client.BACKOFF_MAX = 0.05, 0.5
+
+    stub = StubState(synthetic_ammo(args.count), latency=args.latency,
+                     hang_time=args.read_timeout * 3)
+    server, url = start_stub_server(stub)
+    print(f"Stub en {url} con {args.count} balas, {args.requests} descargas por escenario\n")
+    print(f"{'ESCENARIO':<28} | {'P50 (s)':>9} | {'P95 (s)':>9} | {'MAX (s)':>9} | "
+          f"{'INTENTOS':>9} | {'FALLOS':>7} | {'BYTES':>10}")
+    print("-" * 100)
+
+    try:
+        bench_case("completa", url, stub, args.requests, False, args.read_timeout, args.max_retries)
+        bench_case("condicional (ETag)", url, stub, args.requests, True, args.read_timeout, args.max_retries)
+        stub.fail_rate = args.fail_rate
+        bench_case(f"errores 503 ({args.fail_rate:.0%})", url, stub, args.requests, False,
+                   args.read_timeout, args.max_retries)
+        stub.fail_rate, stub.hang_rate = 0.0, args.hang_rate
+        bench_case(f"cuelgues ({args.hang_rate:.0%})", url, stub, args.requests, False,
+                   args.read_timeout, args.max_retries)
+    finally:
+        server.shutdown()
+        fetch_client.close_session()
@@ -0,0 +1,285 @@
+"""
+Benchmark del pipeline completo del ETL, etapa por etapa, con datos sintéticos
+deterministas (synthetic.py) a 1x, 10x, 100x y 1000x el tamaño real de la API.
+
+Para cada etapa mide el tiempo de pared y de CPU (mejor y mediana de '--repeat'
+ejecuciones, cada una con su entrada recién preparada) y el pico de memoria
+(tracemalloc, en una ejecución aparte para no inflar los tiempos). Los resultados
+se guardan en JSON y CSV dentro de '--out' para poder compararlos entre commits.
+
+Mongo: por defecto usa mongomock en el propio proceso; con '--mongo mongodb://...'
+usa un mongod real (base de datos '--database', que se vacía en cada etapa).
+Con '--mongo none' se omiten los cargadores. mongomock busca cada upsert recorriendo
+la colección entera (coste cuadrático), así que con él los cargadores solo se miden
+hasta '--mongo-max' registros; para ver cómo escalan hace falta un mongod real.
+
+Uso (desde /eft-etl):
+    python bench_pipeline.py [--scales 1,10,100,1000] [--repeat 3] [--layout table|list]
+                             [--mongo mongomock|URI|none] [--mongo-max 500] [--out bench_results]
+"""
+import argparse
+import contextlib
+import copy
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timezone
+
+from synthetic import LIVE_SIZE, synthetic_response
+
+SEED = 0
+MODIFIED_FRACTION = 0.1  # Fracción de balas que cambian entre la carga inicial y el smart update
+CSV_FIELDS = ("scale", "records", "stage", "wall_best_s", "wall_median_s", "cpu_best_s",
+              "peak_mb", "records_per_s")
+
+
+def _configure_environment(args, tmp: str):
+    """Clave de cifrado y base de datos del benchmark, antes de importar los módulos del ETL."""
+    if not os.environ.get("ADE_ENCRYPTION_KEY"):
+        from cryptography.fernet import Fernet
+        os.environ["ADE_ENCRYPTION_KEY"] = Fernet.generate_key().decode('ascii')
+    os.environ["ADE_KEY_FILE"] = os.path.join(tmp, "ade.key")
+    os.environ["SIM_CACHE_FILE"] = os.path.join(tmp, "armor_sim_cache.json")
+    if args.mongo not in ("mongomock", "none"):
+        os.environ["MONGO_URI"] = args.mongo
+    os.environ["DATABASE_NAME"] = args.database
+
+
+def _use_mongomock() -> bool:
+    """Sustituye el cliente compartido por uno de mongomock. False si no está instalado."""
+    try:
+        import mongomock
+    except ImportError:
+        return False
+    import mongo_client
+    mongo_client._client = mongomock.MongoClient()
+    mongo_client._client_pid = os.getpid()
+    return True
+
+
+def measure(setup, run, repeat: int) -> dict:
+    """
+    Ejecuta run(setup()) 'repeat' veces midiendo solo run(); después una vez más bajo
+    tracemalloc para el pico de memoria. La salida por consola del ETL se descarta.
+    """
+    walls, cpus = [], []
+    for _ in range(repeat):
+        state = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall, cpu = time.perf_counter(), time.process_time()
+            run(state)
+            walls.append(time.perf_counter() - wall)
+            cpus.append(time.process_time() - cpu)
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_best_s": min(walls),
+        "wall_median_s": statistics.median(walls),
+        "cpu_best_s": min(cpus),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def _modified_records(records: list, fraction: float) -> list:
+    """Copia de 'records' con el daño y un precio cambiados en una fracción fija de las balas."""
+    result = copy.deepcopy(records)
+    step = max(1, round(1 / fraction)) if fraction else len(result) + 1
+    for record in result[::step]:
+        record['damage'] += 1
+        for trade in record['buyFor'][:1]:
+            trade['price'] += 1
+            trade['priceRUB'] += 1
+    return result
+
+
+def bench_scale(scale: int, args, tmp: str, mongo: bool) -> list[dict]:
+    import crypt
+    import e
+    import mondongo
+    import tl
+    import armor_sim
+    from ammo_table import AmmoTable
+
+    count = LIVE_SIZE * scale
+    content = synthetic_response(count, SEED)
+    snapshot = os.path.join(tmp, "ade.bin")
+    metadata_file = os.path.join(tmp, "validation.bin")  # Sin metadatos: siempre validación completa
+    records = e.flatten_ammo(e.validate_response(content, e.GRAPHQL_QUERY, "ammo",
+                                                 metadata_file, "strict")[0]['data']['ammo'])
+    use_table = args.layout == "table"
+
+    def fresh():
+        return AmmoTable.from_records(copy.deepcopy(records)) if use_table else copy.deepcopy(records)
+
+    def cleaned():
+        return tl.clean_caliber_data(fresh())
+
+    def scored():
+        return tl.calculate_finalScore(cleaned())
+
+    def normalized():
+        return tl.normalize_and_update_scores(scored())
+
+    def reset_collection():
+        db = mondongo.get_db()
+        db[mondongo.COLLECTION_NAME].drop()
+        db[mondongo.VERSION_COLLECTION].drop()
+        db[mondongo.VIEW_COLLECTION].drop()
+        mondongo.ensure_indexes(db)
+
+    def loaded_and_modified():
+        with contextlib.redirect_stdout(io.StringIO()):
+            reset_collection()
+            mondongo.upload_to_mongodb_2(normalized())
+            modified = _modified_records(records, MODIFIED_FRACTION)
+            data = AmmoTable.from_records(modified) if use_table else modified
+            return tl.normalize_and_update_scores(tl.calculate_finalScore(tl.clean_caliber_data(data)))
+
+    def upload_setup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            reset_collection()
+            return normalized()
+
+    def quiet(setup):
+        def wrapped():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return setup()
+        return wrapped
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        crypt.save_encrypted_variable(records, snapshot)
+
+    stages = [
+        ("validation", lambda: content,
+         lambda body: e.validate_response(body, e.GRAPHQL_QUERY, "ammo", metadata_file, "strict")),
+        ("flatten", lambda: e.validate_response(content, e.GRAPHQL_QUERY, "ammo",
+                                                metadata_file, "strict")[0]['data']['ammo'],
+         e.flatten_ammo),
+        ("encrypt", lambda: records, lambda data: crypt.save_encrypted_variable(data, snapshot)),
+        ("decrypt", lambda: snapshot, lambda path: list(crypt.iter_decrypted_records(path))),
+    ]
+    if use_table:
+        stages.append(("AmmoTable.from_records", lambda: copy.deepcopy(records), AmmoTable.from_records))
+    stages += [
+        ("clean_caliber_data", fresh, tl.clean_caliber_data),
+        ("calculate_finalScore", quiet(cleaned), tl.calculate_finalScore),
+        ("score_profiles", quiet(scored), tl.score_profiles),
+        # Sin caché: mide la simulación completa de toda la tabla
+        ("armor_sim.simulate_armor", quiet(scored), lambda data: armor_sim.simulate_armor(data, cache={})),
+        ("normalize_and_update_scores", quiet(scored), tl.normalize_and_update_scores),
+    ]
+    # Pipeline completo en streaming desde el snapshot (dos pasadas, memoria acotada)
+    stages.append(("stream_normalized", lambda: snapshot,
+                   lambda path: deque(tl.stream_normalized(lambda: crypt.iter_decrypted_records(path)), maxlen=0)))
+    if mongo and (not args.mongo_max or count <= args.mongo_max):
+        stages += [
+            ("upload_to_mongodb_2", upload_setup, mondongo.upload_to_mongodb_2),
+            ("smart_update_mongodb_2", loaded_and_modified, mondongo.smart_update_mongodb_2),
+            # Vista de la web completa (el peor caso: todos los grupos cambian)
+            ("refresh_view", quiet(lambda: mondongo.upload_to_mongodb_2(upload_setup())),
+             lambda _: mondongo.refresh_view()),
+        ]
+    elif mongo:
+        print(f"  (cargadores de Mongo omitidos: {count} registros > --mongo-max {args.mongo_max})")
+
+    results = []
+    for stage, setup, run in stages:
+        result = {"scale": scale, "records": count, "stage": stage, **measure(setup, run, args.repeat)}
+        result["records_per_s"] = count / result["wall_best_s"] if result["wall_best_s"] else None
+        results.append(result)
+        print(f"{scale:>5}x | {count:>8,} | {stage:<28} | {result['wall_best_s']:>9.4f} | "
+              f"{result['wall_median_s']:>9.4f} | {result['cpu_best_s']:>9.4f} | {result['peak_mb']:>9.1f}")
+    return results
+
+
+def run_metadata(args, mongo_backend: str) -> dict:
+    import numpy
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": SEED,
+        "live_size": LIVE_SIZE,
+        "repeat": args.repeat,
+        "layout": args.layout,
+        "mongo": mongo_backend,
+    }
+
+
+def save_results(out_dir: str, metadata: dict, results: list) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(out_dir, f"pipeline-{stamp}-{metadata['commit'] or 'nocommit'}")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata, "results": results}, f, indent=2)
+    with open(base + ".csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+    return base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10,100,1000", help="Múltiplos del tamaño real, separados por comas.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--layout", choices=("table", "list"), default="table",
+                        help="AmmoTable (como update.py) o lista de dicts (como main.py).")
+    parser.add_argument("--mongo", default="mongomock", help="'mongomock', 'none' o la URI de un mongod local.")
+    parser.add_argument("--database", default="ammo_bench", help="Base de datos del benchmark (se vacía).")
+    parser.add_argument("--mongo-max", type=int, default=None,
+                        help="Máximo de registros para los cargadores (0 = sin límite; 500 con mongomock).")
+    parser.add_argument("--out", default="bench_results", help="Carpeta de los ficheros de resultados.")
+    args = parser.parse_args()
+    if args.mongo_max is None:
+        args.mongo_max = 500 if args.mongo == "mongomock" else 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure_environment(args, tmp)
+        mongo = args.mongo != "none"
+        if args.mongo == "mongomock" and not _use_mongomock():
+            print("mongomock no está instalado: se omiten los cargadores de Mongo.")
+            mongo = False
+        backend = args.mongo if mongo else "none"
+
+        print(f"Tamaño real: {LIVE_SIZE} balas | repeticiones: {args.repeat} | layout: {args.layout} | "
+              f"mongo: {backend}\n")
+        print(f"{'ESCALA':>6} | {'REGISTROS':>8} | {'ETAPA':<28} | {'MEJOR (s)':>9} | {'MEDIANA':>9} | "
+              f"{'CPU (s)':>9} | {'PICO (MB)':>9}")
+        print("-" * 100)
+
+        results = []
+        for scale in (int(value) for value in args.scales.split(",")):
+            results += bench_scale(scale, args, tmp, mongo)
+
+        if mongo:
+            import mongo_client
+            mongo_client.get_client().drop_database(args.database)
+            mongo_client.close_client()
+
+    base = save_results(args.out, run_metadata(args, backend), results)
+    print(f"\nResultados guardados en '{base}.json' y '{base}.csv'")
@@ -0,0 +1,109 @@
+"""
+Perfil de arranque de los módulos del ETL (python -X importtime) y comprobación contra
+un presupuesto, para que no vuelva a colarse una importación pesada al arrancar.
+
+Cada módulo se importa en un intérprete nuevo; se toma el mejor de '--repeat' intentos.
+Falla (código 1) si un módulo supera su presupuesto en milisegundos o si al importarlo
+se carga alguna de HEAVY_MODULES (deben cargarse al usarse, no al importar).
+
+Uso (desde /eft-etl):
+    python check_startup.py [--repeat 5] [--top 8] [--scale 1.0] [--json startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Presupuesto de importación (ms, acumulado) de cada módulo del ETL
+STARTUP_BUDGETS_MS = {
+    "mongo_client": 10,
+    "crypt": 30,
+    "mondongo": 30,
+    "e": 40,
+    "update": 60,
+}
+# Dependencias que ningún módulo del presupuesto puede cargar al importarse
+HEAVY_MODULES = ("numpy", "pydantic", "cryptography", "pymongo", "requests", "urllib3", "flask")
+
+
+def _parse_importtime(stderr: str, module: str) -> tuple[float, list]:
+    """
+    Del volcado de -X importtime, el tiempo acumulado (µs) de 'module' y la lista
+    (nombre, µs propios) de todo lo que se importó por debajo de él.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))  # Quita el espacio tras "|"
+
+    # Los hijos aparecen antes que el padre: el subárbol de 'module' son las filas
+    # entre la anterior de nivel 0 y la suya
+    children = []
+    for name, self_us, cumulative_us in rows:
+        if not name.startswith(" "):
+            if name == module:
+                return cumulative_us, children
+            children = []
+        else:
+            children.append((name.strip(), self_us))
+    raise RuntimeError(f"No aparece '{module}' en la salida de -X importtime.")
+
+
+def profile_module(module: str, repeat: int) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=here, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Falló 'import {module}':\n{completed.stderr[-2000:]}")
+        cumulative_us, children = _parse_importtime(completed.stderr, module)
+        if best is None or cumulative_us < best[0]:
+            best = (cumulative_us, children)
+
+    cumulative_us, children = best
+    loaded = {name.split(".")[0] for name, _ in children}
+    return {
+        "module": module,
+        "cumulative_ms": cumulative_us / 1000,
+        "heavy": sorted(loaded.intersection(HEAVY_MODULES)),
+        "slowest": sorted(children, key=lambda child: -child[1]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Importaciones más lentas a mostrar por módulo.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplica los presupuestos (máquinas lentas).")
+    parser.add_argument("--json", help="Guarda los resultados en este fichero.")
+    args = parser.parse_args()
+
+    results, all_ok = [], True
+    print(f"{'MÓDULO':<14} | {'PRESUP. (ms)':>12} | {'MEDIDO (ms)':>11} | {'ESTADO':<6} | PESADOS")
+    print("-" * 75)
+    for module, budget in STARTUP_BUDGETS_MS.items():
+        result = profile_module(module, args.repeat)
+        result["budget_ms"] = budget * args.scale
+        result["ok"] = result["cumulative_ms"] <= result["budget_ms"] and not result["heavy"]
+        all_ok &= result["ok"]
+        results.append(result)
+        print(f"{module:<14} | {result['budget_ms']:>12.1f} | {result['cumulative_ms']:>11.1f} | "
+              f"{'✅' if result['ok'] else '❌':<6} | {', '.join(result['heavy']) or '-'}")
+
+    for result in results:
+        if args.top and not result["ok"]:
+            print(f"\nImportaciones más lentas de '{result['module']}' (µs propios):")
+            for name, self_us in result["slowest"][:args.top]:
+                print(f"  {self_us:>8}  {name}")
+
+    if args.json:
+        for result in results:
+            result["slowest"] = result["slowest"][:args.top]
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(0 if all_ok else 1)
@@ -0,0 +1,189 @@
+import json
+import struct
+import numpy as np
+
+# --- SERIALIZADORES DEL SNAPSHOT ---
+# Cada bloque de ade.bin, ya descifrado, empieza por un byte que indica el códec:
+#   CODEC_JSON   -> el resto es la lista de registros en JSON (utf-8).
+#   CODEC_BINARY -> formato columnar compacto: los nombres de los campos se escriben una
+#                   sola vez por bloque, los números van empaquetados en arrays y los
+#                   textos repetidos (calibre, tipo, moneda, trader...) en un diccionario.
+# Los bloques antiguos (JSON sin byte de códec) empiezan por '[' y se siguen leyendo.
+CODEC_JSON = 0x01
+CODEC_BINARY = 0x02
+CODECS = {"json": CODEC_JSON, "binary": CODEC_BINARY}
+
+# Tipos de columna del formato binario
+_INT, _FLOAT, _STR, _TRADES, _JSON = b"i", b"f", b"s", b"t", b"j"
+TRADE_KEYS = ('price', 'currency', 'priceRUB', 'source')
+
+
+# --- ESCRITURA ---
+
+def _pack_strings(values: list) -> bytes:
+    """Textos con diccionario: valores únicos (longitud + utf-8) y un código u32 por valor."""
+    uniques = list(dict.fromkeys(values))
+    lookup = {value: code for code, value in enumerate(uniques)}
+    encoded = [value.encode('utf-8') for value in uniques]
+
+    parts = [struct.pack("<I", len(uniques)),
+             np.array([len(e) for e in encoded], dtype="<u4").tobytes(),
+             b"".join(encoded),
+             np.fromiter(map(lookup.__getitem__, values), dtype="<u4", count=len(values)).tobytes()]
+    return b"".join(parts)
+
+
+def _pack_blob(blob: bytes) -> bytes:
+    return struct.pack("<I", len(blob)) + blob
+
+
+def _column_type(values: list) -> bytes:
+    """Elige cómo guardar una columna sin perder información (si no, JSON)."""
+    types = set(map(type, values))
+    if types == {int} and all(-2**63 <= v < 2**63 for v in values):
+        return _INT
+    if types == {float}:
+        return _FLOAT
+    if types == {str}:
+        return _STR
+    if types == {list} and all(_is_trade_list(v) for v in values):
+        return _TRADES
+    return _JSON
+
+
+def _is_trade_list(trades: list) -> bool:
+    return all(type(t) is dict and tuple(t) == TRADE_KEYS
+               and type(t['price']) is int and type(t['priceRUB']) is int
+               and type(t['currency']) is str and type(t['source']) is str
+               for t in trades)
+
+
+def _pack_column(kind: bytes, values: list) -> bytes:
+    if kind == _INT:
+        return np.array(values, dtype="<i8").tobytes()
+    if kind == _FLOAT:
+        return np.array(values, dtype="<f8").tobytes()
+    if kind == _STR:
+        return _pack_strings(values)
+    if kind == _TRADES:
+        flat = [trade for trades in values for trade in trades]
+        parts = [np.array([len(trades) for trades in values], dtype="<u4").tobytes()]
+        for key in TRADE_KEYS:
+            column = [trade[key] for trade in flat]
+            if key in ('price', 'priceRUB'):
+                parts.append(np.array(column, dtype="<i8").tobytes())
+            else:
+                parts.append(_pack_blob(_pack_strings(column)))
+        return b"".join(parts)
+    return json.dumps(values).encode('utf-8')
+
+
+def _encode_binary(records: list) -> bytes:
+    fields = list(records[0])
+    parts = [struct.pack("<IH", len(records), len(fields))]
+    for field in fields:
+        values = [record[field] for record in records]
+        kind = _column_type(values)
+        name = field.encode('utf-8')
+        parts.append(struct.pack("<H", len(name)) + name + kind)
+        parts.append(_pack_blob(_pack_column(kind, values)))
+    return b"".join(parts)
+
+
+def encode(records: list, codec: int = CODEC_BINARY) -> bytes:
+    """
+    Serializa una lista de registros con el códec indicado. Si el bloque no encaja en el
+    formato binario (registros con claves distintas, tipos raros...) se usa JSON.
+    """
+    if codec == CODEC_BINARY and records:
+        first_keys = list(records[0])
+        if all(list(record) == first_keys for record in records):
+            return bytes([CODEC_BINARY]) + _encode_binary(records)
+    return bytes([CODEC_JSON]) + json.dumps(records).encode('utf-8')
+
+
+# --- LECTURA ---
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        chunk = self.data[self.pos:self.pos + size]
+        if len(chunk) != size:
+            raise ValueError("Bloque binario truncado.")
+        self.pos += size
+        return chunk
+
+    def unpack(self, fmt: str):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def array(self, dtype: str, count: int) -> np.ndarray:
+        return np.frombuffer(self.take(np.dtype(dtype).itemsize * count), dtype=dtype)
+
+
+def _unpack_strings(reader: _Reader, count: int) -> list:
+    (n_unique,) = reader.unpack("<I")
+    lengths = reader.array("<u4", n_unique).tolist()
+    uniques = []
+    for length in lengths:
+        uniques.append(bytes(reader.take(length)).decode('utf-8'))
+    codes = reader.array("<u4", count).tolist()
+    return [uniques[code] for code in codes]
+
+
+def _unpack_column(kind: bytes, blob: bytes, count: int) -> list:
+    reader = _Reader(blob)
+    if kind == _INT:
+        return reader.array("<i8", count).tolist()
+    if kind == _FLOAT:
+        return reader.array("<f8", count).tolist()
+    if kind == _STR:
+        return _unpack_strings(reader, count)
+    if kind == _TRADES:
+        lengths = reader.array("<u4", count).tolist()
+        total = sum(lengths)
+        columns = {}
+        for key in TRADE_KEYS:
+            if key in ('price', 'priceRUB'):
+                columns[key] = reader.array("<i8", total).tolist()
+            else:
+                (size,) = reader.unpack("<I")
+                columns[key] = _unpack_strings(_Reader(reader.take(size)), total)
+        flat = [dict(zip(TRADE_KEYS, values)) for values in zip(*(columns[key] for key in TRADE_KEYS))]
+        result, start = [], 0
+        for length in lengths:
+            result.append(flat[start:start + length])
+            start += length
+        return result
+    if kind == _JSON:
+        return json.loads(bytes(blob).decode('utf-8'))
+    raise ValueError(f"Tipo de columna desconocido: {kind!r}")
+
+
+def _decode_binary(payload: bytes) -> list:
+    reader = _Reader(payload)
+    count, n_fields = reader.unpack("<IH")
+    fields, columns = [], []
+    for _ in range(n_fields):
+        (name_length,) = reader.unpack("<H")
+        fields.append(bytes(reader.take(name_length)).decode('utf-8'))
+        kind = bytes(reader.take(1))
+        (size,) = reader.unpack("<I")
+        columns.append(_unpack_column(kind, reader.take(size), count))
+    return [dict(zip(fields, row)) for row in zip(*columns)] if fields else [{} for _ in range(count)]
+
+
+def decode(payload: bytes) -> list:
+    """Deserializa un bloque escrito por encode() (o un bloque JSON antiguo)."""
+    if not payload:
+        raise ValueError("Bloque vacío.")
+    codec = payload[0]
+    if codec == CODEC_BINARY:
+        return _decode_binary(payload[1:])
+    if codec == CODEC_JSON:
+        return json.loads(payload[1:].decode('utf-8'))
+    if payload[:1] == b"[":
+        return json.loads(payload.decode('utf-8'))
+    raise ValueError(f"Códec de snapshot desconocido: {codec:#x}")
@@ -1,23 +1,63 @@
 import os
 import json
+import time
+import base64
+import struct
+from functools import partial
+from datetime import datetime, timezone
+from collections import deque
 from colorama import Fore
-# Importamos Fernet para la encriptación
-from cryptography.fernet import Fernet
+import metrics
+# 'cryptography' (Fernet) y codec.py (numpy) se importan al usarlos por primera vez:
+# importar este módulo no carga dependencias pesadas ni toca la clave.
 # Nota: La librería 'cryptography' debe estar instalada (pip install cryptography)
 
 
 # --- LÓGICA DE CRIPTOGRAFÍA (Anteriormente en crypto_utils.py) ---
 
 # 1. CLAVE DE ENCRIPTACIÓN (Debe ser la misma para encriptar y desencriptar)
-# GENERAR UNA CLAVE SEGURA: Fernet.generate_key()
-key = Fernet.generate_key()
-print(key)
+# Se toma de la variable de entorno ADE_ENCRYPTION_KEY o, si no existe, del fichero
+# ADE_KEY_FILE (por defecto 'ade.key'), que se crea con una clave nueva la primera vez.
+# Así un 'ade.bin' escrito por un proceso lo puede leer el siguiente.
+KEY_ENV_VAR = "ADE_ENCRYPTION_KEY"
+KEY_FILE = os.environ.get("ADE_KEY_FILE", "ade.key")
+
+_fernet = None
+
+
+def get_fernet():
+    """Devuelve (y cachea) el objeto Fernet con la clave estable del entorno o del fichero."""
+    global _fernet
+    if _fernet is None:
+        from cryptography.fernet import Fernet
+        _fernet = Fernet(_load_or_create_key())
+    return _fernet
+
+
+def _load_or_create_key() -> bytes:
+    env_key = os.environ.get(KEY_ENV_VAR)
+    if env_key:
+        return env_key.strip().encode('utf-8')
+
+    try:
+        # O_EXCL: si dos procesos arrancan a la vez, solo uno crea la clave
+        fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(KEY_FILE, "rb") as f:
+            return f.read().strip()
+
+    from cryptography.fernet import Fernet
+    new_key = Fernet.generate_key()
+    with os.fdopen(fd, "wb") as f:
+        f.write(new_key)
+    print(f"{Fore.YELLOW}Creada una nueva clave de cifrado en '{KEY_FILE}'.")
+    return new_key
+
 
-ENCRYPTION_KEY = key  # Reemplaza esto con tu clave segura y constante
 def encrypt_data(data_bytes: bytes) -> bytes:
     """Encripta los datos usando Fernet."""
     try:
-        f = Fernet(ENCRYPTION_KEY)
+        f = get_fernet()
         encrypted_data = f.encrypt(data_bytes)
         return encrypted_data
     except Exception as e:
@@ -27,7 +67,7 @@ def encrypt_data(data_bytes: bytes) -> bytes:
 def decrypt_data(encrypted_data: bytes) -> bytes:
     """Desencripta los datos usando Fernet."""
     try:
-        f = Fernet(ENCRYPTION_KEY)
+        f = get_fernet()
         decrypted_data = f.decrypt(encrypted_data)
         return decrypted_data
     except Exception as e:
@@ -38,26 +78,145 @@ def decrypt_data(encrypted_data: bytes) -> bytes:
 # --- FIN LÓGICA DE CRIPTOGRAFÍA ---
 
 
-def save_encrypted_variable(data: list,):
+# --- FORMATO DE SNAPSHOT POR BLOQUES ---
+# ade.bin = cabecera SNAPSHOT_MAGIC + una trama por bloque: 4 bytes (big-endian) con la
+# longitud y el token Fernet en binario (sin el base64, que inflaba el fichero un 33%).
+# Cada token contiene hasta CHUNK_RECORDS registros serializados con codec.py (el primer
+# byte indica el códec: binario compacto o JSON).
+# Cada bloque va autenticado y cifrado por separado, así que se puede escribir y leer
+# en streaming sin tener nunca el dataset entero en memoria (ni cifrado ni en claro).
+# Se siguen leyendo los ficheros 'ADE2' (un token base64 por línea) y los de un solo token.
+SNAPSHOT_MAGIC = b"ADE3\n"
+SNAPSHOT_MAGIC_V2 = b"ADE2\n"
+CHUNK_RECORDS = 256
+# Códec de los bloques nuevos: "binary" (por defecto) o "json"
+SNAPSHOT_CODEC = os.environ.get("SNAPSHOT_CODEC", "binary")
+
+
+def _chunks(records, size: int):
+    """Agrupa un iterable de registros en listas de 'size' elementos."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ordered_map(func, items, workers: int = None):
     """
-    Toma una variable (data), la serializa a JSON, la cifra y la guarda en disco.
+    map() en orden que, si se piden 'workers', reparte el trabajo en un pool de hilos
+    manteniendo como mucho 2*workers bloques en vuelo (no consume todo el iterable).
     """
-    filename = 'ade.bin'
+    if not workers or workers <= 1:
+        yield from map(func, items)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-    # A. Serializar: Convertir la variable (lista/dict) a JSON String
-    json_str = json.dumps(data)
 
-    # B. Convertir a Bytes: Fernet necesita bytes, no texto
-    data_bytes = json_str.encode('utf-8')
+def _encrypt_chunk(chunk: list, codec_id: int = None) -> bytes:
+    import codec
+    token = get_fernet().encrypt(codec.encode(chunk, codec.CODEC_BINARY if codec_id is None else codec_id))
+    return base64.urlsafe_b64decode(token)
+
+
+def _decrypt_chunk(raw_token: bytes) -> list:
+    import codec
+    return codec.decode(get_fernet().decrypt(base64.urlsafe_b64encode(raw_token)))
+
+
+def _read_frames(f):
+    """Lee las tramas (longitud + token) de un fichero ADE3 ya posicionado tras la cabecera."""
+    while True:
+        header = f.read(4)
+        if not header:
+            return
+        if len(header) != 4:
+            raise ValueError("Trama truncada al final del snapshot.")
+        (size,) = struct.unpack(">I", header)
+        frame = f.read(size)
+        if len(frame) != size:
+            raise ValueError("Trama truncada al final del snapshot.")
+        yield frame
+
+
+@metrics.instrumented("crypt.save_encrypted_variable", count_input=True)
+def save_encrypted_variable(data, filename: str = 'ade.bin', chunk_size: int = CHUNK_RECORDS,
+                            workers: int = None, codec_name: str = None):
+    """
+    Toma una variable (data: lista o cualquier iterable de registros), la serializa por
+    bloques (con el códec 'codec_name', por defecto SNAPSHOT_CODEC), cifra cada bloque y
+    lo va escribiendo en disco sin materializarlo entero.
+
+    Se escribe en 'filename.tmp' y solo al terminar sustituye a 'filename': si algo falla
+    a mitad, el snapshot anterior (y sus metadatos) siguen intactos.
+    """
+    import codec
+    codec_id = codec.CODECS[codec_name or SNAPSHOT_CODEC]
+    chunk_count = 0
+    tmp = f"{filename}.tmp"
+    try:
+        with open(tmp, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            encrypt = partial(_encrypt_chunk, codec_id=codec_id)
+            for raw_token in _ordered_map(encrypt, _chunks(data, chunk_size), workers):
+                file.write(struct.pack(">I", len(raw_token)))
+                file.write(raw_token)
+                chunk_count += 1
+                metrics.count("bytes", len(raw_token))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    metrics.count("chunks", chunk_count)
+    print(f"🔒 Datos guardados cifrados en '{filename}' ({chunk_count} bloques)")
+
+
+def iter_decrypted_records(filename: str = "ade.bin", workers: int = None):
+    """
+    Generador que descifra 'filename' bloque a bloque y va entregando los registros,
+    de modo que quien lo consume puede empezar antes de haber leído todo el fichero.
 
-    # C. Cifrar: Genera el "churrete" ilegible
-    encrypted_data = encrypt_data(data_bytes)
+    Admite también el formato antiguo (un único token Fernet con todo el JSON).
+    Lanza ValueError si algún bloque está corrupto o la clave no es la correcta.
+    """
+    with open(filename, "rb") as f:
+        header = f.read(len(SNAPSHOT_MAGIC))
 
-    # D. Escribir: Guardamos lo cifrado directamente
-    with open(filename, 'wb') as file:
-        file.write(encrypted_data)
+        if header == SNAPSHOT_MAGIC:
+            frames = _read_frames(f)
+        elif header == SNAPSHOT_MAGIC_V2:
+            # Formato 'ADE2': un token en base64 por línea
+            frames = (base64.urlsafe_b64decode(line.rstrip(b"\n")) for line in f if line.strip())
+        else:
+            # Formato antiguo: todo el fichero es un único token
+            decrypted = decrypt_data(header + f.read())
+            if not decrypted:
+                raise ValueError(f"No se pudo descifrar '{filename}'.")
+            yield from json.loads(decrypted.decode('utf-8'))
+            return
 
-    print(f"🔒 Datos guardados cifrados en '{filename}'")
+        from cryptography.fernet import InvalidToken
+        try:
+            for chunk in _ordered_map(_decrypt_chunk, frames, workers):
+                yield from chunk
+        except InvalidToken:
+            raise ValueError(f"Bloque corrupto o clave incorrecta en '{filename}'.")
 
 # 2. FUNCIÓN AUTÓNOMA PARA ENCRIPTAR Y LIMPIAR (Ahora usa la función local)
 def encrypt_and_cleanup(input_filename: str = "ammo_data.json", output_filename: str = "ade.bin"):
@@ -95,44 +254,121 @@ def encrypt_and_cleanup(input_filename: str = "ammo_data.json", output_filename:
 
 # --- FIN FUNCIÓN AUTÓNOMA PARA ENCRIPTAR Y LIMPIAR ---
 
-def load_and_decrypt_data(filename: str = "ade.bin") -> list:
+# --- METADATOS DEL SNAPSHOT ---
+# Junto a 'ade.bin' guardamos 'ade.bin.meta.json' (en claro, sin datos de munición):
+# cuándo se descargó, cuántos registros tiene, la versión del esquema y la huella
+# (hash) de la respuesta cruda de la API que lo generó.
+# SNAPSHOT_SCHEMA_VERSION hay que subirla cuando cambien los campos de los registros.
+SNAPSHOT_SCHEMA_VERSION = 1
+# Antigüedad máxima (segundos) para reutilizar el snapshot sin llamar a la API; 0 = nunca
+SNAPSHOT_TTL = float(os.environ.get("SNAPSHOT_TTL", "0"))
+
+
+def save_snapshot_metadata(filename: str = "ade.bin", record_count: int = 0, fingerprint: str = None,
+                           validators: dict = None):
+    """
+    Guarda los metadatos del snapshot 'filename' recién escrito.
+    'validators' son las cabeceras ETag/Last-Modified de la respuesta, para pedir
+    la siguiente vez solo si hubo cambios.
+    """
+    previous = load_snapshot_metadata(filename) or {}
+    metadata = {
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "fetched_at_ts": time.time(),
+        "record_count": record_count,
+        "schema_version": SNAPSHOT_SCHEMA_VERSION,
+        "fingerprint": fingerprint,
+        "validators": validators or {},
+        # Última descarga completa (con stats); los refrescos de precios no la cambian
+        "stats_fetched_at_ts": time.time(),
+        "price_fingerprint": None,
+        # Esquemas de respuesta que ya pasaron una validación completa (e.VALIDATION_MODE)
+        "validated_schemas": previous.get("validated_schemas", []),
+    }
+    with open(f"{filename}.meta.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def load_snapshot_metadata(filename: str = "ade.bin") -> dict:
+    """Metadatos del snapshot 'filename', o None si no existe el snapshot o sus metadatos."""
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(f"{filename}.meta.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def is_snapshot_fresh(filename: str = "ade.bin", max_age: float = SNAPSHOT_TTL) -> bool:
+    """
+    True si hay un snapshot con el esquema actual, con registros y descargado hace
+    menos de 'max_age' segundos (en ese caso no hace falta volver a llamar a la API).
+    """
+    if max_age <= 0:
+        return False
+    metadata = load_snapshot_metadata(filename)
+    if not metadata or metadata.get("schema_version") != SNAPSHOT_SCHEMA_VERSION:
+        return False
+    if not metadata.get("record_count"):
+        return False
+    return time.time() - metadata.get("fetched_at_ts", 0) < max_age
+
+
+def load_fingerprint(filename: str = "ade.bin") -> str:
+    """Devuelve la huella guardada del snapshot 'filename', o None si no hay."""
+    metadata = load_snapshot_metadata(filename)
+    return metadata.get("fingerprint") if metadata else None
+
+
+def update_snapshot_metadata(filename: str = "ade.bin", **fields):
+    """Modifica solo algunos campos de los metadatos (p. ej. tras un refresco de precios)."""
+    metadata = load_snapshot_metadata(filename)
+    if metadata is None:
+        return
+    metadata.update(fields)
+    with open(f"{filename}.meta.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def load_validators(filename: str = "ade.bin") -> dict:
+    """Cabeceras ETag/Last-Modified guardadas con el snapshot 'filename' ({} si no hay)."""
+    metadata = load_snapshot_metadata(filename)
+    return (metadata.get("validators") or {}) if metadata else {}
+
+
+def clear_fingerprint(filename: str = "ade.bin"):
+    """Olvida la huella (y los validadores HTTP) para que la siguiente ejecución procese los datos sí o sí."""
+    metadata = load_snapshot_metadata(filename)
+    if metadata and (metadata.get("fingerprint") or metadata.get("validators") or metadata.get("price_fingerprint")):
+        update_snapshot_metadata(filename, fingerprint=None, validators={}, price_fingerprint=None)
+
+# --- FIN METADATOS DEL SNAPSHOT ---
+
+@metrics.instrumented("crypt.load_and_decrypt_data")
+def load_and_decrypt_data(filename: str = "ade.bin", workers: int = None) -> list:
     """
     Lee el archivo cifrado, lo desencripta y carga el contenido
     en una variable de Python (lista de diccionarios).
     """
     print(f"\n{Fore.CYAN}--- Iniciando Desencriptación y Carga ---")
-    
-    # 1. Leer el archivo binario cifrado
-    try:
-        with open(filename, "rb") as f:
-            encrypted_data = f.read()
-            
-    except FileNotFoundError:
+
+    if not os.path.exists(filename):
         print(f"{Fore.RED}Error: Archivo '{filename}' no encontrado. Asegúrate de que existe.")
         return []
-        
-    print(f"{Fore.CYAN}Desencriptando datos...")
-    
-    # 2. Desencriptar los datos (usando la función definida arriba)
-    decrypted_data_bytes = decrypt_data(encrypted_data)
-    
-    if not decrypted_data_bytes:
-        print(f"{Fore.RED}La desencriptación falló. Los datos no se pudieron recuperar.")
-        return []
 
-    # 3. Decodificar los bytes a string JSON
-    decrypted_json_string = decrypted_data_bytes.decode('utf-8')
+    print(f"{Fore.CYAN}Desencriptando datos...")
 
-    # 4. Cargar el string JSON en una variable de Python
     try:
-        # La variable `ammo_data_list` contendrá tu estructura de datos aplanada
-        data_variable = json.loads(decrypted_json_string) 
+        # La variable `data_variable` contendrá tu estructura de datos aplanada
+        data_variable = list(iter_decrypted_records(filename, workers))
+        metrics.count("records", len(data_variable))
         print(f"{Fore.GREEN}Desencriptación y carga exitosa. Datos listos en una variable.")
-        # print(data_variable)
         return data_variable
-        
-    except json.JSONDecodeError:
-        print(f"{Fore.RED}Error: El contenido desencriptado no es JSON válido.")
+
+    except ValueError as e:
+        # Incluye json.JSONDecodeError y los bloques que no se pueden descifrar
+        print(f"{Fore.RED}La desencriptación falló. Los datos no se pudieron recuperar: {e}")
         return []
 
 # --- Bloque de Ejecución para Pruebas ---
\ No newline at end of file
@@ -1,44 +1,27 @@
-import requests
 import json
+import hashlib
+import os
+import time
 import crypt
-from pydantic import BaseModel, ValidationError
+import metrics
+from functools import cache
 from colorama import Fore
+# requests (fetch_client.py) y pydantic (schemas.py) se importan al descargar/validar:
+# importar este módulo es barato (update.py --health, CLI, etc.)
 
-# Classes con Pydantic
-class Trade(BaseModel):
-    price: int
-    currency: str
-    priceRUB: int
-    source: str
-
-class Item(BaseModel):
-    id: str
-    shortName: str
-    name: str
-    iconLink: str
-    basePrice: int
-    buyFor: list[Trade]
-    sellFor: list[Trade]
-
-class Ammo(BaseModel):
-    item: Item
-    ammoType: str
-    caliber: str
-    projectileCount: int
-    damage: int
-    armorDamage: int
-    fragmentationChance: float
-    penetrationChance: float
-    penetrationPower: int
-    penetrationPowerDeviation: float
-    accuracyModifier: float
-    recoilModifier: float
-    lightBleedModifier: float
-    heavyBleedModifier: float
-    staminaBurnPerDamage: float
-
-class AmmoResponse(BaseModel):
-    ammo: list[Ammo]
+# 'strict' valida siempre todo. 'lenient' se salta la validación de cada Trade si el
+# esquema (consulta + modelos) es uno que ya se validó entero con éxito anteriormente.
+VALIDATION_MODE = os.environ.get("VALIDATION_MODE", "strict")
+
+# Estados que devuelve fetch_and_save_ammo_data
+FETCH_OK = "ok"                  # Datos nuevos validados y guardados en 'ade.bin'
+FETCH_NO_CHANGE = "no_change"    # La API devolvió exactamente lo mismo que la última vez
+FETCH_CACHED = "cached"          # No se llamó a la API: el snapshot en disco aún es reciente
+FETCH_ERROR = "error"            # Fallo de red, de GraphQL o de validación
+FETCH_NEEDS_FULL = "needs_full"  # Refresco de precios imposible (sin snapshot o balas nuevas/retiradas)
+
+# Cada cuánto (segundos) toca la consulta completa con stats; entre medias basta con precios
+STATS_REFRESH_INTERVAL = float(os.environ.get("STATS_REFRESH_INTERVAL", "21600"))
 
 GRAPHQL_QUERY = """
 {
@@ -80,69 +63,242 @@ GRAPHQL_QUERY = """
 }
 """
 
+# Consulta ligera: entre parches solo cambian las ofertas de compra/venta
+PRICE_QUERY = """
+{
+  ammo(lang: en) {
+    item {
+      id
+      buyFor {
+        price
+        currency
+        priceRUB
+        source
+      }
+      sellFor {
+        price
+        currency
+        priceRUB
+        source
+      }
+    }
+  }
+}
+"""
+
+
+def full_refresh_due(filename: str = "ade.bin", interval: float = STATS_REFRESH_INTERVAL) -> bool:
+    """True si no hay snapshot o la última descarga completa tiene más de 'interval' segundos."""
+    metadata = crypt.load_snapshot_metadata(filename)
+    if not metadata or metadata.get("schema_version") != crypt.SNAPSHOT_SCHEMA_VERSION:
+        return True
+    return time.time() - metadata.get("stats_fetched_at_ts", 0) >= interval
+
+
+@cache
+def schema_fingerprint(query: str, kind: str) -> str:
+    """Huella del esquema esperado: la consulta GraphQL y el JSON Schema de los modelos."""
+    import schemas
+    schema = json.dumps(schemas.adapter(schemas.RESPONSE_TYPES[kind][0]).json_schema(), sort_keys=True)
+    return hashlib.sha256((query + schema).encode('utf-8')).hexdigest()
+
+
+@metrics.instrumented("e.validate_response")
+def validate_response(content: bytes, query: str, kind: str,
+                      filename: str = "ade.bin", mode: str = None) -> tuple[dict, str]:
+    """
+    Valida los bytes de la respuesta sin pasar por response.json().
+
+    'kind' es la consulta ("ammo" o "price", ver schemas.RESPONSE_TYPES).
+    Retorna (respuesta validada, huella del esquema si la validación fue completa o None).
+    Lanza ValidationError (también si el JSON está mal formado).
+    """
+    import schemas
+    metrics.count("bytes", len(content))
+    strict_type, lenient_type = schemas.RESPONSE_TYPES[kind]
+    mode = mode or VALIDATION_MODE
+    schema = schema_fingerprint(query, kind)
+    metadata = crypt.load_snapshot_metadata(filename) or {}
+    if mode == "lenient" and schema in metadata.get("validated_schemas", []):
+        return schemas.adapter(lenient_type).validate_json(content), None
+    return schemas.adapter(strict_type).validate_json(content), schema
+
+
+def _remember_schema(filename: str, schema: str):
+    """Apunta en los metadatos que este esquema ya pasó una validación completa."""
+    if not schema:
+        return
+    metadata = crypt.load_snapshot_metadata(filename) or {}
+    known = metadata.get("validated_schemas", [])
+    if schema not in known:
+        crypt.update_snapshot_metadata(filename, validated_schemas=known + [schema])
+
 
-def fetch_and_save_ammo_data():
-    api_url = "https://api.tarkov.dev/graphql"
+@metrics.instrumented("e.flatten_ammo", count_input=True)
+def flatten_ammo(ammo_list: list) -> list:
+    """Sube los campos de 'item' al nivel de cada bala (modifica las entradas recibidas)."""
+    output_list = []
+    for ammo in ammo_list:
+        record = ammo.pop('item')
+        record.update(ammo)
+        output_list.append(record)
+    return output_list
+
+
+@metrics.instrumented("e.fetch_and_save_ammo_data")
+def fetch_and_save_ammo_data(max_age: float = crypt.SNAPSHOT_TTL):
+    """
+    Descarga la munición de tarkov.dev, la valida, la aplana y la guarda cifrada.
+
+    Si el snapshot en disco tiene menos de 'max_age' segundos no se llama a la API.
+    Si el hash de la respuesta cruda coincide con el del snapshot anterior no se
+    valida ni se reescribe nada.
+    Retorna FETCH_OK, FETCH_CACHED, FETCH_NO_CHANGE o FETCH_ERROR.
+    """
     output_filename = "ade.bin"
 
+    if crypt.is_snapshot_fresh(output_filename, max_age):
+        print(f"{Fore.YELLOW}Reutilizando '{output_filename}' (descargado hace menos de {max_age:.0f}s).")
+        return FETCH_CACHED
+
+    import requests
+    import fetch_client
+    from pydantic import ValidationError
+    api_url = fetch_client.API_URL
+
     print(f"{Fore.CYAN}Realizando solicitud a la API de Tarkov...")
 
     try:
-        response = requests.post(api_url, json={'query': GRAPHQL_QUERY})
-        response.raise_for_status() 
-        raw_data = response.json()
+        # Sesión reutilizada, timeouts y reintentos con backoff; petición condicional si
+        # tenemos ETag/Last-Modified de la descarga anterior
+        response = fetch_client.post_graphql(GRAPHQL_QUERY, url=api_url,
+                                             validators=crypt.load_validators(output_filename))
+        if response.status_code == 304:
+            print(f"{Fore.YELLOW}La API indica que los datos no han cambiado (304). Nada que actualizar.")
+            # La consulta completa se hizo: hasta dentro de STATS_REFRESH_INTERVAL bastan los precios
+            crypt.update_snapshot_metadata(output_filename, stats_fetched_at_ts=time.time())
+            return FETCH_NO_CHANGE
+
+        # Huella de los bytes tal cual llegan: si no cambian, el resto del pipeline sobra
+        fingerprint = hashlib.sha256(response.content).hexdigest()
+        if fingerprint == crypt.load_fingerprint(output_filename):
+            print(f"{Fore.YELLOW}La API devolvió los mismos datos que la última vez. Nada que actualizar.")
+            crypt.update_snapshot_metadata(output_filename, stats_fetched_at_ts=time.time())
+            return FETCH_NO_CHANGE
+
+        print("Validando datos con Pydantic...")
+        try:
+            # 1. Validación directa de los bytes de la respuesta
+            raw_data, schema = validate_response(response.content, GRAPHQL_QUERY, "ammo", output_filename)
+        except ValidationError as e:
+            print(f"{Fore.RED}Error de validación de Pydantic:")
+            print(e)
+            return FETCH_ERROR
 
-        if 'errors' in raw_data:
+        if raw_data.get('errors'):
             print(f"{Fore.RED}Error en la respuesta de GraphQL:")
             print(raw_data['errors'])
-            return
+            return FETCH_ERROR
 
         ammo_data = raw_data.get('data')
         if not ammo_data:
             print(f"{Fore.RED}No se encontró la clave 'data' en la respuesta.")
-            return
+            return FETCH_ERROR
+        print(f"{Fore.BLUE}Validación {'completa' if schema else 'ligera'} exitosa. "
+              f"Se encontraron {len(ammo_data['ammo'])} tipos de munición.")
 
-        print("Validando datos con Pydantic...")
-        try:
-            # 1. Validación (igual que antes)
-            validated_response = AmmoResponse(**ammo_data)
-            print(f"{Fore.BLUE}Validación exitosa. Se encontraron {len(validated_response.ammo)} tipos de munición.")
-
-            # --- INICIO DEL CAMBIO ---
-            # 2. Transformación de los datos
-            print(f"{Fore.BLUE}Aplanando la estructura de datos...")
-
-            output_list = []
-            for ammo_object in validated_response.ammo:
-                # Convertimos el 'item' anidado a un diccionario
-                item_data = ammo_object.item.model_dump()
-
-                # Convertimos el objeto 'ammo' principal a un diccionario,
-                # pero *excluimos* el 'item' para que no se duplique.
-                ammo_data = ammo_object.model_dump(exclude={'item'})
-
-                # Unimos los dos diccionarios. 
-                # (Los campos del 'item' ahora están al mismo nivel)
-                item_data.update(ammo_data)
-
-                output_list.append(item_data)
-
-            # 3. Guardado (ahora guardamos la 'output_list')
-            print(f"{Fore.GREEN}Guardando {len(output_list)} items aplanados en '{output_filename}'...")
-            crypt.save_encrypted_variable(output_list)
-            """"
-            with open(output_filename, "w", encoding="utf-8") as f:
-                # Usamos json.dump() para guardar la lista directamente
-                json.dump(output_list, f, indent=4, ensure_ascii=False)
-            # --- FIN DEL CAMBIO ---
-            """
-            print(f"¡Éxito! Datos aplanados guardados en '{output_filename}'.")
+        # 2. Aplanado en una sola pasada: los campos del 'item' suben al nivel de la bala
+        print(f"{Fore.BLUE}Aplanando la estructura de datos...")
+        output_list = flatten_ammo(ammo_data['ammo'])
+        metrics.count("records", len(output_list))
 
-        except ValidationError as e:
-            print(f"{Fore.RED}Error de validación de Pydantic:")
-            print(e)
+        # 3. Guardado
+        print(f"{Fore.GREEN}Guardando {len(output_list)} items aplanados en '{output_filename}'...")
+        crypt.save_encrypted_variable(output_list, output_filename)
+        crypt.save_snapshot_metadata(output_filename, len(output_list), fingerprint,
+                                     fetch_client.response_validators(response))
+        _remember_schema(output_filename, schema)
+        print(f"¡Éxito! Datos aplanados guardados en '{output_filename}'.")
+        return FETCH_OK
+
+    except requests.exceptions.RequestException as e:
+        print(f"{Fore.RED} al conectar con la API: {e}")
+
+    return FETCH_ERROR
+
+
+@metrics.instrumented("e.fetch_prices")
+def fetch_prices(filename: str = "ade.bin") -> tuple[str, list, dict]:
+    """
+    Refresco ligero: descarga solo buyFor/sellFor y los mezcla con el snapshot existente,
+    sin guardarlo: el snapshot solo debe avanzar cuando Mongo ya tiene los precios nuevos
+    (ver save_prices).
+
+    Retorna (estado, registros completos de las balas cuyas ofertas cambiaron, snapshot
+    mezclado para save_prices). Si no hay snapshot o el conjunto de balas de la API no
+    coincide con el del snapshot, retorna FETCH_NEEDS_FULL: hace falta la consulta completa.
+    """
+    metadata = crypt.load_snapshot_metadata(filename)
+    if not metadata:
+        return FETCH_NEEDS_FULL, [], None
 
+    import requests
+    import fetch_client
+    from pydantic import ValidationError
+    print(f"{Fore.CYAN}Solicitando solo precios a la API de Tarkov...")
+    try:
+        response = fetch_client.post_graphql(PRICE_QUERY)
+        fingerprint = hashlib.sha256(response.content).hexdigest()
+        if fingerprint == metadata.get("price_fingerprint"):
+            print(f"{Fore.YELLOW}Los precios no han cambiado desde el último refresco.")
+            return FETCH_NO_CHANGE, [], None
+
+        raw_data, schema = validate_response(response.content, PRICE_QUERY, "price", filename)
+        if raw_data.get('errors') or not raw_data.get('data'):
+            print(f"{Fore.RED}Error en la respuesta de GraphQL: {raw_data.get('errors')}")
+            return FETCH_ERROR, [], None
+        prices = raw_data['data']['ammo']
     except requests.exceptions.RequestException as e:
         print(f"{Fore.RED} al conectar con la API: {e}")
-    except json.JSONDecodeError:
-        print(f"{Fore.RED}Error: No se pudo decodificar la respuesta JSON de la API.")
+        return FETCH_ERROR, [], None
+    except ValidationError as e:
+        print(f"{Fore.RED}Error de validación de Pydantic:")
+        print(e)
+        return FETCH_ERROR, [], None
+
+    records = crypt.load_and_decrypt_data(filename)
+    by_id = {record['id']: record for record in records}
+    if not records or set(by_id) != {ammo['item']['id'] for ammo in prices}:
+        print(f"{Fore.YELLOW}Hay balas nuevas o retiradas: hace falta la consulta completa.")
+        return FETCH_NEEDS_FULL, [], None
+
+    metrics.count("records", len(records))
+    changed = []  # Registros del snapshot (ya con los precios nuevos) que cambiaron
+    for ammo in prices:
+        item = ammo['item']
+        record = by_id[item['id']]
+        buy_for, sell_for = item['buyFor'], item['sellFor']
+        if record['buyFor'] != buy_for or record['sellFor'] != sell_for:
+            record['buyFor'], record['sellFor'] = buy_for, sell_for
+            changed.append(record)
+
+    _remember_schema(filename, schema)
+    if not changed:
+        # Snapshot y Mongo ya tienen estos precios: se puede apuntar la huella
+        print(f"{Fore.YELLOW}Ninguna bala cambió de precio.")
+        crypt.update_snapshot_metadata(filename, price_fingerprint=fingerprint)
+        return FETCH_NO_CHANGE, [], None
+
+    metrics.count("records_changed", len(changed))
+    print(f"{Fore.GREEN}{len(changed)} balas con precios nuevos.")
+    return FETCH_OK, changed, {"records": records, "price_fingerprint": fingerprint}
+
+
+def save_prices(merged: dict, filename: str = "ade.bin"):
+    """Guarda el snapshot mezclado por fetch_prices y su huella de precios (tras escribir en Mongo)."""
+    print(f"{Fore.GREEN}Guardando precios nuevos en '{filename}'...")
+    crypt.save_encrypted_variable(merged["records"], filename)
+    # La huella de la respuesta completa ya no describe el snapshot: la siguiente
+    # consulta completa debe procesarse aunque devuelva lo mismo que la última vez
+    crypt.update_snapshot_metadata(filename, fetched_at_ts=time.time(), price_fingerprint=merged["price_fingerprint"],
+                                   fingerprint=None, validators={})
@@ -0,0 +1,139 @@
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from colorama import Fore
+
+import metrics
+
+# --- CONFIGURACIÓN (desde el entorno) ---
+# TARKOV_API_URL permite apuntar a stub_graphql.py para pruebas y benchmarks sin red
+API_URL = os.environ.get("TARKOV_API_URL", "https://api.tarkov.dev/graphql")
+CONNECT_TIMEOUT = float(os.environ.get("FETCH_CONNECT_TIMEOUT", "5"))   # Segundos para abrir la conexión
+READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", "30"))        # Segundos máximos entre bytes recibidos
+MAX_RETRIES = int(os.environ.get("FETCH_MAX_RETRIES", "4"))             # Reintentos tras el primer intento
+BACKOFF_BASE = float(os.environ.get("FETCH_BACKOFF_BASE", "1"))         # Espera base del backoff (segundos)
+BACKOFF_MAX = float(os.environ.get("FETCH_BACKOFF_MAX", "30"))          # Tope de cada espera
+
+# Respuestas que merece la pena reintentar (saturación o fallo temporal del servidor)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+try:
+    import brotli  # noqa: F401  Opcional: si está instalado, urllib3 descomprime 'br'
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# --- SESIÓN COMPARTIDA ---
+# Una sesión por proceso: reutiliza la conexión TCP/TLS entre ejecuciones del bucle de update
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Devuelve la sesión HTTP compartida del proceso, creándola si aún no existe."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                # Los reintentos los hacemos nosotros (con backoff y jitter), no urllib3
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Accept": "application/json",
+                    "Accept-Encoding": ACCEPT_ENCODING,
+                    "Content-Type": "application/json",
+                    "User-Agent": "eft-etl/1.0",
+                })
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def close_session() -> None:
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session, _session_pid = None, None
+
+
+# --- REINTENTOS ---
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Backoff exponencial con 'full jitter': espera aleatoria entre 0 y min(cap, base * 2^intento)."""
+    base = BACKOFF_BASE if base is None else base
+    cap = BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(response: requests.Response) -> float:
+    """Segundos que pide el servidor en la cabecera Retry-After (solo la forma numérica)."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return None
+
+
+def response_validators(response: requests.Response) -> dict:
+    """Cabeceras de la respuesta que permiten pedir después solo si hubo cambios."""
+    validators = {}
+    if response.headers.get("ETag"):
+        validators["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return validators
+
+
+@metrics.instrumented("fetch_client.post_graphql")
+def post_graphql(query: str, url: str = None, validators: dict = None,
+                 timeout: tuple = None, max_retries: int = MAX_RETRIES) -> requests.Response:
+    """
+    Envía la consulta GraphQL por POST con la sesión compartida.
+
+    - Timeouts de conexión y de lectura (no se queda colgado si la API no responde).
+    - Reintenta errores de red, timeouts y respuestas RETRY_STATUSES con backoff
+      exponencial y jitter (respeta Retry-After si el servidor lo envía).
+    - Con 'validators' (de response_validators) hace una petición condicional:
+      si el servidor lo soporta y nada cambió, devuelve la respuesta 304 sin cuerpo.
+
+    Lanza requests.exceptions.RequestException si se agotan los reintentos.
+    """
+    url = url or API_URL
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    body = json.dumps({'query': query}).encode('utf-8')
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        metrics.count("http_attempts")
+        try:
+            response = session.post(url, data=body, headers=headers, timeout=timeout)
+            if response.status_code not in RETRY_STATUSES:
+                if response.status_code != 304:
+                    response.raise_for_status()
+                metrics.count("bytes", len(response.content))
+                return response
+            if attempt == max_retries:
+                response.raise_for_status()
+            delay = _retry_after(response)
+            reason = f"HTTP {response.status_code}"
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            delay, reason = None, type(e).__name__
+
+        delay = backoff_delay(attempt) if delay is None else min(delay, BACKOFF_MAX)
+        print(f"{Fore.YELLOW}Intento {attempt + 1}/{max_retries + 1} fallido ({reason}). "
+              f"Reintentando en {delay:.1f}s...")
+        time.sleep(delay)
@@ -1,16 +1,48 @@
+"""
+Descarga la munición, la puntúa y la carga en MongoDB.
+
+Uso (desde /eft-etl):
+    python main.py                                  # Descarga y procesa 'ade.bin' en memoria
+    python main.py --stream [--snapshot dump.bin]   # Streaming en dos pasadas (memoria acotada)
+
+Con --snapshot no se descarga nada: se puntúa ese fichero (p. ej. un volcado histórico).
+"""
+import argparse
 import e
 import tl
 import crypt
 import mondongo
+import metrics
+import armor_sim
+from ammo_table import AmmoTable
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream", action="store_true",
+                        help="Procesa el snapshot por lotes sin cargarlo entero (Q1/Q3 con QuantileSketch).")
+    parser.add_argument("--snapshot", help="Snapshot cifrado a procesar en lugar de descargar 'ade.bin'.")
+    parser.add_argument("--batch-size", type=int, default=tl.STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+    snapshot = args.snapshot or "ade.bin"
+
+    metrics.start_run("stream" if args.stream else "main")
+    mondongo.ensure_indexes()
+    if not args.snapshot:
+        e.fetch_and_save_ammo_data()
 
-    e.fetch_and_save_ammo_data()
-    # crypt.encrypt_and_cleanup()
-    data = crypt.load_and_decrypt_data()
-    data = tl.clean_caliber_data(data)
-    data = tl.calculate_finalScore(data)
-    data = tl.normalize_and_update_scores(data)
-    data = tl.print_ammo(data)
-    # print(data)
-    mondongo.upload_to_mongodb_2(data)
+    if args.stream:
+        data = tl.stream_normalized(lambda: crypt.iter_decrypted_records(snapshot), args.batch_size)
+        mondongo.upload_to_mongodb_2(data)
+    else:
+        # crypt.encrypt_and_cleanup()
+        data = AmmoTable.from_records(crypt.load_and_decrypt_data(snapshot))
+        data = tl.clean_caliber_data(data)
+        data = tl.calculate_finalScore(data)
+        data = tl.score_profiles(data)
+        data = armor_sim.simulate_armor(data)
+        data = tl.normalize_and_update_scores(data)
+        data = tl.print_ammo(data)
+        # print(data)
+        mondongo.upload_to_mongodb_2(data)
+    mondongo.refresh_view()
+    metrics.finish_run(e.FETCH_OK)
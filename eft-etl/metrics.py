@@ -0,0 +1,325 @@
+"""
+Instrumentación ligera del ETL: tiempo de pared, tiempo de CPU, memoria, registros y
+operaciones de Mongo de cada etapa de cada ejecución.
+
+Cada ejecución (update.py, main.py) abre un informe con start_run() y lo cierra con
+finish_run(), que lo añade a METRICS_FILE conservando solo los METRICS_KEEP últimos.
+Las etapas se marcan con el decorador @instrumented o con el contexto stage(); fuera
+de una ejecución no se guarda nada (p. ej. en bench_pipeline.py).
+
+La memoria es el máximo de RSS del proceso al terminar cada etapa. Con
+ETL_TRACE_MEMORY=1 se añade el pico de tracemalloc de cada etapa (más caro).
+
+app.py sirve el último informe y sus histogramas de latencia en /metrics
+(formato de texto de Prometheus, ver render_prometheus).
+
+Uso (desde /eft-etl), para ver los últimos informes:
+    python metrics.py [--file etl_runs.json] [--last 5]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+try:
+    import resource  # Solo en Unix; sin él no se informa del RSS
+except ImportError:
+    resource = None
+
+# --- CONFIGURACIÓN (desde el entorno) ---
+METRICS_FILE = os.environ.get("ETL_METRICS_FILE", "etl_runs.json")
+METRICS_KEEP = int(os.environ.get("ETL_METRICS_KEEP", "50"))   # Informes que se conservan
+TRACE_MEMORY = os.environ.get("ETL_TRACE_MEMORY", "0") == "1"
+
+MB = 2 ** 20
+
+# --- ESTADO DE LA EJECUCIÓN EN CURSO ---
+_run = None    # Informe abierto por start_run()
+_stack = []    # Etapas abiertas; la última recibe los contadores de count()
+_lock = threading.Lock()
+
+
+def _max_rss_mb() -> float:
+    if resource is None:
+        return None
+    # ru_maxrss va en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def start_run(mode: str) -> dict:
+    """Abre el informe de una ejecución. Las etapas siguientes se anotan en él."""
+    global _run
+    if TRACE_MEMORY:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    with _lock:
+        _stack.clear()
+        _run = {
+            "mode": mode,
+            "status": None,
+            "started_at": _now(),
+            "started_at_ts": time.time(),
+            "stages": [],
+            "_wall": time.perf_counter(),
+            "_cpu": time.process_time(),
+        }
+    return _run
+
+
+def finish_run(status: str, filename: str = None, keep: int = None, **extra) -> dict:
+    """Cierra el informe en curso y lo guarda en 'filename'. Retorna el informe (o None)."""
+    global _run
+    with _lock:
+        report, _run = _run, None
+        _stack.clear()
+    if report is None:
+        return None
+
+    report.update(extra, status=status,
+                  duration_s=round(time.perf_counter() - report.pop("_wall"), 6),
+                  cpu_s=round(time.process_time() - report.pop("_cpu"), 6),
+                  max_rss_mb=_max_rss_mb())
+    # Las etapas se anotan al terminar (las anidadas antes que su padre): orden de inicio
+    report["stages"].sort(key=lambda entry: entry["offset_s"])
+    save_run(report, filename, keep)
+    return report
+
+
+def save_run(report: dict, filename: str = None, keep: int = None):
+    """Añade 'report' a los informes guardados (escritura atómica, solo los 'keep' últimos)."""
+    filename = filename or METRICS_FILE
+    keep = METRICS_KEEP if keep is None else keep
+    runs = (load_runs(filename) + [report])[-keep:]
+    tmp = f"{filename}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(runs, f, indent=1)
+        os.replace(tmp, filename)
+    except OSError as error:
+        # Las métricas nunca deben tumbar una actualización
+        print(f"No se pudieron guardar las métricas en '{filename}': {error}")
+
+
+def load_runs(filename: str = None) -> list:
+    """Informes guardados, del más antiguo al más reciente ([] si no hay)."""
+    try:
+        with open(filename or METRICS_FILE, "r", encoding="utf-8") as f:
+            runs = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+    return runs if isinstance(runs, list) else []
+
+
+# --- ETAPAS ---
+
+@contextmanager
+def stage(name: str, records: int = None):
+    """Mide el bloque como una etapa de la ejecución en curso (nada si no hay ninguna)."""
+    if _run is None:
+        yield
+        return
+
+    entry = {"stage": name, "depth": len(_stack), "counts": {}}
+    if records is not None:
+        entry["counts"]["records"] = records
+    if TRACE_MEMORY:
+        import tracemalloc
+        if _stack:
+            # reset_peak() borra el pico de la etapa padre: se lo guardamos antes
+            _stack[-1]["_peak"] = max(_stack[-1]["_peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        entry["_base"], entry["_peak"] = tracemalloc.get_traced_memory()[0], 0
+
+    with _lock:
+        _stack.append(entry)
+    run = _run
+    wall, cpu = time.perf_counter(), time.process_time()
+    entry["offset_s"] = round(wall - run["_wall"], 6)
+    try:
+        yield
+    finally:
+        entry["wall_s"] = round(time.perf_counter() - wall, 6)
+        entry["cpu_s"] = round(time.process_time() - cpu, 6)
+        entry["max_rss_mb"] = _max_rss_mb()
+        if TRACE_MEMORY:
+            import tracemalloc
+            peak = max(entry.pop("_peak"), tracemalloc.get_traced_memory()[1])
+            entry["peak_traced_mb"] = round((peak - entry.pop("_base")) / MB, 3)
+        with _lock:
+            _stack[:] = [open_entry for open_entry in _stack if open_entry is not entry]
+            if TRACE_MEMORY and _stack:
+                _stack[-1]["_peak"] = max(_stack[-1]["_peak"], peak)
+            run["stages"].append(entry)
+
+
+def instrumented(name: str, count_input: bool = False):
+    """
+    Decorador: cada llamada es una etapa 'name'. Con count_input=True anota como
+    'records' la longitud del primer argumento (lista o AmmoTable).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return func(*args, **kwargs)
+            records = None
+            if count_input and args and hasattr(args[0], "__len__"):
+                records = len(args[0])
+            with stage(name, records):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(counter: str, value: int = 1):
+    """Suma 'value' al contador 'counter' de la etapa abierta más interna."""
+    if _run is None or not _stack:
+        return
+    with _lock:
+        if _stack:
+            counts = _stack[-1]["counts"]
+            counts[counter] = counts.get(counter, 0) + value
+
+
+# --- PROMETHEUS ---
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Histograma acumulativo de latencias por combinación de etiquetas (seguro entre hilos)."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # etiquetas -> [cuentas por bucket (+Inf al final), suma]
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self.lock:
+            counts, total = self.series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: (list(counts), total[0]) for labels, (counts, total) in self.series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            base = _labels(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(list(zip(self.label_names, labels)) + [('le', le)])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+def _labels(pairs) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _gauge(name: str, help_text: str, samples: list) -> list:
+    """samples: [(etiquetas como pares, valor)]. Omite los valores None."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples if value is not None]
+    return lines
+
+
+def stage_totals(report: dict) -> dict:
+    """Etapas del informe agregadas por nombre (una etapa puede ejecutarse varias veces)."""
+    totals = {}
+    for entry in report.get("stages", []):
+        total = totals.setdefault(entry["stage"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "counts": {}})
+        total["calls"] += 1
+        total["wall_s"] += entry.get("wall_s", 0.0)
+        total["cpu_s"] += entry.get("cpu_s", 0.0)
+        for field in ("max_rss_mb", "peak_traced_mb"):
+            if entry.get(field) is not None:
+                total[field] = max(total.get(field, 0.0), entry[field])
+        for counter, value in entry.get("counts", {}).items():
+            total["counts"][counter] = total["counts"].get(counter, 0) + value
+    return totals
+
+
+def render_prometheus(runs: list, histograms: tuple = ()) -> str:
+    """Texto de /metrics: el último informe del ETL, el recuento de informes y los histogramas."""
+    lines = []
+    for histogram in histograms:
+        lines += histogram.render()
+
+    by_status = {}
+    for report in runs:
+        by_status[report.get("status")] = by_status.get(report.get("status"), 0) + 1
+    lines += _gauge("eft_etl_recorded_runs", "Ejecuciones del ETL guardadas, por resultado.",
+                    [([("status", status)], n) for status, n in sorted(by_status.items(), key=str)])
+
+    if runs:
+        last = runs[-1]
+        lines += _gauge("eft_etl_last_run_timestamp_seconds", "Inicio de la última ejecución del ETL.",
+                        [([("mode", last.get("mode"))], last.get("started_at_ts"))])
+        lines += _gauge("eft_etl_last_run_duration_seconds", "Duración de la última ejecución del ETL.",
+                        [([("status", last.get("status"))], last.get("duration_s"))])
+        lines += _gauge("eft_etl_last_run_cpu_seconds", "Tiempo de CPU de la última ejecución del ETL.",
+                        [([], last.get("cpu_s"))])
+
+        totals = stage_totals(last)
+        for field, name, help_text, factor in (
+                ("wall_s", "eft_etl_stage_wall_seconds", "Tiempo de pared por etapa (última ejecución).", 1),
+                ("cpu_s", "eft_etl_stage_cpu_seconds", "Tiempo de CPU por etapa (última ejecución).", 1),
+                ("max_rss_mb", "eft_etl_stage_max_rss_bytes", "RSS máximo del proceso al terminar la etapa.", MB),
+                ("peak_traced_mb", "eft_etl_stage_peak_traced_bytes", "Pico de tracemalloc de la etapa.", MB)):
+            samples = [([("stage", stage_name)], round(total[field] * factor, 6))
+                       for stage_name, total in totals.items() if total.get(field) is not None]
+            if samples:
+                lines += _gauge(name, help_text, samples)
+        lines += _gauge("eft_etl_stage_count", "Registros y operaciones de Mongo por etapa (última ejecución).",
+                        [([("stage", stage_name), ("counter", counter)], value)
+                         for stage_name, total in totals.items()
+                         for counter, value in sorted(total["counts"].items())])
+
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=METRICS_FILE)
+    parser.add_argument("--last", type=int, default=5, help="Informes a mostrar (los más recientes).")
+    args = parser.parse_args()
+
+    runs = load_runs(args.file)
+    if not runs:
+        raise SystemExit(f"No hay informes en '{args.file}'.")
+    for report in runs[-args.last:]:
+        print(f"\n=== {report['started_at']} | {report['mode']} | {report['status']} | "
+              f"{report['duration_s']:.3f}s (CPU {report['cpu_s']:.3f}s) ===")
+        print(f"{'ETAPA':<40} | {'PARED (s)':>9} | {'CPU (s)':>9} | {'RSS (MB)':>8} | {'PICO (MB)':>9} | CONTADORES")
+        print("-" * 110)
+        for entry in report["stages"]:
+            name = "  " * entry["depth"] + entry["stage"]
+            counts = ", ".join(f"{k}={v}" for k, v in entry["counts"].items())
+            rss = entry.get("max_rss_mb")
+            peak = entry.get("peak_traced_mb", "-")
+            print(f"{name:<40} | {entry['wall_s']:>9.4f} | {entry['cpu_s']:>9.4f} | "
+                  f"{rss if rss is None else round(rss, 1)!s:>8} | {peak!s:>9} | {counts}")
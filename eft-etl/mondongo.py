@@ -1,144 +1,331 @@
-from pymongo import MongoClient
 from typing import Union
-import pymongo
+from collections import defaultdict
+from collections.abc import Iterator
+from itertools import islice
+import argparse
+import sys
+import hashlib
+import json
 from datetime import datetime
+import metrics
+# Conexión y nombres (COLLECTION_NAME, ID_FIELD) salen del entorno: ver mongo_client
+from mongo_client import get_db, COLLECTION_NAME, ID_FIELD
+# pymongo y ammo_table (numpy) se importan dentro de las funciones que los usan
+
+# Sentidos de los índices (mismos valores que pymongo.ASCENDING / pymongo.DESCENDING)
+ASCENDING = 1
+DESCENDING = -1
+
+HASH_FIELD = "contentHash"        # Hash del contenido guardado junto a cada documento
+HASH_EXCLUDED_FIELDS = ("_id", "last_updated", HASH_FIELD)
+BULK_BATCH_SIZE = 500              # Operaciones por cada llamada a bulk_write
+# --- ÍNDICES ---
+# Índices que necesitan las consultas calientes del ETL y de la web. ensure_indexes()
+# los crea si no existen (create_index es idempotente) al arrancar main.py, update.py y app.py.
+# Orden con el que la web agrupa las balas: lo sirve directamente el índice 'type_caliber_pen'.
+CLASSIFIED_SORT = [("ammoType", ASCENDING), ("caliber", ASCENDING), ("penetrationPower", DESCENDING)]
+INDEXES = [
+    # Búsquedas por id de los dos cargadores (y upserts sin duplicados)
+    ([(ID_FIELD, ASCENDING)], {"name": "id_unique", "unique": True}),
+    # Agrupación tipo > calibre > penetración de la web y filtros de /api/ammo
+    (CLASSIFIED_SORT, {"name": "type_caliber_pen"}),
+    # Orden por defecto de /api/ammo (-penetrationPower, id) sin filtros
+    ([("penetrationPower", DESCENDING), (ID_FIELD, ASCENDING)], {"name": "pen_id"}),
+]
+
+# --- VISTA MATERIALIZADA DE LA WEB ---
+# Un documento por grupo (ammoType, caliber) con sus balas ya ordenadas por penetración,
+# recortadas a los campos que enseña la página y con la mejor oferta resuelta. La mantiene
+# el ETL (refresh_view, solo para los grupos que cambian) y app.py la lee con una única
+# consulta sobre 'view_type_caliber' en lugar de reagrupar la colección en cada recarga.
+VIEW_COLLECTION = "ammo_view"
+VIEW_SORT = [("ammoType", ASCENDING), ("caliber", ASCENDING)]
+VIEW_INDEXES = [
+    (VIEW_SORT, {"name": "view_type_caliber", "unique": True}),
+]
+VIEW_FIELDS = (ID_FIELD, "name", "shortName", "iconLink", "damage", "penetrationPower", "armorDamage",
+               "normalized", "tier", "shotsToKill", "penChance")
+# Lo que se lee de la colección de balas para construir la vista
+VIEW_SOURCE_PROJECTION = {"_id": 0, "ammoType": 1, "caliber": 1, "minBuyPrice": 1,
+                          **{field: 1 for field in VIEW_FIELDS}}
+CURRENCY_SYMBOLS = {"RUB": "₽", "USD": "$", "EUR": "€"}
+
+# Colección con la "versión de datos" de cada colección: el ETL la incrementa cada vez
+# que escribe, y la web la consulta para saber si su caché sigue siendo válida.
+VERSION_COLLECTION = "data_version"
+
+
+def _is_table(data) -> bool:
+    """isinstance(data, AmmoTable) sin importar ammo_table (numpy) si nadie lo ha hecho aún."""
+    ammo_table = sys.modules.get("ammo_table")
+    return ammo_table is not None and isinstance(data, ammo_table.AmmoTable)
+
+
+def bump_data_version(db, collection_name: str = COLLECTION_NAME) -> None:
+    """Incrementa la versión de datos de 'collection_name' (upsert del documento de control)."""
+    metrics.count("mongo_update_one")
+    db[VERSION_COLLECTION].update_one(
+        {"_id": collection_name},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now().isoformat()}},
+        upsert=True
+    )
+
+
+def get_data_version(db, collection_name: str = COLLECTION_NAME) -> int:
+    """Versión de datos actual de 'collection_name' (0 si el ETL aún no ha escrito nunca)."""
+    doc = db[VERSION_COLLECTION].find_one({"_id": collection_name}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+def _bulk_upsert_batch(collection, batch: list[dict[str]]) -> dict[str]:
+    """
+    Envía un lote de documentos en un único bulk_write desordenado.
+    Los documentos con 'id' se insertan con UpdateOne + $setOnInsert (upsert),
+    así que si ya existían no se tocan. Los que no tienen 'id' se insertan tal cual.
+    """
+    from pymongo import InsertOne, UpdateOne
+    from pymongo.errors import BulkWriteError
+
+    operations = []
+    for item in batch:
+        item_id = item.get(ID_FIELD)
+        if item_id:
+            document = {**item, HASH_FIELD: content_hash(item)}
+            operations.append(UpdateOne({ID_FIELD: item_id}, {"$setOnInsert": document}, upsert=True))
+        else:
+            operations.append(InsertOne(item))
 
-MONGO_URI = "mongodb://mongo:27017/"
-DATABASE_NAME = "ammo_data"        # Nombre de la base de datos
-COLLECTION_NAME = "bullets"
-ID_FIELD = "id"
-
-
-def upload_to_mongodb_2(data: Union[dict[str], list[dict[str]]]) -> None:
+    metrics.count("mongo_bulk_writes")
+    metrics.count("mongo_write_ops", len(operations))
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        inserted = result.upserted_count + result.inserted_count
+        skipped = result.matched_count
+    except BulkWriteError as e:
+        # Con ordered=False el resto del lote sigue adelante aunque falle alguna operación
+        # (p. ej. una carrera con otro proceso sobre el índice único). Contamos lo que sí entró.
+        details = e.details
+        inserted = details.get("nUpserted", 0) + details.get("nInserted", 0)
+        skipped = details.get("nMatched", 0) + len(details.get("writeErrors", []))
+
+    return {"insertados": inserted, "omitidos": skipped}
+
+
+def _batches_of(data, batch_size: int):
+    """Lotes de diccionarios de una lista, una AmmoTable o un iterador (sin materializarlo)."""
+    if isinstance(data, Iterator):
+        while batch := list(islice(data, batch_size)):
+            yield batch
+        return
+    for start in range(0, len(data), batch_size):
+        yield (data.to_records(start, start + batch_size) if _is_table(data)
+               else data[start:start + batch_size])
+
+
+@metrics.instrumented("mondongo.upload_to_mongodb_2")
+def upload_to_mongodb_2(data: Union[dict[str], list[dict[str]], "AmmoTable", Iterator[dict[str]]],
+                        batch_size: int = BULK_BATCH_SIZE) -> list[dict[str]]:
     """
     Establece conexión con MongoDB e inserta los datos proporcionados.
-    Evita duplicados comprobando si el 'id' ya existe antes de insertar.
+    Evita duplicados usando upserts con $setOnInsert sobre el 'id', enviados
+    en lotes de 'batch_size' operaciones con bulk_write.
+
+    Si recibe una AmmoTable, solo convierte a diccionarios las filas de cada lote.
+    Si recibe un iterador (p. ej. tl.stream_normalized) lo consume lote a lote, sin
+    tener nunca más de 'batch_size' documentos en memoria.
+
+    Retorna una lista con el resumen de cada lote: {'lote', 'insertados', 'omitidos'}.
     """
-    client = None
+    from pymongo.errors import ConnectionFailure
+
+    batch_results = []
     try:
-        # 1. Establecer la conexión
-        client = MongoClient(MONGO_URI)
-        # client.admin.command('ping') # Opcional: verificar conexión
+        # 1. Conexión compartida del proceso (pool de mongo_client)
+        db = get_db()
+        # db.client.admin.command('ping') # Opcional: verificar conexión
         print(f"Conectado a MongoDB para carga de datos.")
 
-        # 2. Seleccionar la base de datos y la colección
-        db = client[DATABASE_NAME]
+        # 2. Seleccionar la colección
         collection = db[COLLECTION_NAME]
 
-        # 3. Lógica de inserción 'elemento a elemento' sin duplicados
-        if isinstance(data, list):
-            print(f"Procesando lista de {len(data)} elementos...")
+        # 3. Lógica de inserción por lotes sin duplicados
+        if isinstance(data, (list, Iterator)) or _is_table(data):
+            if isinstance(data, Iterator):
+                print(f"Procesando elementos en streaming en lotes de {batch_size}...")
+            else:
+                print(f"Procesando lista de {len(data)} elementos en lotes de {batch_size}...")
             inserted_count = 0
             skipped_count = 0
 
-            for item in data:
-                # IMPORTANTE: Asegúrate de que tu JSON tiene un campo llamado 'id'
-                # Si tu campo único se llama de otra forma (ej. '_id', 'uid'), cámbialo aquí.
-                item_id = item.get('id')
-
-                if item_id and collection.find_one({"id": item_id}):
-                    # Si ya existe, no hacemos nada (skip)
-                    skipped_count += 1
-                else:
-                    # Si no existe, insertamos
-                    collection.insert_one(item)
-                    inserted_count += 1
-            
+            # IMPORTANTE: Asegúrate de que tu JSON tiene un campo llamado 'id'
+            # Si tu campo único se llama de otra forma (ej. '_id', 'uid'), cambia ID_FIELD.
+            for number, batch in enumerate(_batches_of(data, batch_size), start=1):
+                batch_summary = _bulk_upsert_batch(collection, batch)
+                batch_summary = {"lote": number, **batch_summary}
+                batch_results.append(batch_summary)
+
+                inserted_count += batch_summary["insertados"]
+                skipped_count += batch_summary["omitidos"]
+                print(f"   Lote {batch_summary['lote']}: {batch_summary['insertados']} insertados, "
+                      f"{batch_summary['omitidos']} omitidos.")
+
             print(f"Resumen: {inserted_count} insertados, {skipped_count} omitidos (ya existían).")
+            # 'records' se cuenta aquí: de un iterador no se conoce la longitud de antemano
+            metrics.count("records", inserted_count + skipped_count)
+            metrics.count("insertados", inserted_count)
+            metrics.count("omitidos", skipped_count)
+            if inserted_count:
+                bump_data_version(db)
 
         elif isinstance(data, dict):
             # Lógica para un solo documento
             item_id = data.get('id')
+            metrics.count("records")
             
             if item_id and collection.find_one({"id": item_id}):
                 print(f"El documento con id {item_id} ya existe. Omitiendo.")
             else:
                 resultado = collection.insert_one(data)
                 print(f"Documento insertado con ID interno: {resultado.inserted_id}")
+                bump_data_version(db)
 
         else:
             print("ERROR: 'data' debe ser un diccionario o una lista.")
 
-    except pymongo.errors.ConnectionError:
+    except ConnectionFailure:
         print("ERROR DE CONEXIÓN: No se pudo conectar a MongoDB.")
         print("Verifica que el contenedor de Docker esté corriendo.")
 
     except Exception as e:
         print(f"Ocurrió un error inesperado: {e}")
 
-    finally:
-        # 4. Cerrar la conexión
-        if client:
-            client.close()
-            print("Conexión con MongoDB cerrada.")
+    # 4. No cerramos la conexión: es del pool compartido y la reutilizan las siguientes llamadas
+    return batch_results
+
+
 
+def content_hash(item: dict[str]) -> str:
+    """
+    Hash canónico del contenido de un documento (claves ordenadas, sin los campos
+    de control). Dos documentos con el mismo contenido dan siempre el mismo hash.
+    """
+    payload = {k: v for k, v in item.items() if k not in HASH_EXCLUDED_FIELDS}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
 
 
-def smart_update_mongodb_2(new_data: Union[dict[str], list[dict[str]]]) -> dict[str]:
+@metrics.instrumented("mondongo.smart_update_mongodb_2", count_input=True)
+def smart_update_mongodb_2(new_data: Union[dict[str], list[dict[str]], "AmmoTable"],
+                           partial: bool = False) -> dict[str]:
     """
     Actualiza MongoDB. Muestra logs limpios (solo name).
+
+    Carga de una sola vez el 'id' y el hash de contenido de todos los documentos,
+    solo compara campo a campo los que tienen un hash distinto y envía todas las
+    inserciones y '$set' en un único bulk_write.
+
+    partial=True: 'new_data' es solo una parte de la colección (p. ej. las balas que
+    normalizer.normalize_incremental marcó como cambiadas) y el prefetch se limita a sus ids.
     """
-    client = None
+    from pymongo import InsertOne, UpdateOne
+
     results = {
         "estado": "Éxito",
         "documentos_procesados": 0,
         "documentos_modificados": 0,
         "documentos_sin_cambios": 0,
         "documentos_insertados": 0,
-        "detalles_modificados": []
+        "detalles_modificados": [],
+        "grupos_afectados": []
     }
+    groups = set()  # (ammoType, caliber) de lo insertado/modificado, para refresh_view
 
-    data_list = new_data if isinstance(new_data, list) else [new_data]
+    if _is_table(new_data):
+        # Frontera con MongoDB: aquí es donde la tabla columnar pasa a diccionarios
+        data_list = new_data.iter_records()
+    else:
+        data_list = new_data if isinstance(new_data, list) else [new_data]
+    total = len(new_data) if _is_table(new_data) else len(data_list)
 
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[DATABASE_NAME]
+        db = get_db()
         collection = db[COLLECTION_NAME]
 
-        print(f"🚀 Procesando {len(data_list)} elementos...")
+        print(f"🚀 Procesando {total} elementos...")
+
+        # 1. Prefetch: un único cursor proyectado con id + hash de todo lo existente
+        prefetch_filter = {}
+        if partial:
+            if _is_table(new_data):
+                ids = list(new_data.column(ID_FIELD)) if total else []
+            else:
+                ids = [(item.get("item") or item).get(ID_FIELD) for item in data_list]
+            prefetch_filter = {ID_FIELD: {"$in": [item_id for item_id in ids if item_id]}}
+        metrics.count("mongo_finds")
+        existing_hashes = {
+            doc[ID_FIELD]: doc.get(HASH_FIELD)
+            for doc in collection.find(prefetch_filter, {"_id": 0, ID_FIELD: 1, HASH_FIELD: 1})
+            if doc.get(ID_FIELD)
+        }
+
+        operations = []
+        candidates = []  # (item, hash) existentes cuyo hash no coincide
 
         for raw_item in data_list:
             results["documentos_procesados"] += 1
 
-            # 1. Aplanar (si viene de GraphQL)
+            # 2. Aplanar (si viene de GraphQL)
             item = raw_item.copy()
             if "item" in item and isinstance(item["item"], dict):
                 nested_item_data = item.pop("item")
                 item.update(nested_item_data)
 
-            # 2. Obtener ID
+            # 3. Obtener ID
             item_id = item.get(ID_FIELD)
             if not item_id:
                 continue
 
-            query = {ID_FIELD: item_id}
-            existing_doc = collection.find_one(query)
-
-            # --- 4. VISUALIZACIÓN LIMPIA (SOLO NAME) ---
-            if existing_doc:
-                # Extraemos solo el name para mostrarlo en el log
-                db_name = existing_doc.get('name', 'Sin Nombre')
-                # new_name = item.get('name', 'Sin Nombre')
-
-                print(f"\n🔍 Revisando: {db_name} (ID: {item_id})")
-                # print(f"   💾 [BD]:  {db_name}")  # Opcional, ya lo mostramos arriba
-                # print(f"   ✨ [NEW]: {new_name}") # Opcional, suelen ser iguales
-            else:
-                print(f"\n🆕 Creando nueva entrada: {item.get('name')} (ID: {item_id})")
-
-            # --- 5. LÓGICA DE ACTUALIZACIÓN ---
+            item_hash = content_hash(item)
 
             # CASO A: INSERTAR
-            if not existing_doc:
+            if item_id not in existing_hashes:
+                print(f"\n🆕 Creando nueva entrada: {item.get('name')} (ID: {item_id})")
                 item["last_updated"] = datetime.now().isoformat()
-                collection.insert_one(item)
+                item[HASH_FIELD] = item_hash
+                operations.append(InsertOne(item))
+                existing_hashes[item_id] = item_hash
+                groups.add(_group_of(item))
                 results["documentos_insertados"] += 1
                 continue
 
-            # CASO B: COMPARAR
+            # CASO B: MISMO HASH -> sin cambios, ni siquiera hace falta el documento
+            if existing_hashes[item_id] == item_hash:
+                results["documentos_sin_cambios"] += 1
+                continue
+
+            candidates.append((item, item_hash))
+
+        # 4. Solo traemos completos los documentos cuyo hash ha cambiado (una consulta)
+        existing_docs = {}
+        if candidates:
+            candidate_ids = [item[ID_FIELD] for item, _ in candidates]
+            metrics.count("mongo_finds")
+            for doc in collection.find({ID_FIELD: {"$in": candidate_ids}}):
+                existing_docs[doc[ID_FIELD]] = doc
+
+        for item, item_hash in candidates:
+            item_id = item[ID_FIELD]
+            query = {ID_FIELD: item_id}
+            existing_doc = existing_docs.get(item_id, {})
+
+            # --- VISUALIZACIÓN LIMPIA (SOLO NAME) ---
+            db_name = existing_doc.get('name', 'Sin Nombre')
+            print(f"\n🔍 Revisando: {db_name} (ID: {item_id})")
+
+            # CASO C: COMPARAR
             changes = {}
             for key, new_value in item.items():
-                if key in ['_id', 'last_updated']: continue
+                if key in HASH_EXCLUDED_FIELDS: continue
 
                 existing_value = existing_doc.get(key)
 
@@ -151,7 +338,7 @@ def smart_update_mongodb_2(new_data: Union[dict[str], list[dict[str]]]) -> dict[
                         "ahora": new_value
                     }
 
-            # --- 6. APLICAR CAMBIOS ---
+            # --- APLICAR CAMBIOS ---
             if changes:
                 print(f"   ⚠️ CAMBIOS DETECTADOS ({len(changes)} campos):")
                 for k, v in changes.items():
@@ -160,8 +347,11 @@ def smart_update_mongodb_2(new_data: Union[dict[str], list[dict[str]]]) -> dict[
 
                 mongo_changes = {k: v["ahora"] for k, v in changes.items()}
                 mongo_changes["last_updated"] = datetime.now().isoformat()
+                mongo_changes[HASH_FIELD] = item_hash
 
-                collection.update_one(query, {"$set": mongo_changes})
+                operations.append(UpdateOne(query, {"$set": mongo_changes}))
+                # Si cambió de tipo o calibre, cambian los dos grupos
+                groups.update((_group_of(existing_doc), _group_of(item)))
 
                 results["documentos_modificados"] += 1
                 results["detalles_modificados"].append({
@@ -170,14 +360,283 @@ def smart_update_mongodb_2(new_data: Union[dict[str], list[dict[str]]]) -> dict[
                     "cambios": list(changes.keys())
                 })
             else:
-                # Mensaje corto para no saturar si no hay cambios
+                # Documentos antiguos sin hash (o con hash obsoleto): solo guardamos el hash
                 print(f"   ✅ Sin cambios.")
+                operations.append(UpdateOne(query, {"$set": {HASH_FIELD: item_hash}}))
                 results["documentos_sin_cambios"] += 1
 
+        # 5. Todas las escrituras en un único bulk_write
+        if operations:
+            metrics.count("mongo_bulk_writes")
+            metrics.count("mongo_write_ops", len(operations))
+            collection.bulk_write(operations, ordered=False)
+        for counter in ("insertados", "modificados", "sin_cambios"):
+            metrics.count(counter, results[f"documentos_{counter}"])
+        if results["documentos_insertados"] or results["documentos_modificados"]:
+            bump_data_version(db)
+        results["grupos_afectados"] = sorted(groups, key=str)
+
+        print(f"✅ {results['documentos_sin_cambios']} documentos sin cambios.")
         return results
 
     except Exception as e:
         return {"estado": "ERROR", "mensaje": str(e)}
-    finally:
-        if client:
-            client.close()
+
+
+# Campos que cambian en un refresco solo de precios (e.fetch_prices)
+PRICE_FIELDS = ("buyFor", "sellFor", "minBuyPrice")
+
+
+@metrics.instrumented("mondongo.update_prices_mongodb", count_input=True)
+def update_prices_mongodb(new_data: Union[list[dict[str]], "AmmoTable"]) -> dict[str]:
+    """
+    Refresco ligero: aplica solo los PRICE_FIELDS de las balas recibidas (las que
+    cambiaron de precio) sobre sus documentos, recalculando su hash de contenido.
+    El resto de campos (stats, finalScore, normalized, tier) no dependen del precio.
+
+    Los ids que no existen en Mongo se devuelven en 'ids_faltantes': esas balas
+    necesitan pasar por smart_update_mongodb_2 con el registro completo.
+    """
+    from pymongo import UpdateOne
+
+    results = {
+        "estado": "Éxito",
+        "documentos_procesados": 0,
+        "documentos_modificados": 0,
+        "documentos_sin_cambios": 0,
+        "ids_faltantes": [],
+        "grupos_afectados": [],
+    }
+    records = new_data.iter_records() if _is_table(new_data) else new_data
+    by_id = {record[ID_FIELD]: record for record in records if record.get(ID_FIELD)}
+    results["documentos_procesados"] = len(by_id)
+    if not by_id:
+        return results
+
+    try:
+        db = get_db()
+        collection = db[COLLECTION_NAME]
+        print(f"💲 Actualizando precios de {len(by_id)} balas...")
+
+        operations = []
+        found = set()
+        groups = set()
+        metrics.count("mongo_finds")
+        for doc in collection.find({ID_FIELD: {"$in": list(by_id)}}, {"_id": 0}):
+            item_id = doc[ID_FIELD]
+            found.add(item_id)
+            record = by_id[item_id]
+            changes = {field: record[field] for field in PRICE_FIELDS
+                       if field in record and doc.get(field) != record[field]}
+            if not changes:
+                results["documentos_sin_cambios"] += 1
+                continue
+
+            doc.update(changes)
+            changes[HASH_FIELD] = content_hash(doc)
+            changes["last_updated"] = datetime.now().isoformat()
+            operations.append(UpdateOne({ID_FIELD: item_id}, {"$set": changes}))
+            groups.add(_group_of(doc))
+            results["documentos_modificados"] += 1
+
+        results["ids_faltantes"] = [item_id for item_id in by_id if item_id not in found]
+        results["grupos_afectados"] = sorted(groups, key=str)
+        if operations:
+            metrics.count("mongo_bulk_writes")
+            metrics.count("mongo_write_ops", len(operations))
+            collection.bulk_write(operations, ordered=False)
+            bump_data_version(db)
+        for counter in ("modificados", "sin_cambios"):
+            metrics.count(counter, results[f"documentos_{counter}"])
+
+        print(f"✅ {results['documentos_modificados']} documentos con precios nuevos, "
+              f"{results['documentos_sin_cambios']} sin cambios.")
+        return results
+
+    except Exception as e:
+        return {"estado": "ERROR", "mensaje": str(e)}
+
+
+@metrics.instrumented("mondongo.ensure_indexes")
+def ensure_indexes(db=None) -> list[str]:
+    """
+    Crea (si faltan) los índices de INDEXES en la colección de balas.
+    Si no se pasa 'db' usa el cliente compartido de mongo_client. Retorna los nombres creados/existentes.
+    """
+    from pymongo.errors import OperationFailure
+
+    if db is None:
+        db = get_db()
+    names = []
+    for collection_name, indexes in ((COLLECTION_NAME, INDEXES), (VIEW_COLLECTION, VIEW_INDEXES)):
+        collection = db[collection_name]
+        created = []
+        for keys, options in indexes:
+            try:
+                created.append(collection.create_index(keys, **options))
+            except OperationFailure as e:
+                # Típicamente: ids duplicados que impiden crear el índice único
+                print(f"⚠️ No se pudo crear el índice {options['name']}: {e}")
+        print(f"🗂️ Índices listos en '{collection_name}': {', '.join(created)}")
+        names += created
+    return names
+
+
+def _group_of(doc: dict) -> tuple:
+    """Grupo (ammoType, caliber) de una bala en la vista de la web."""
+    return doc.get("ammoType"), doc.get("caliber")
+
+
+def best_offer(min_buy_price: dict) -> dict:
+    """
+    Mejor oferta lista para la página a partir del 'minBuyPrice' que calcula tl:
+    { 'price': 123, 'symbol': '₽', 'source': 'Prapor' } o None si no se vende.
+    """
+    if not min_buy_price or min_buy_price.get("source") in (None, "N/A"):
+        return None
+    currency = min_buy_price.get("currency")
+    return {
+        "price": min_buy_price.get("price"),
+        "symbol": CURRENCY_SYMBOLS.get(currency, currency),
+        "source": str(min_buy_price["source"]).capitalize(),  # Ej: 'prapor' -> 'Prapor'
+    }
+
+
+def view_row(doc: dict) -> dict:
+    """Una bala tal y como la guarda la vista: solo VIEW_FIELDS y 'bestOffer'."""
+    row = {field: doc[field] for field in VIEW_FIELDS if field in doc}
+    row["bestOffer"] = best_offer(doc.get("minBuyPrice"))
+    return row
+
+
+def group_view_rows(docs) -> dict[tuple, list[dict]]:
+    """
+    Agrupa por (ammoType, caliber) las balas de un cursor ordenado por CLASSIFIED_SORT,
+    ya convertidas con view_row. Mantiene el orden de grupos y de balas del cursor.
+    """
+    groups = defaultdict(list)
+    for doc in docs:
+        groups[_group_of(doc)].append(view_row(doc))
+    return groups
+
+
+@metrics.instrumented("mondongo.refresh_view")
+def refresh_view(groups: list = None, db=None) -> dict[str]:
+    """
+    Reconstruye en VIEW_COLLECTION los documentos de los grupos (ammoType, caliber)
+    indicados (p. ej. los 'grupos_afectados' de smart_update_mongodb_2), con una consulta
+    para leer sus balas y un único bulk_write. Los grupos que se quedan sin balas se borran.
+    Con groups=None, o si la vista está vacía, la reconstruye entera.
+    """
+    from pymongo import DeleteOne, ReplaceOne
+
+    results = {"estado": "Éxito", "grupos_reconstruidos": 0, "grupos_borrados": 0}
+    try:
+        if db is None:
+            db = get_db()
+        collection, view = db[COLLECTION_NAME], db[VIEW_COLLECTION]
+
+        full = groups is None or view.find_one({}, {"_id": 1}) is None
+        if full:
+            query = {}
+            targets = {_group_of(doc) for doc in view.find({}, {"_id": 0, "ammoType": 1, "caliber": 1})}
+        elif groups:
+            targets = {tuple(group) for group in groups}
+            query = {"$or": [{"ammoType": ammo_type, "caliber": caliber} for ammo_type, caliber in targets]}
+        else:
+            return results
+
+        metrics.count("mongo_finds")
+        rows = group_view_rows(collection.find(query, VIEW_SOURCE_PROJECTION)
+                               .sort(CLASSIFIED_SORT + [(ID_FIELD, ASCENDING)]))
+        targets |= set(rows)
+
+        now = datetime.now().isoformat()
+        operations = []
+        for ammo_type, caliber in targets:
+            key = {"ammoType": ammo_type, "caliber": caliber}
+            bullets = rows.get((ammo_type, caliber))
+            if bullets:
+                operations.append(ReplaceOne(key, {**key, "bullets": bullets, "count": len(bullets),
+                                                   "updated_at": now}, upsert=True))
+                results["grupos_reconstruidos"] += 1
+            else:
+                operations.append(DeleteOne(key))
+                results["grupos_borrados"] += 1
+
+        if operations:
+            metrics.count("mongo_bulk_writes")
+            metrics.count("mongo_write_ops", len(operations))
+            view.bulk_write(operations, ordered=False)
+            bump_data_version(db, VIEW_COLLECTION)
+        metrics.count("grupos_reconstruidos", results["grupos_reconstruidos"])
+        print(f"🗃️ Vista de la web: {results['grupos_reconstruidos']} grupos reconstruidos, "
+              f"{results['grupos_borrados']} borrados{' (completa)' if full else ''}.")
+        return results
+
+    except Exception as e:
+        return {"estado": "ERROR", "mensaje": str(e)}
+
+
+def _plan_stages(plan) -> list[str]:
+    """Todas las etapas ('stage') de un plan de explain(), recorriéndolo entero."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def check_query_plans(db=None) -> bool:
+    """
+    Ejecuta explain() sobre las consultas calientes y comprueba que ninguna acaba en un
+    COLLSCAN (recorrido completo de la colección). Retorna True si todas usan índices.
+    """
+    if db is None:
+        db = get_db()
+    collection = db[COLLECTION_NAME]
+    sample = collection.find_one({}, {"_id": 0, ID_FIELD: 1, "ammoType": 1, "caliber": 1}) or {}
+    sample_id = sample.get(ID_FIELD, "")
+
+    hot_queries = {
+        "cargadores: find_one por id": collection.find({ID_FIELD: sample_id}).limit(1),
+        "smart update: $in de ids": collection.find({ID_FIELD: {"$in": [sample_id]}}),
+        "web: balas agrupadas": collection.find({}, {"_id": 0}).sort(CLASSIFIED_SORT),
+        "api: tipo + calibre": collection.find({"ammoType": sample.get("ammoType", ""),
+                                                "caliber": sample.get("caliber", "")})
+                                         .sort([("penetrationPower", DESCENDING), (ID_FIELD, ASCENDING)]),
+        "api: orden por defecto": collection.find({}).sort([("penetrationPower", DESCENDING),
+                                                           (ID_FIELD, ASCENDING)]).limit(50),
+        "web: vista materializada": db[VIEW_COLLECTION].find({}, {"_id": 0}).sort(VIEW_SORT),
+    }
+
+    all_ok = True
+    for name, cursor in hot_queries.items():
+        explain = cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        ok = "COLLSCAN" not in stages
+        all_ok &= ok
+        print(f"{'✅' if ok else '❌'} {name}: {' <- '.join(stages) or 'sin plan'}")
+    return all_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestión de índices de la colección de balas.")
+    parser.add_argument("--check", action="store_true",
+                        help="Comprueba con explain() que las consultas calientes no hacen COLLSCAN.")
+    parser.add_argument("--rebuild-view", action="store_true",
+                        help=f"Reconstruye entera la vista de la web ('{VIEW_COLLECTION}').")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    if args.rebuild_view and refresh_view().get("estado") == "ERROR":
+        print("❌ No se pudo reconstruir la vista de la web.")
+        sys.exit(1)
+    if args.check and not check_query_plans():
+        print("❌ Alguna consulta caliente recorre la colección entera.")
+        sys.exit(1)
@@ -0,0 +1,72 @@
+import os
+import threading
+# pymongo se importa al crear el cliente: importar este módulo no abre conexiones ni carga nada
+
+# --- CONFIGURACIÓN (desde el entorno, tal como la define docker-compose.yml) ---
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo:27017/")
+DATABASE_NAME = os.environ.get("DATABASE_NAME", "ammo_data")
+COLLECTION_NAME = os.environ.get("COLLECTION_NAME", "bullets")
+ID_FIELD = os.environ.get("ID_FIELD", "id")
+
+# Tamaño del pool y tiempos de espera (milisegundos)
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+# --- CLIENTE COMPARTIDO ---
+# Un único MongoClient (con su pool de conexiones) por proceso, creado la primera vez
+# que se pide. Si el proceso hace fork (p. ej. un servidor WSGI con varios workers), el
+# hijo crea el suyo: los clientes de pymongo no se pueden compartir entre procesos.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Devuelve el MongoClient compartido del proceso, creándolo si aún no existe."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                from pymongo import MongoClient
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MAX_POOL_SIZE,
+                    minPoolSize=MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                    connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                    socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                    connect=False,  # No abre sockets hasta la primera operación
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_db(name: str = DATABASE_NAME):
+    return get_client()[name]
+
+
+def get_collection(name: str = COLLECTION_NAME):
+    return get_db()[name]
+
+
+def close_client() -> None:
+    """Cierra el cliente compartido (al apagar el proceso). Se recreará si se vuelve a pedir."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_pid = None, None
+
+
+def _forget_client_in_child() -> None:
+    # En el hijo no cerramos el cliente del padre (sus sockets son del padre): solo lo olvidamos
+    global _client, _client_pid, _client_lock
+    _client, _client_pid = None, None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client_in_child)
@@ -0,0 +1,164 @@
+import json
+import os
+import numpy as np
+import tl
+import metrics
+from ammo_table import AmmoTable
+
+# --- NORMALIZACIÓN INCREMENTAL ---
+# normalize_and_update_scores recalcula 'normalized' y 'tier' de todas las balas en cada
+# ejecución, y smart_update_mongodb_2 tiene que comparar todos los documentos. Aquí se
+# guarda lo que se calculó la última vez (Q1/Q3/valla, la distribución ordenada de
+# scores y, por bala, su score, normalized, tier y hash del registro de origen) para:
+#   - no re-normalizar nada si la valla no se mueve (solo las balas con score nuevo), y
+#   - saber exactamente qué balas cambiaron, para escribir en Mongo solo esas.
+STATE_FILE = os.environ.get("NORMALIZER_STATE_FILE", "normalizer_state.json")
+STATE_VERSION = 1
+# Variación relativa de la valla que se ignora (se sigue usando la anterior).
+# 0 = solo se conserva si sale exactamente igual, con el mismo resultado que el cálculo completo.
+FENCE_TOLERANCE = float(os.environ.get("NORMALIZER_FENCE_TOLERANCE", "0"))
+
+
+def load_state(filename: str = STATE_FILE) -> dict:
+    """Estado de la última normalización, o None si no hay (o es de otra versión)."""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return state if state.get("state_version") == STATE_VERSION else None
+
+
+def save_state(state: dict, filename: str = STATE_FILE):
+    """Guarda el estado de forma atómica (nunca queda un JSON a medias)."""
+    tmp = f"{filename}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, filename)
+
+
+def clear_state(filename: str = STATE_FILE):
+    """Olvida el estado: la siguiente ejecución normaliza y compara todo."""
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def _update_sorted(sorted_scores: np.ndarray, removed: np.ndarray, added: np.ndarray) -> np.ndarray:
+    """
+    Quita 'removed' e inserta 'added' en la distribución ordenada sin volver a ordenarla.
+    Retorna None si algún valor a quitar no está (estado incoherente).
+    """
+    removed, added = np.sort(removed), np.sort(added)
+    if len(removed):
+        # Valores repetidos: el k-ésimo igual se quita de la k-ésima posición de su racha
+        rank = np.arange(len(removed)) - np.searchsorted(removed, removed, side="left")
+        positions = np.searchsorted(sorted_scores, removed, side="left") + rank
+        if positions.max() >= len(sorted_scores) or not np.array_equal(sorted_scores[positions], removed):
+            return None
+        sorted_scores = np.delete(sorted_scores, positions)
+    if len(added):
+        sorted_scores = np.insert(sorted_scores, np.searchsorted(sorted_scores, added), added)
+    return sorted_scores
+
+
+@metrics.instrumented("normalizer.normalize_incremental", count_input=True)
+def normalize_incremental(table: AmmoTable, source_hashes: list, state: dict = None,
+                          tolerance: float = None) -> tuple[AmmoTable, np.ndarray, dict, dict]:
+    """
+    Asigna 'normalized' y 'tier' a la tabla (ya con 'finalScore') partiendo del estado anterior.
+
+    Retorna (tabla, máscara de filas que hay que escribir, estado nuevo, resumen). Una fila se
+    escribe si cambió el resto de su contenido ('source_hashes': un hash por fila de todo lo
+    que no sea finalScore/normalized/tier) o si cambió su finalScore, su normalized redondeado
+    o su tier. Sin estado, se escriben todas.
+    """
+    tolerance = FENCE_TOLERANCE if tolerance is None else tolerance
+    ids = list(table.column('id')) if len(table) else []
+    scores = table.column('finalScore') if len(table) else np.empty(0, dtype=np.float64)
+    source_hashes = list(source_hashes)
+
+    # --- 1. Qué balas ya conocíamos y con qué valores ---
+    previous = {}
+    if state:
+        previous = {item_id: i for i, item_id in enumerate(state["ids"])}
+    rows = np.array([previous.get(item_id, -1) for item_id in ids], dtype=np.int64)
+    known = rows >= 0
+    prev_scores = np.asarray(state["scores"], dtype=np.float64) if state else np.empty(0)
+    old_scores = np.full(len(ids), np.nan)
+    old_scores[known] = prev_scores[rows[known]]
+    score_changed = ~known | (scores != old_scores)
+    gone = sorted(set(previous) - set(ids))
+
+    # --- 2. Distribución ordenada: solo se quitan/insertan los scores que cambiaron ---
+    sorted_scores = None
+    if state:
+        removed = np.concatenate([old_scores[score_changed & known],
+                                  prev_scores[[previous[item_id] for item_id in gone]]])
+        sorted_scores = _update_sorted(np.asarray(state["sorted_scores"], dtype=np.float64),
+                                       removed, scores[score_changed])
+    if sorted_scores is None:
+        sorted_scores = np.sort(scores)
+
+    # --- 3. Valla: se conserva la anterior si no se ha movido (o no más de 'tolerance') ---
+    if len(sorted_scores):
+        Q1, Q3 = np.percentile(sorted_scores, 25), np.percentile(sorted_scores, 75)
+    else:
+        Q1 = Q3 = 0.0
+    fence = tl.iqr_fence(Q1, Q3)
+    prev_fence = state["fence"] if state else None
+    if prev_fence is not None and (fence == prev_fence or abs(fence - prev_fence) <= tolerance * abs(prev_fence)):
+        fence = prev_fence
+    fence_shifted = fence != prev_fence
+
+    # --- 4. normalized y tier: todas las balas si la valla se movió, si no solo las de score nuevo ---
+    # Valores anteriores de cada fila (NaN / -1 para las balas nuevas)
+    old_normalized = np.full(len(ids), np.nan)
+    old_codes = np.full(len(ids), -1, dtype=np.int32)
+    if state and known.any():
+        prev_normalized = np.array([np.nan if value is None else value for value in state["normalized"]],
+                                   dtype=np.float64)
+        prev_codes = np.array([tl.TIER_CODES.index(tier) if tier in tl.TIER_CODES else -1
+                               for tier in state["tiers"]], dtype=np.int32)
+        old_normalized[known] = prev_normalized[rows[known]]
+        old_codes[known] = prev_codes[rows[known]]
+
+    if fence == 0:
+        print("Advertencia: El puntaje máximo es 0. No se puede normalizar.")
+        renormalize = np.zeros(len(ids), dtype=bool)
+    else:
+        renormalize = np.ones(len(ids), dtype=bool) if fence_shifted else score_changed
+        normalized, codes = old_normalized.copy(), old_codes.copy()
+        if renormalize.any():
+            normalized[renormalize], codes[renormalize] = tl.normalize_scores(scores[renormalize], fence)
+        tl.set_normalization(table, normalized, codes)
+
+    # --- 5. Filas a escribir ---
+    prev_hashes = state["source_hashes"] if state else []
+    source_changed = np.array([row < 0 or prev_hashes[row] != source_hash
+                               for row, source_hash in zip(rows.tolist(), source_hashes)], dtype=bool)
+    dirty = source_changed | score_changed
+    if fence != 0:
+        dirty |= (normalized != old_normalized) | (codes != old_codes)
+
+    new_state = {
+        "state_version": STATE_VERSION,
+        "Q1": float(Q1), "Q3": float(Q3), "fence": float(fence),
+        "ids": ids,
+        "scores": scores.tolist(),
+        "normalized": table.column('normalized').tolist() if fence != 0 else [None] * len(ids),
+        "tiers": table.strings('tier') if fence != 0 else [None] * len(ids),
+        "source_hashes": source_hashes,
+        "sorted_scores": sorted_scores.tolist(),
+    }
+    summary = {
+        "incremental": state is not None,
+        "Q1": float(Q1), "Q3": float(Q3), "fence": float(fence), "fence_shifted": bool(fence_shifted),
+        "balas": len(ids), "scores_nuevos": int(score_changed.sum()),
+        "renormalizadas": int(renormalize.sum()), "retiradas": len(gone), "a_escribir": int(dirty.sum()),
+    }
+    metrics.count("renormalizadas", summary["renormalizadas"])
+    metrics.count("a_escribir", summary["a_escribir"])
+    return table, dirty, new_state, summary
+
@@ -0,0 +1,91 @@
+import json
+import os
+
+# --- PERFILES DE PUNTUACIÓN ---
+# Cada perfil es un vector de pesos sobre FEATURES. tl.score_profiles evalúa todos los
+# perfiles a la vez con un único producto (balas × features) · (features × perfiles), así
+# que añadir perfiles apenas cuesta nada. Cada perfil tiene su propio finalScore,
+# normalized (sobre su propia valla Q3 + 1.5 * IQR) y tier, guardados en el campo
+# PROFILE_FIELD de cada documento: {"anti_armor": {"finalScore", "normalized", "tier"}, ...}
+#
+# Sin numpy: app.py importa este módulo solo para validar ?profile=.
+
+PROFILE_FIELD = "profiles"
+
+# 'lethal' = damage * projectileCount * (1 + fragmentationChance), el lethalScore de la
+# fórmula original; el resto son los campos de la bala tal cual.
+FEATURES = (
+    'lethal',
+    'penetrationPower',
+    'penetrationChance',
+    'penetrationPowerDeviation',
+    'armorDamage',
+    'lightBleedModifier',
+    'heavyBleedModifier',
+    'staminaBurnPerDamage',
+    'accuracyModifier',
+    'recoilModifier',
+)
+
+# Los pesos que faltan valen 0
+DEFAULT_PROFILES = {
+    # Los mismos pesos que tl.compute_final_scores, ya desarrollados
+    "balanced": {
+        'lethal': 0.8,
+        'penetrationPower': 7.2, 'penetrationChance': 36, 'penetrationPowerDeviation': -1.8,
+        'armorDamage': 0.75, 'lightBleedModifier': 25, 'heavyBleedModifier': 37.5, 'staminaBurnPerDamage': 75,
+        'accuracyModifier': 200, 'recoilModifier': -200,
+    },
+    # Contra blindaje: penetración y daño a la armadura por encima de todo
+    "anti_armor": {
+        'lethal': 0.3,
+        'penetrationPower': 12, 'penetrationChance': 60, 'penetrationPowerDeviation': -3,
+        'armorDamage': 2.0,
+        'accuracyModifier': 100, 'recoilModifier': -100,
+    },
+    # Builds de sangrado: los modificadores de hemorragia pesan más que la penetración
+    "bleed": {
+        'lethal': 0.8,
+        'penetrationPower': 3.0, 'penetrationChance': 15, 'penetrationPowerDeviation': -1,
+        'armorDamage': 0.3, 'lightBleedModifier': 150, 'heavyBleedModifier': 250,
+        'accuracyModifier': 100, 'recoilModifier': -100,
+    },
+    # Objetivos sin blindaje (scavs, PvE): daño a la carne
+    "flesh": {
+        'lethal': 1.5,
+        'penetrationPower': 1.0, 'penetrationChance': 5,
+        'lightBleedModifier': 25, 'heavyBleedModifier': 37.5, 'staminaBurnPerDamage': 75,
+        'accuracyModifier': 150, 'recoilModifier': -150,
+    },
+}
+
+# JSON opcional con más perfiles (mismo formato que DEFAULT_PROFILES); uno con el mismo
+# nombre que un perfil por defecto lo reemplaza.
+PROFILES_FILE = os.environ.get("SCORING_PROFILES_FILE", "")
+
+
+def load_profiles(filename: str = PROFILES_FILE) -> dict[str, dict[str, float]]:
+    """DEFAULT_PROFILES más los de 'filename'. Lanza ValueError si algún perfil no es válido."""
+    profiles = dict(DEFAULT_PROFILES)
+    if filename:
+        with open(filename, "r", encoding="utf-8") as f:
+            profiles.update(json.load(f))
+
+    for name, weights in profiles.items():
+        # El nombre acaba en rutas de Mongo ('profiles.<nombre>.normalized')
+        if not name.isidentifier():
+            raise ValueError(f"Nombre de perfil no válido: '{name}'.")
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Perfil '{name}': features desconocidas {sorted(unknown)}. "
+                             f"Opciones: {', '.join(FEATURES)}.")
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+def weight_rows(profiles: dict[str, dict[str, float]] = None) -> list[list[float]]:
+    """Matriz de pesos (features × perfiles) como listas, en el orden de FEATURES y de 'profiles'."""
+    profiles = PROFILES if profiles is None else profiles
+    return [[float(weights.get(feature, 0)) for weights in profiles.values()] for feature in FEATURES]
@@ -0,0 +1,124 @@
+import numpy as np
+
+# --- SKETCH DE CUANTILES EN STREAMING (t-digest con fusión) ---
+# Resume una secuencia de números de tamaño arbitrario en unos pocos cientos de centroides
+# (media, peso) para estimar sus cuantiles en una sola pasada y con memoria acotada.
+# Los centroides son más finos en las colas que en el centro (función de escala k1 del
+# t-digest), y dos sketches se pueden fusionar (p. ej. uno por fichero o por proceso).
+#
+# Error: con compression=200 el error en rango de Q1/Q3 suele quedar por debajo del 0.1%
+# (ver __main__). Mientras no se haya comprimido nada (menos de 'buffer_size' valores)
+# el resultado es exacto e idéntico al de np.percentile.
+
+DEFAULT_COMPRESSION = 200
+
+
+class QuantileSketch:
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION, buffer_size: int = None):
+        self.compression = compression
+        self.buffer_size = buffer_size or 10 * compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self._buffer = []       # Lotes (valores, pesos) aún sin comprimir
+        self._buffered = 0
+        self._exact = True      # Solo valores sueltos sin comprimir: cuantil exacto
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __len__(self) -> int:
+        return int(self.count)
+
+    def update(self, values) -> "QuantileSketch":
+        """Añade un lote de valores (los NaN se ignoran)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self._add(values, np.ones(len(values), dtype=np.float64))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Incorpora los datos resumidos por 'other' (que no se modifica)."""
+        other._compress_if_needed(force=False)
+        for values, weights in other._buffer:
+            self._add(values, weights)
+        if len(other.means):
+            self._exact = False
+            self._add(other.means, other.weights)
+        return self
+
+    def _add(self, values: np.ndarray, weights: np.ndarray):
+        self._buffer.append((values, weights))
+        self._buffered += len(values)
+        self.count += float(weights.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress_if_needed(force=False)
+
+    def _compress_if_needed(self, force: bool):
+        if self._buffer and (force or self._buffered >= self.buffer_size):
+            self._compress()
+
+    def _k(self, q: np.ndarray) -> np.ndarray:
+        """Función de escala k1 del t-digest: pasos finos cerca de q=0 y q=1, gruesos en el centro."""
+        return self.compression / (2 * np.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+    def _compress(self):
+        means = np.concatenate([self.means] + [values for values, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer, self._buffered, self._exact = [], 0, False
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # Agrupa los puntos consecutivos cuyo borde izquierdo cae en la misma media unidad
+        # de k: así un centroide, sumando el peso de su último punto, no pasa de una unidad
+        left_q = (np.cumsum(weights) - weights) / weights.sum()
+        groups = np.floor(2 * (self._k(left_q) - self._k(np.zeros(1)))).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        group_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / group_weights
+        self.weights = group_weights
+
+    def quantile(self, q: float) -> float:
+        """Estimación del cuantil q (0..1), con la misma interpolación lineal que np.percentile."""
+        if not self.count:
+            return float("nan")
+        if self._exact:
+            values = np.concatenate([values for values, _ in self._buffer])
+            return float(np.percentile(values, q * 100))
+
+        self._compress_if_needed(force=True)
+        # Centro de cada centroide en "posiciones" (un valor suelto i está en i + 0.5)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        target = q * (self.count - 1) + 0.5
+        return float(np.interp(target, np.r_[0.0, centers, self.count], np.r_[self.min, self.means, self.max]))
+
+    def quantiles(self, qs) -> list:
+        return [self.quantile(q) for q in qs]
+
+
+if __name__ == "__main__":
+    # Comprobación del error frente a np.percentile con distribuciones de distinta forma
+    import time
+    rng = np.random.default_rng(0)
+    datasets = {
+        "normal": rng.normal(500, 120, 2_000_000),
+        "lognormal": rng.lognormal(6, 0.6, 2_000_000),
+        "bimodal": np.r_[rng.normal(200, 30, 1_000_000), rng.normal(900, 80, 1_000_000)],
+    }
+    print(f"{'DATOS':<10} | {'Q':>5} | {'EXACTO':>10} | {'SKETCH':>10} | {'ERROR RANGO':>11} | CENTROIDES | TIEMPO (s)")
+    print("-" * 85)
+    for label, data in datasets.items():
+        start = time.perf_counter()
+        sketch = QuantileSketch()
+        for batch in np.array_split(data, 2000):
+            sketch.update(batch)
+        estimates = sketch.quantiles((0.25, 0.75))
+        elapsed = time.perf_counter() - start
+        ordered = np.sort(data)
+        for q, estimate in zip((0.25, 0.75), estimates):
+            exact = np.percentile(data, q * 100)
+            rank_error = abs(np.searchsorted(ordered, estimate) / len(data) - q)
+            print(f"{label:<10} | {q:>5} | {exact:>10.3f} | {estimate:>10.3f} | {rank_error:>11.5%} | "
+                  f"{len(sketch.means):>10} | {elapsed:>10.3f}")
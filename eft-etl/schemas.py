@@ -0,0 +1,98 @@
+from functools import cache
+from typing import Generic, Optional, TypeVar
+from typing_extensions import TypedDict  # typing.TypedDict no vale para Pydantic en Python < 3.12
+from pydantic import SkipValidation, TypeAdapter
+
+# Esquemas de la respuesta, validados con Pydantic directamente desde los bytes JSON
+# (TypeAdapter.validate_json). Son TypedDict: el resultado ya son diccionarios planos de
+# Python, en el orden de los campos del esquema, sin objetos intermedios que volcar.
+class Trade(TypedDict):
+    price: int
+    currency: str
+    priceRUB: int
+    source: str
+
+class ItemInfo(TypedDict):
+    id: str
+    shortName: str
+    name: str
+    iconLink: str
+    basePrice: int
+
+class Item(ItemInfo):
+    buyFor: list[Trade]
+    sellFor: list[Trade]
+
+class AmmoStats(TypedDict):
+    ammoType: str
+    caliber: str
+    projectileCount: int
+    damage: int
+    armorDamage: int
+    fragmentationChance: float
+    penetrationChance: float
+    penetrationPower: int
+    penetrationPowerDeviation: float
+    accuracyModifier: float
+    recoilModifier: float
+    lightBleedModifier: float
+    heavyBleedModifier: float
+    staminaBurnPerDamage: float
+
+class Ammo(AmmoStats):
+    item: Item
+
+class AmmoResponse(TypedDict):
+    ammo: list[Ammo]
+
+# Respuesta de la consulta ligera (solo precios)
+class PriceItem(TypedDict):
+    id: str
+    buyFor: list[Trade]
+    sellFor: list[Trade]
+
+class PriceAmmo(TypedDict):
+    item: PriceItem
+
+class PriceResponse(TypedDict):
+    ammo: list[PriceAmmo]
+
+# Variantes "lenient": las listas de ofertas se aceptan tal cual llegan, sin validar cada Trade
+class LenientItem(ItemInfo):
+    buyFor: SkipValidation[list[Trade]]
+    sellFor: SkipValidation[list[Trade]]
+
+class LenientAmmo(AmmoStats):
+    item: LenientItem
+
+class LenientAmmoResponse(TypedDict):
+    ammo: list[LenientAmmo]
+
+class LenientPriceItem(TypedDict):
+    id: str
+    buyFor: SkipValidation[list[Trade]]
+    sellFor: SkipValidation[list[Trade]]
+
+class LenientPriceAmmo(TypedDict):
+    item: LenientPriceItem
+
+class LenientPriceResponse(TypedDict):
+    ammo: list[LenientPriceAmmo]
+
+T = TypeVar("T")
+
+class GraphQLResponse(TypedDict, Generic[T], total=False):
+    data: Optional[T]
+    errors: list
+
+# Esquema completo y variante lenient de cada consulta de e.py
+RESPONSE_TYPES = {
+    "ammo": (AmmoResponse, LenientAmmoResponse),
+    "price": (PriceResponse, LenientPriceResponse),
+}
+
+
+@cache
+def adapter(response_type) -> TypeAdapter:
+    """TypeAdapter de la respuesta (se construye la primera vez que se usa)."""
+    return TypeAdapter(GraphQLResponse[response_type])
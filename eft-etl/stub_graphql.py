@@ -0,0 +1,148 @@
+"""
+Servidor GraphQL falso (solo para pruebas y benchmarks sin red) que imita la consulta
+'ammo' de tarkov.dev. Permite simular latencia, errores temporales y cuelgues, y
+soporta ETag/If-None-Match y gzip como un servidor real.
+
+Uso (desde /eft-etl):
+    python stub_graphql.py [--port 8765] [--snapshot ade.bin | --count 200]
+                           [--latency 0.2] [--jitter 0.1] [--fail-rate 0.3] [--hang-rate 0.05]
+
+y después, en otra terminal:
+    TARKOV_API_URL=http://127.0.0.1:8765/graphql python update.py
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import synthetic_ammo
+
+# Campos del registro aplanado que en la respuesta GraphQL van dentro de 'item'
+ITEM_FIELDS = ('id', 'shortName', 'name', 'basePrice', 'iconLink', 'buyFor', 'sellFor')
+
+
+def from_flat_records(records: list) -> list:
+    """Vuelve a anidar los registros aplanados de ade.bin con la forma de la respuesta GraphQL."""
+    ammo = []
+    for record in records:
+        entry = {'item': {field: record[field] for field in ITEM_FIELDS}}
+        entry.update((k, v) for k, v in record.items() if k not in ITEM_FIELDS)
+        ammo.append(entry)
+    return ammo
+
+
+class StubState:
+    """Respuesta servida y comportamiento simulado (modificable mientras el servidor corre)."""
+
+    def __init__(self, ammo: list, latency: float = 0.0, jitter: float = 0.0,
+                 fail_rate: float = 0.0, hang_rate: float = 0.0, hang_time: float = 60.0, seed: int = 0):
+        self.latency, self.jitter = latency, jitter
+        self.fail_rate, self.hang_rate, self.hang_time = fail_rate, hang_rate, hang_time
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.set_payload(ammo)
+
+    def set_payload(self, ammo: list):
+        body = json.dumps({'data': {'ammo': ammo}}).encode('utf-8')
+        with self.lock:
+            self.body = body
+            self.gzip_body = gzip.compress(body)
+            self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def roll(self) -> tuple[float, bool, bool]:
+        """Latencia de esta petición y si debe fallar o colgarse."""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            roll = self.rng.random()
+        return delay, roll < self.fail_rate, self.fail_rate <= roll < self.fail_rate + self.hang_rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como el servidor real
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        except json.JSONDecodeError:
+            query = ""
+
+        state = self.state
+        delay, fail, hang = state.roll()
+        if hang:
+            time.sleep(state.hang_time)
+        time.sleep(delay)
+
+        if fail:
+            return self._send(503, b'{"errors": [{"message": "stub: temporarily unavailable"}]}',
+                              {"Content-Type": "application/json", "Retry-After": "0"})
+        if "ammo" not in query:
+            return self._send(400, b'{"errors": [{"message": "stub: only the ammo query is supported"}]}',
+                              {"Content-Type": "application/json"})
+
+        with state.lock:
+            body, gzip_body, etag = state.body, state.gzip_body, state.etag
+        headers = {"ETag": etag, "Content-Type": "application/json"}
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers=headers)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = gzip_body
+        self._send(200, body, headers)
+
+
+def start_stub_server(state: StubState, host: str = "127.0.0.1", port: int = 0):
+    """Arranca el servidor en un hilo de fondo. Retorna (servidor, url de /graphql)."""
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/graphql"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--snapshot", help="Sirve los datos de este ade.bin en lugar de datos sintéticos.")
+    parser.add_argument("--count", type=int, default=200, help="Balas sintéticas a servir.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Espera aleatoria extra (0..jitter).")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fracción de respuestas 503.")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fracción de peticiones que se cuelgan.")
+    parser.add_argument("--hang-time", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.snapshot:
+        import crypt
+        ammo = from_flat_records(crypt.load_and_decrypt_data(args.snapshot))
+    else:
+        ammo = synthetic_ammo(args.count, args.seed)
+
+    stub = StubState(ammo, args.latency, args.jitter, args.fail_rate, args.hang_rate, args.hang_time, args.seed)
+    server, url = start_stub_server(stub, args.host, args.port)
+    print(f"Stub GraphQL sirviendo {len(ammo)} balas en {url} (Ctrl+C para parar)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
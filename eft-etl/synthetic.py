@@ -0,0 +1,71 @@
+import json
+import random
+
+# --- GENERADOR DE MUNICIÓN SINTÉTICA (benchmarks y stub_graphql.py) ---
+# Datos inventados pero con la forma exacta de la respuesta de tarkov.dev (schemas.py) y
+# distribuciones parecidas a las reales: la misma semilla produce siempre los mismos datos.
+
+LIVE_SIZE = 170  # Aproximadamente las municiones que devuelve hoy la API (escala 1x)
+
+AMMO_TYPES = ('bullet',) * 8 + ('buckshot', 'grenade', 'flashbang')
+CALIBERS = ('Caliber556x45NATO', 'Caliber545x39', 'Caliber762x39', 'Caliber762x51', 'Caliber762x54R',
+            'Caliber9x19PARA', 'Caliber9x39', 'Caliber46x30', 'Caliber57x28', 'Caliber366TKM',
+            'Caliber127x55', 'Caliber12g', 'Caliber20g', 'Caliber40x46', 'Caliber1143x23ACP')
+TRADERS = ('prapor', 'skier', 'peacekeeper', 'mechanic', 'jaeger', 'fleaMarket')
+# Moneda de cada trader y su cambio a rublos
+TRADER_CURRENCY = {'peacekeeper': ('USD', 140), 'skier': ('EUR', 150)}
+
+
+def _trades(rng: random.Random, count: int) -> list:
+    result = []
+    for _ in range(count):
+        source = rng.choice(TRADERS)
+        currency, rate = TRADER_CURRENCY.get(source, ('RUB', 1))
+        price = rng.randint(1, 40) if rate > 1 else rng.randint(10, 5000)
+        result.append({'price': price, 'currency': currency, 'priceRUB': price * rate, 'source': source})
+    return result
+
+
+def synthetic_ammo(count: int, seed: int = 0) -> list:
+    """'count' entradas con la forma de data.ammo de la respuesta GraphQL (anidadas en 'item')."""
+    rng = random.Random(seed)
+    ammo = []
+    for i in range(count):
+        projectiles = 8 if rng.random() < 0.08 else 1
+        ammo.append({
+            'item': {
+                'id': f"{i:024x}",
+                'shortName': f"AMMO{i}",
+                'name': f"Synthetic ammo {i}",
+                'basePrice': rng.randint(10, 2000),
+                'iconLink': f"https://assets.tarkov.dev/{i:024x}-icon.webp",
+                'buyFor': _trades(rng, rng.choice((0, 1, 1, 2, 2, 3))),
+                'sellFor': _trades(rng, rng.randint(1, 2)),
+            },
+            'ammoType': rng.choice(AMMO_TYPES),
+            'caliber': rng.choice(CALIBERS),
+            'projectileCount': projectiles,
+            'damage': rng.randint(20, 200) if projectiles == 1 else rng.randint(20, 60),
+            'armorDamage': rng.randint(10, 90),
+            'fragmentationChance': round(rng.random() * 0.5, 3),
+            'penetrationChance': round(rng.random(), 3),
+            'penetrationPower': rng.randint(1, 70),
+            'penetrationPowerDeviation': round(rng.random(), 3),
+            'accuracyModifier': round(rng.uniform(-0.1, 0.1), 3),
+            'recoilModifier': round(rng.uniform(-0.1, 0.1), 3),
+            'lightBleedModifier': round(rng.random() * 0.3, 3),
+            'heavyBleedModifier': round(rng.random() * 0.3, 3),
+            'staminaBurnPerDamage': round(rng.random(), 3),
+        })
+    return ammo
+
+
+def synthetic_records(count: int, seed: int = 0) -> list:
+    """Los mismos datos ya aplanados, como los guarda e.py en 'ade.bin'."""
+    import e
+    return e.flatten_ammo(synthetic_ammo(count, seed))
+
+
+def synthetic_response(count: int, seed: int = 0) -> bytes:
+    """Cuerpo JSON de la respuesta GraphQL completa, tal cual llegaría de la API."""
+    return json.dumps({'data': {'ammo': synthetic_ammo(count, seed)}}).encode('utf-8')
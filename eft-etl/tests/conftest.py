@@ -0,0 +1,73 @@
+"""
+Fixtures comunes de la suite. Se ejecuta desde /eft-etl con:
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+
+Cada test corre en su propio directorio temporal (ade.bin, su .meta.json, etl_runs.json,
+la caché de armor_sim y el estado del normalizador se escriben ahí), MongoDB es mongomock
+y la API de tarkov.dev es el servidor de stub_graphql.py.
+"""
+import base64
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Clave fija para toda la sesión: crypt cachea el Fernet la primera vez que lo usa
+os.environ.setdefault("ADE_ENCRYPTION_KEY", base64.urlsafe_b64encode(b"eft-etl-tests".ljust(32, b"0")).decode())
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Directorio de trabajo temporal: los ficheros que escribe el ETL no tocan el repo."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def quiet():
+    """Silencia los print del ETL dentro de un 'with quiet():'."""
+    return lambda: contextlib.redirect_stdout(io.StringIO())
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Base de datos mongomock compartida por mongo_client (y por tanto por mondongo, app y update)."""
+    mongomock = pytest.importorskip("mongomock")
+    import mongo_client
+
+    monkeypatch.setattr(mongo_client, "_client", mongomock.MongoClient())
+    monkeypatch.setattr(mongo_client, "_client_pid", os.getpid())
+    return mongo_client.get_db()
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """Cliente de pruebas de Flask con las cachés de app.py vacías."""
+    import app
+
+    for cache in (app._cache, app._api_cache):
+        monkeypatch.setitem(cache, "data", None)
+        monkeypatch.setitem(cache, "version", None)
+    monkeypatch.setitem(app._page_cache, "bodies", {})
+    return app.app.test_client()
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    """Servidor GraphQL falso con 60 balas sintéticas; fetch_client apunta a él."""
+    import fetch_client
+    from stub_graphql import StubState, start_stub_server
+    from synthetic import synthetic_ammo
+
+    state = StubState(synthetic_ammo(60, seed=3))
+    state.ammo = synthetic_ammo(60, seed=3)  # Copia que los tests modifican y vuelven a servir
+    server, url = start_stub_server(state)
+    monkeypatch.setattr(fetch_client, "API_URL", url)
+    yield state
+    server.shutdown()
+    server.server_close()
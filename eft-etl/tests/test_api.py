@@ -0,0 +1,139 @@
+import pytest
+
+import mondongo
+import tl
+from synthetic import synthetic_records
+
+
+@pytest.fixture
+def loaded(db, quiet):
+    """120 balas puntuadas (con perfiles y normalización) en la colección y en la vista."""
+    records = synthetic_records(120)
+    with quiet():
+        tl.normalize_and_update_scores(tl.score_profiles(tl.calculate_finalScore(records)))
+        mondongo.smart_update_mongodb_2(records)
+        mondongo.refresh_view()
+    return records
+
+
+def _all_pages(client, query: str, limit: int = 7) -> list:
+    """Recorre todas las páginas de /api/ammo siguiendo next_cursor."""
+    docs, cursor = [], None
+    for _ in range(1000):
+        url = f"/api/ammo?{query}&limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        docs += body["data"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return docs
+    raise AssertionError("La paginación no termina")
+
+
+def test_plain_api_keeps_grouped_full_documents(client, loaded):
+    body = client.get("/api/ammo").get_json()
+    assert body["total"] == 120
+    bullets = [bullet for calibers in body["data"].values() for group in calibers.values() for bullet in group]
+    assert len(bullets) == 120
+    assert {"buyFor", "sellFor", "damage", "finalScore"} <= set(bullets[0])
+    assert not set(bullets[0]) & set(mondongo.HASH_EXCLUDED_FIELDS)
+
+
+def test_filters_and_default_sort(client, loaded):
+    caliber = loaded[0]["caliber"]
+    body = client.get(f"/api/ammo?caliber={caliber}&minPenetrationPower=20&limit=500").get_json()
+    expected = [r for r in loaded if r["caliber"] == caliber and r["penetrationPower"] >= 20]
+    assert body["count"] == len(expected)
+    pens = [doc["penetrationPower"] for doc in body["data"]]
+    assert pens == sorted(pens, reverse=True)
+
+
+def test_default_projection_hides_bookkeeping(client, loaded):
+    doc = client.get("/api/ammo?sort=damage").get_json()["data"][0]
+    assert not set(doc) & {"_id", "contentHash", "last_updated", "profiles"}
+    assert "buyFor" in doc
+
+
+def test_fields_projection(client, loaded):
+    doc = client.get("/api/ammo?fields=name&sort=-damage").get_json()["data"][0]
+    assert set(doc) == {"id", "name", "damage"}
+
+
+@pytest.mark.parametrize("query", [
+    "fields=_id", "fields=name,__class__", "fields=a.b", "sort=contentHash", "limit=x",
+    "minPenetrationPower=abc", "profile=nope", "cursor=!!!",
+])
+def test_invalid_parameters_are_400(client, loaded, query):
+    response = client.get(f"/api/ammo?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+@pytest.mark.parametrize("sort", ["-penetrationPower", "damage", "name", "-finalScore"])
+def test_cursor_pages_cover_every_document_once(client, loaded, sort):
+    docs = _all_pages(client, f"sort={sort}")
+    assert sorted(doc["id"] for doc in docs) == sorted(record["id"] for record in loaded)
+    field, reverse = sort.lstrip("-"), sort.startswith("-")
+    keys = [(doc[field], doc["id"]) for doc in docs]
+    assert [key[0] for key in keys] == sorted((key[0] for key in keys), reverse=reverse)
+
+
+@pytest.mark.parametrize("sort", ["damage", "-damage"])
+def test_cursor_pages_cover_documents_without_sort_value(client, loaded, db, sort):
+    bullets = db[mondongo.COLLECTION_NAME]
+    unset = [record["id"] for record in loaded[:12]]
+    bullets.update_many({"id": {"$in": unset[:6]}}, {"$set": {"damage": None}})
+    bullets.update_many({"id": {"$in": unset[6:]}}, {"$unset": {"damage": ""}})
+
+    docs = _all_pages(client, f"sort={sort}", limit=5)
+    assert sorted(doc["id"] for doc in docs) == sorted(record["id"] for record in loaded)
+    # Sin valor de orden: al principio en ascendente, al final en descendente
+    nulls = [doc["id"] for doc in docs if doc.get("damage") is None]
+    assert nulls == sorted(unset)
+    assert (docs[:12] if sort == "damage" else docs[-12:]) == [doc for doc in docs if doc["id"] in unset]
+
+
+def test_profile_scores_replace_top_level_ones(client, loaded):
+    body = client.get("/api/ammo?profile=anti_armor&limit=500").get_json()
+    by_id = {record["id"]: record for record in loaded}
+    for doc in body["data"]:
+        assert doc["profile"] == "anti_armor"
+        assert doc["finalScore"] == by_id[doc["id"]]["profiles"]["anti_armor"]["finalScore"]
+        assert "profiles" not in doc
+    normalized = [doc["normalized"] for doc in body["data"]]
+    assert normalized == sorted(normalized, reverse=True)
+
+
+def test_index_etag_and_304(client, loaded):
+    first = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code == 304
+    assert client.get("/", headers={"If-Modified-Since": first.headers["Last-Modified"]}).status_code == 304
+
+
+def test_index_etag_differs_per_encoding(client, loaded):
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] != plain.headers["ETag"]
+    # La ETag de un cuerpo no vale para otra codificación
+    response = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["ETag"]})
+    assert response.status_code == 200
+
+
+def test_index_changes_after_etl_write(client, loaded, quiet):
+    etag = client.get("/").headers["ETag"]
+    with quiet():
+        result = mondongo.smart_update_mongodb_2([{**loaded[0], "name": "Renamed bullet"}], partial=True)
+        mondongo.refresh_view(result["grupos_afectados"])
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Renamed bullet" in response.get_data(as_text=True)
+
+
+def test_index_falls_back_to_bullets_without_view(client, loaded, db, quiet):
+    db[mondongo.VIEW_COLLECTION].delete_many({})
+    assert client.get("/").get_data(as_text=True).count("<tr>") > 0
+    with quiet():
+        mondongo.smart_update_mongodb_2([{**loaded[0], "name": "Written without a view"}], partial=True)
+    assert "Written without a view" in client.get("/").get_data(as_text=True)
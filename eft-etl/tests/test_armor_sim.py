@@ -0,0 +1,54 @@
+import copy
+
+import numpy as np
+
+import armor_sim
+from ammo_table import AmmoTable
+from synthetic import synthetic_records
+
+
+def _columns(records) -> dict:
+    table = AmmoTable.from_records(records)
+    return {field: table.column(field) for field in armor_sim.BALLISTIC_FIELDS}
+
+
+def test_result_does_not_depend_on_chunk_or_neighbours():
+    columns = _columns(synthetic_records(40))
+    reference = armor_sim.simulate(columns, chunk_size=64)
+    for chunk_size in (1, 7):
+        for got, expected in zip(armor_sim.simulate(columns, chunk_size), reference):
+            np.testing.assert_array_equal(got, expected)
+    reversed_stk, _ = armor_sim.simulate({field: values[::-1] for field, values in columns.items()})
+    np.testing.assert_array_equal(reversed_stk[::-1], reference[0])
+
+
+def test_better_armor_never_helps_the_bullet():
+    shots_to_kill, pen_chance = armor_sim.simulate(_columns(synthetic_records(60)))
+    assert shots_to_kill.shape == (60, len(armor_sim.ARMOR_CLASSES))
+    assert (np.diff(pen_chance, axis=1) <= 1e-12).all()
+    assert ((pen_chance >= 0) & (pen_chance <= 1)).all()
+    assert ((shots_to_kill >= 1) & (shots_to_kill <= armor_sim.SIM_MAX_SHOTS)).all()
+
+
+def test_cache_only_resimulates_changed_bullets(quiet):
+    records = synthetic_records(30)
+    cache = {}
+    with quiet():
+        armor_sim.simulate_armor(records, cache)
+    first = copy.deepcopy([record["shotsToKill"] for record in records])
+    assert len(cache) == len({armor_sim.ballistic_hash(record) for record in records})
+
+    records[4]["penetrationPower"] += 15
+    with quiet():
+        armor_sim.simulate_armor(records, cache)
+    changed = [i for i, record in enumerate(records) if record["shotsToKill"] != first[i]]
+    assert changed == [4]
+
+
+def test_table_and_list_paths_agree(quiet):
+    records = synthetic_records(25)
+    with quiet():
+        listed = armor_sim.simulate_armor(copy.deepcopy(records), {})
+        table = armor_sim.simulate_armor(AmmoTable.from_records(copy.deepcopy(records)), {})
+    assert table.column("shotsToKill") == [record["shotsToKill"] for record in listed]
+    assert table.column("penChance") == [record["penChance"] for record in listed]
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+import codec
+import crypt
+from synthetic import synthetic_records
+
+
+@pytest.mark.parametrize("codec_id", [codec.CODEC_BINARY, codec.CODEC_JSON])
+def test_roundtrip_synthetic_records(codec_id):
+    records = synthetic_records(300)
+    payload = codec.encode(records, codec_id)
+    assert payload[0] == codec_id
+    assert codec.decode(payload) == records
+
+
+def test_binary_keeps_types_and_key_order():
+    records = [
+        {"id": "a", "damage": 50, "fragmentationChance": 0.25, "caliber": "Caliber9x19PARA", "extra": None,
+         "buyFor": [{"price": 7, "currency": "USD", "priceRUB": 980, "source": "peacekeeper"}]},
+        {"id": "b", "damage": 2 ** 40, "fragmentationChance": 1.0, "caliber": "Caliber9x19PARA", "extra": [1, "x"],
+         "buyFor": []},
+    ]
+    decoded = codec.decode(codec.encode(records))
+    assert decoded == records
+    assert [list(record) for record in decoded] == [list(record) for record in records]
+    assert type(decoded[1]["fragmentationChance"]) is float
+
+
+def test_mixed_keys_fall_back_to_json():
+    records = [{"id": "a", "damage": 1}, {"damage": 2, "id": "b"}]
+    payload = codec.encode(records)
+    assert payload[0] == codec.CODEC_JSON
+    assert codec.decode(payload) == records
+
+
+def test_legacy_json_block_is_still_read():
+    records = synthetic_records(3)
+    assert codec.decode(json.dumps(records).encode("utf-8")) == records
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        codec.decode(b"\x7f{}")
+
+
+@pytest.mark.parametrize("codec_name", ["binary", "json"])
+def test_encrypted_snapshot_roundtrip(codec_name, quiet):
+    records = synthetic_records(600)
+    with quiet():
+        crypt.save_encrypted_variable(iter(records), "snap.bin", chunk_size=128, codec_name=codec_name)
+        assert crypt.load_and_decrypt_data("snap.bin") == records
+    assert list(crypt.iter_decrypted_records("snap.bin", workers=2)) == records
+
+
+def test_truncated_snapshot_is_reported(quiet):
+    with quiet():
+        crypt.save_encrypted_variable(synthetic_records(300), "snap.bin", chunk_size=100)
+    with open("snap.bin", "r+b") as f:
+        f.truncate(f.seek(0, 2) - 10)
+    with pytest.raises(ValueError):
+        list(crypt.iter_decrypted_records("snap.bin"))
+
+
+def test_failed_write_keeps_previous_snapshot(quiet):
+    records = synthetic_records(200)
+    with quiet():
+        crypt.save_encrypted_variable(records, "snap.bin", chunk_size=50)
+
+    def broken():
+        yield from synthetic_records(120, seed=5)
+        raise RuntimeError("API cortada a mitad")
+
+    with quiet(), pytest.raises(RuntimeError):
+        crypt.save_encrypted_variable(broken(), "snap.bin", chunk_size=50)
+    assert crypt.load_and_decrypt_data("snap.bin") == records
+    assert not os.path.exists("snap.bin.tmp")
@@ -0,0 +1,49 @@
+import metrics
+
+
+def test_stages_and_counters_are_recorded(tmp_path):
+    filename = str(tmp_path / "runs.json")
+
+    @metrics.instrumented("inner", count_input=True)
+    def inner(records):
+        metrics.count("mongo_writes", 2)
+        return records
+
+    metrics.start_run("full")
+    with metrics.stage("outer"):
+        inner([1, 2, 3])
+    report = metrics.finish_run("ok", filename)
+
+    assert [entry["stage"] for entry in report["stages"]] == ["outer", "inner"]
+    assert report["stages"][1]["counts"] == {"records": 3, "mongo_writes": 2}
+    assert metrics.load_runs(filename)[-1]["status"] == "ok"
+
+
+def test_no_run_means_no_bookkeeping():
+    @metrics.instrumented("free")
+    def free():
+        metrics.count("ignored")
+        return 1
+
+    assert free() == 1
+    assert metrics.finish_run("ok") is None
+
+
+def test_saved_runs_are_capped(tmp_path):
+    filename = str(tmp_path / "runs.json")
+    for status in ("a", "b", "c"):
+        metrics.save_run({"status": status}, filename, keep=2)
+    assert [run["status"] for run in metrics.load_runs(filename)] == ["b", "c"]
+
+
+def test_render_prometheus():
+    histogram = metrics.LatencyHistogram("eft_http_seconds", "Latencia.", ("path",), buckets=(0.1, 1.0))
+    histogram.observe(("/api/ammo",), 0.05)
+    histogram.observe(("/api/ammo",), 0.5)
+    report = {"mode": "full", "status": "ok", "started_at_ts": 1.0, "duration_s": 2.0, "cpu_s": 1.0,
+              "stages": [{"stage": "fetch", "wall_s": 1.5, "cpu_s": 0.5, "counts": {"records": 10}}]}
+    text = metrics.render_prometheus([report], (histogram,))
+    assert 'eft_http_seconds_bucket{path="/api/ammo",le="0.1"} 1' in text
+    assert 'eft_http_seconds_bucket{path="/api/ammo",le="+Inf"} 2' in text
+    assert 'eft_etl_recorded_runs{status="ok"} 1' in text
+    assert 'eft_etl_stage_count{stage="fetch",counter="records"} 10' in text
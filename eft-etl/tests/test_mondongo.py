@@ -0,0 +1,90 @@
+import pytest
+
+import mondongo
+from synthetic import synthetic_records
+
+
+@pytest.fixture
+def bullets(db):
+    return db[mondongo.COLLECTION_NAME]
+
+
+def test_content_hash_ignores_control_fields_and_key_order():
+    record = {"id": "a", "damage": 50, "name": "X"}
+    same = {"name": "X", "damage": 50, "id": "a", "_id": 1, "last_updated": "now", mondongo.HASH_FIELD: "old"}
+    assert mondongo.content_hash(record) == mondongo.content_hash(same)
+    assert mondongo.content_hash(record) != mondongo.content_hash({**record, "damage": 51})
+
+
+def test_upload_skips_existing_ids(bullets, db, quiet):
+    records = synthetic_records(30)
+    with quiet():
+        first = mondongo.upload_to_mongodb_2(records[:20], batch_size=8)
+        second = mondongo.upload_to_mongodb_2(iter(records), batch_size=8)
+    assert [batch["insertados"] for batch in first] == [8, 8, 4]
+    assert sum(batch["insertados"] for batch in second) == 10
+    assert sum(batch["omitidos"] for batch in second) == 20
+    assert bullets.count_documents({}) == 30
+    assert mondongo.get_data_version(db) == 2
+
+
+def test_smart_update_inserts_then_reports_no_changes(bullets, db, quiet):
+    records = synthetic_records(25)
+    with quiet():
+        inserted = mondongo.smart_update_mongodb_2(records)
+        version = mondongo.get_data_version(db)
+        again = mondongo.smart_update_mongodb_2(records)
+    assert inserted["documentos_insertados"] == 25
+    assert again["documentos_sin_cambios"] == 25
+    assert again["documentos_modificados"] == 0
+    # Sin cambios no se invalida la caché de la web
+    assert mondongo.get_data_version(db) == version
+    stored = bullets.find_one({"id": records[0]["id"]})
+    assert stored[mondongo.HASH_FIELD] == mondongo.content_hash(records[0])
+
+
+def test_smart_update_writes_only_changed_fields(bullets, quiet):
+    records = synthetic_records(10)
+    with quiet():
+        mondongo.smart_update_mongodb_2(records)
+    records[3] = {**records[3], "damage": records[3]["damage"] + 1, "caliber": "Caliber9x19PARA"}
+    with quiet():
+        result = mondongo.smart_update_mongodb_2(records)
+    assert result["documentos_modificados"] == 1
+    assert sorted(result["detalles_modificados"][0]["cambios"]) == ["caliber", "damage"]
+    assert (records[3]["ammoType"], "Caliber9x19PARA") in result["grupos_afectados"]
+    stored = bullets.find_one({"id": records[3]["id"]}, {"_id": 0})
+    assert stored["damage"] == records[3]["damage"]
+    assert stored[mondongo.HASH_FIELD] == mondongo.content_hash(records[3])
+
+
+def test_smart_update_repairs_missing_hash_without_counting_a_change(bullets, quiet):
+    records = synthetic_records(5)
+    bullets.insert_many([dict(record) for record in records])  # Documentos antiguos, sin hash
+    with quiet():
+        result = mondongo.smart_update_mongodb_2(records)
+    assert result["documentos_sin_cambios"] == 5
+    assert bullets.count_documents({mondongo.HASH_FIELD: {"$exists": True}}) == 5
+
+
+def test_partial_update_only_prefetches_given_ids(bullets, quiet):
+    records = synthetic_records(10)
+    with quiet():
+        mondongo.smart_update_mongodb_2(records)
+        result = mondongo.smart_update_mongodb_2([{**records[0], "name": "Renamed"}], partial=True)
+    assert result["documentos_procesados"] == 1
+    assert result["documentos_modificados"] == 1
+    assert bullets.count_documents({}) == 10
+
+
+def test_refresh_view_groups_sorted_rows(db, quiet):
+    records = synthetic_records(40)
+    with quiet():
+        mondongo.smart_update_mongodb_2(records)
+        mondongo.refresh_view()
+    groups = list(db[mondongo.VIEW_COLLECTION].find({}, {"_id": 0}))
+    assert sum(group["count"] for group in groups) == 40
+    for group in groups:
+        pens = [row["penetrationPower"] for row in group["bullets"]]
+        assert pens == sorted(pens, reverse=True)
+        assert set(group["bullets"][0]) <= set(mondongo.VIEW_FIELDS) | {"bestOffer"}
@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+
+import normalizer
+import tl
+from ammo_table import AmmoTable
+from synthetic import synthetic_records
+
+
+def _scored_table(records, quiet) -> AmmoTable:
+    with quiet():
+        return tl.calculate_finalScore(AmmoTable.from_records(copy.deepcopy(records)))
+
+
+def _full_normalization(records, quiet) -> AmmoTable:
+    with quiet():
+        return tl.normalize_and_update_scores(_scored_table(records, quiet))
+
+
+def _hashes(records) -> list:
+    return [str(sorted(record.items())) for record in records]
+
+
+def test_first_run_matches_full_normalization(quiet):
+    records = synthetic_records(200)
+    with quiet():
+        table, dirty, state, summary = normalizer.normalize_incremental(_scored_table(records, quiet), _hashes(records))
+    expected = _full_normalization(records, quiet)
+    assert table.column("normalized").tolist() == expected.column("normalized").tolist()
+    assert table.strings("tier") == expected.strings("tier")
+    assert dirty.all() and not summary["incremental"]
+
+
+def test_incremental_run_matches_full_normalization_and_marks_changes(quiet):
+    records = synthetic_records(200)
+    with quiet():
+        _, _, state, _ = normalizer.normalize_incremental(_scored_table(records, quiet), _hashes(records))
+
+    records[10]["damage"] += 40                 # Score nuevo
+    records[20]["name"] = "Renamed"             # Mismo score, otro contenido
+    removed = records.pop(30)                   # Bala retirada
+    records.append({**synthetic_records(1, seed=99)[0], "id": "new-bullet"})  # Bala nueva
+    with quiet():
+        table, dirty, new_state, summary = normalizer.normalize_incremental(_scored_table(records, quiet),
+                                                                           _hashes(records), state)
+
+    expected = _full_normalization(records, quiet)
+    np.testing.assert_array_equal(table.column("normalized"), expected.column("normalized"))
+    assert table.strings("tier") == expected.strings("tier")
+    assert summary["incremental"] and summary["retiradas"] == 1
+    changed = {records[10]["id"], records[20]["id"], records[-1]["id"]}
+    assert changed <= {item_id for item_id, flag in zip(table.column("id"), dirty) if flag}
+    assert removed["id"] not in new_state["ids"]
+
+
+def test_unchanged_run_writes_nothing(quiet):
+    records = synthetic_records(100)
+    with quiet():
+        _, _, state, _ = normalizer.normalize_incremental(_scored_table(records, quiet), _hashes(records))
+        _, dirty, _, summary = normalizer.normalize_incremental(_scored_table(records, quiet), _hashes(records), state)
+    assert not dirty.any()
+    assert summary["renormalizadas"] == 0
+
+
+def test_state_roundtrip():
+    normalizer.save_state({"state_version": normalizer.STATE_VERSION, "ids": ["a"]})
+    assert normalizer.load_state()["ids"] == ["a"]
+    normalizer.clear_state()
+    assert normalizer.load_state() is None
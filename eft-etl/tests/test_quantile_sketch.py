@@ -0,0 +1,39 @@
+import numpy as np
+
+from quantile_sketch import QuantileSketch
+
+
+def test_exact_below_buffer():
+    values = np.random.default_rng(0).lognormal(6, 0.6, 1500)
+    sketch = QuantileSketch()
+    for batch in np.array_split(values, 7):
+        sketch.update(batch)
+    assert sketch.quantiles((0.25, 0.75)) == [np.percentile(values, 25), np.percentile(values, 75)]
+
+
+def test_rank_error_is_small_after_compression():
+    values = np.random.default_rng(1).normal(500, 120, 200_000)
+    sketch = QuantileSketch()
+    for batch in np.array_split(values, 200):
+        sketch.update(batch)
+    ordered = np.sort(values)
+    for q in (0.25, 0.75):
+        rank = np.searchsorted(ordered, sketch.quantile(q)) / len(values)
+        assert abs(rank - q) < 0.002
+
+
+def test_merge_matches_single_sketch():
+    values = np.random.default_rng(2).normal(0, 1, 50_000)
+    left, right = QuantileSketch(), QuantileSketch()
+    left.update(values[:25_000])
+    right.update(values[25_000:])
+    merged = left.merge(right)
+    assert len(merged) == len(values)
+    assert abs(merged.quantile(0.5) - np.median(values)) < 0.01
+
+
+def test_nan_is_ignored_and_empty_is_nan():
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    sketch = QuantileSketch().update([1.0, np.nan, 3.0])
+    assert len(sketch) == 2
+    assert sketch.quantile(0.5) == 2.0
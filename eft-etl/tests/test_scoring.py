@@ -0,0 +1,77 @@
+import copy
+
+import numpy as np
+import pytest
+
+import tl
+from ammo_table import AmmoTable
+from synthetic import synthetic_records
+
+
+def test_vectorized_scores_match_scalar_formula():
+    records = synthetic_records(500)
+    assert tl.batch_final_scores(records) == [tl._score_item(record) for record in records]
+
+
+ODD_VALUES = [
+    ("damage", "50"),             # Texto numérico: la fórmula escalar da TypeError -> 0
+    ("recoilModifier", "abc"),
+    ("penetrationPower", None),
+    ("armorDamage", True),        # bool: vía escalar, mismo valor que la fórmula original
+]
+
+
+@pytest.mark.parametrize("field, value", ODD_VALUES)
+def test_odd_values_follow_scalar_path(field, value):
+    records = synthetic_records(20)
+    records[5][field] = value
+    scores = tl.batch_final_scores(records)
+    assert scores == [tl._score_item(record) for record in records]
+
+
+def test_missing_fields_use_scalar_defaults():
+    records = synthetic_records(10)
+    del records[2]["projectileCount"]
+    assert tl.batch_final_scores(records) == [tl._score_item(record) for record in records]
+
+
+def test_table_path_matches_list_path(quiet):
+    records = synthetic_records(400)
+    with quiet():
+        listed = tl.normalize_and_update_scores(tl.calculate_finalScore(copy.deepcopy(records)))
+        table = tl.normalize_and_update_scores(tl.calculate_finalScore(AmmoTable.from_records(copy.deepcopy(records))))
+    assert table.to_records() == listed
+
+
+def test_min_buy_price_picks_cheapest_offer_in_rubles(quiet):
+    record = synthetic_records(1)[0]
+    record["buyFor"] = [
+        {"price": 20, "currency": "USD", "priceRUB": 2800, "source": "peacekeeper"},
+        {"price": 900, "currency": "RUB", "priceRUB": 900, "source": "prapor"},
+        {"price": 0, "currency": "RUB", "priceRUB": 0, "source": "fleaMarket"},  # Sin precio: se ignora
+    ]
+    with quiet():
+        tl.calculate_finalScore([record])
+    assert record["minBuyPrice"] == {"price": 900, "currency": "RUB", "source": "prapor"}
+
+
+def test_profile_balanced_matches_final_score(quiet):
+    records = synthetic_records(200)
+    with quiet():
+        tl.score_profiles(tl.calculate_finalScore(records))
+    balanced = np.array([record["profiles"]["balanced"]["finalScore"] for record in records])
+    np.testing.assert_allclose(balanced, [record["finalScore"] for record in records], rtol=1e-9)
+
+
+@pytest.mark.parametrize("field, value", ODD_VALUES)
+def test_table_path_handles_odd_values_like_list_path(field, value, quiet):
+    records = synthetic_records(30)
+    records[5][field] = value
+    with quiet():
+        listed = tl.normalize_and_update_scores(tl.score_profiles(tl.calculate_finalScore(copy.deepcopy(records))))
+        table = tl.normalize_and_update_scores(tl.score_profiles(tl.calculate_finalScore(
+            AmmoTable.from_records(copy.deepcopy(records)))))
+    assert table.to_records() == listed
+    # El valor original vuelve tal cual (y con su tipo), también tras reordenar
+    assert type(table.to_records()[5][field]) is type(value)
+    assert table.take([5, 0]).to_records()[0] == listed[5]
@@ -0,0 +1,72 @@
+import copy
+
+import armor_sim
+import profiles
+import tl
+from ammo_table import AmmoTable
+from synthetic import synthetic_records
+
+# Cota documentada en tl.stream_normalized (error relativo de las vallas con compression=200)
+STREAM_RELATIVE_ERROR = 0.002
+
+
+def test_fence_pass_only_scores_pending_records(monkeypatch):
+    records = synthetic_records(50)
+    with_score = copy.deepcopy(records)
+    for record in with_score[:30]:
+        record["finalScore"] = tl._score_item(record)
+    scored = []
+    original = tl.batch_final_scores
+    monkeypatch.setattr(tl, "batch_final_scores", lambda items: scored.extend(items) or original(items))
+
+    fence, sketch, _ = tl.stream_score_fence(with_score, batch_size=16)
+    assert [item["id"] for item in scored] == [record["id"] for record in with_score[30:]]
+    assert len(sketch) == 50
+    assert fence == tl.stream_score_fence(records, batch_size=16)[0]
+
+
+def _in_memory(records, quiet) -> list:
+    with quiet():
+        table = tl.clean_caliber_data(AmmoTable.from_records(copy.deepcopy(records)))
+        # La caché de la simulación queda en disco: stream_normalized la reutiliza
+        cache = armor_sim.load_cache()
+        table = armor_sim.simulate_armor(tl.score_profiles(tl.calculate_finalScore(table)), cache)
+        armor_sim.save_cache(cache)
+        return list(tl.normalize_and_update_scores(table).iter_records())
+
+
+def _streamed(records, quiet) -> list:
+    with quiet():
+        return list(tl.stream_normalized(lambda: iter(copy.deepcopy(records)), batch_size=500))
+
+
+def _near_threshold(normalized: float, tolerance: float) -> bool:
+    return any(abs(normalized - threshold) <= tolerance for threshold, _ in tl.TIER_THRESHOLDS)
+
+
+def test_stream_is_identical_below_sketch_buffer(quiet):
+    records = synthetic_records(1500)
+    expected, streamed = _in_memory(records, quiet), _streamed(records, quiet)
+    assert streamed == expected
+    assert [list(bullet) for bullet in streamed] == [list(bullet) for bullet in expected]
+
+
+def test_stream_error_is_bounded_above_sketch_buffer(quiet):
+    records = synthetic_records(6000)
+    expected, streamed = _in_memory(records, quiet), _streamed(records, quiet)
+    assert [list(bullet) for bullet in streamed] == [list(bullet) for bullet in expected]
+
+    def check(got: dict, want: dict):
+        if "normalized" not in want:
+            return
+        tolerance = abs(want["normalized"]) * STREAM_RELATIVE_ERROR + 0.1
+        assert abs(got["normalized"] - want["normalized"]) <= tolerance
+        assert got["tier"] == want["tier"] or _near_threshold(want["normalized"], tolerance)
+
+    for got, want in zip(streamed, expected):
+        for field in ("finalScore", "minBuyPrice", "shotsToKill", "penChance"):
+            assert got.get(field) == want.get(field)
+        check(got, want)
+        for name in profiles.PROFILES:
+            assert got["profiles"][name]["finalScore"] == want["profiles"][name]["finalScore"]
+            check(got["profiles"][name], want["profiles"][name])
@@ -0,0 +1,65 @@
+import crypt
+import e
+import mondongo
+import update
+
+NEW_OFFER = [{"price": 7, "currency": "USD", "priceRUB": 980, "source": "peacekeeper"}]
+
+
+def _run(mode: str, quiet) -> str:
+    with quiet():
+        return update.update_database(mode)
+
+
+def _bullets(db) -> dict:
+    return {doc["id"]: doc for doc in db[mondongo.COLLECTION_NAME].find({}, {"_id": 0})}
+
+
+def test_full_refresh_then_no_change(db, stub_api, quiet):
+    assert _run("full", quiet) == e.FETCH_OK
+    assert len(_bullets(db)) == 60
+    assert db[mondongo.VIEW_COLLECTION].count_documents({}) > 0
+    assert _run("full", quiet) == e.FETCH_NO_CHANGE
+    # Consulta completa hecha: el modo auto pasa a refrescar solo precios
+    assert not e.full_refresh_due()
+
+
+def test_changed_bullet_is_written(db, stub_api, quiet):
+    _run("full", quiet)
+    stub_api.ammo[0]["item"]["name"] = "Renamed bullet"
+    stub_api.set_payload(stub_api.ammo)
+    assert _run("full", quiet) == e.FETCH_OK
+    assert _bullets(db)[stub_api.ammo[0]["item"]["id"]]["name"] == "Renamed bullet"
+
+
+def test_price_refresh_updates_offers(db, stub_api, quiet):
+    _run("full", quiet)
+    stub_api.ammo[1]["item"]["buyFor"] = NEW_OFFER
+    stub_api.set_payload(stub_api.ammo)
+    assert _run("prices", quiet) == e.FETCH_OK
+    doc = _bullets(db)[stub_api.ammo[1]["item"]["id"]]
+    assert doc["buyFor"] == NEW_OFFER
+    assert doc["minBuyPrice"] == {"price": 7, "currency": "USD", "source": "peacekeeper"}
+    assert _run("prices", quiet) == e.FETCH_NO_CHANGE
+
+
+def test_failed_price_write_is_retried(db, stub_api, quiet, monkeypatch):
+    _run("full", quiet)
+    stub_api.ammo[2]["item"]["buyFor"] = NEW_OFFER
+    stub_api.set_payload(stub_api.ammo)
+    with monkeypatch.context() as patch:
+        patch.setattr(mondongo, "update_prices_mongodb", lambda data: {"estado": "ERROR", "mensaje": "down"})
+        assert _run("prices", quiet) == e.FETCH_ERROR
+    # El snapshot no avanzó: el siguiente ciclo vuelve a ver el cambio y lo escribe
+    assert _run("prices", quiet) == e.FETCH_OK
+    assert _bullets(db)[stub_api.ammo[2]["item"]["id"]]["buyFor"] == NEW_OFFER
+
+
+def test_failed_mongo_write_forces_reprocessing(db, stub_api, quiet, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(mondongo, "smart_update_mongodb_2", lambda *args, **kwargs: {"estado": "ERROR"})
+        assert _run("full", quiet) == e.FETCH_ERROR
+    assert crypt.load_fingerprint() is None
+    # Misma respuesta de la API, pero sin huella: se procesa y Mongo se pone al día
+    assert _run("full", quiet) == e.FETCH_OK
+    assert len(_bullets(db)) == 60
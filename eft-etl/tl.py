@@ -1,7 +1,25 @@
 from colorama import Fore, Style
+from itertools import chain
+from operator import itemgetter
 import numpy as np
-
-
+from ammo_table import AmmoTable, MIN_BUY_FIELD
+from quantile_sketch import QuantileSketch, DEFAULT_COMPRESSION
+import metrics
+import profiles
+import armor_sim
+
+# Umbrales de 'normalized' para cada tier, de mejor a peor (por debajo del último: 'D')
+TIER_THRESHOLDS = (
+    (95, 'S+'),  # La crème de la crème (Meta absoluto)
+    (85, 'S'),   # Excelente
+    (70, 'A'),   # Muy bueno
+    (50, 'B'),   # Decente / Budget
+    (30, 'C'),   # Malo
+)
+LOWEST_TIER = 'D'  # "Scav tier" (Inusable)
+
+
+@metrics.instrumented("tl.clean_caliber_data", count_input=True)
 def clean_caliber_data(data: list) -> list:
     """
     Recorre la lista de municiones, elimina la palabra "Caliber" del campo 'caliber',
@@ -11,46 +29,60 @@ def clean_caliber_data(data: list) -> list:
     """
     if not data:
         print(f"{Fore.RED}La lista de municiones está vacía. No hay datos para limpiar.")
-        return []
+        return data if isinstance(data, AmmoTable) else []
 
     print(f"\n{Fore.CYAN}Limpiando el campo 'caliber'{Style.RESET_ALL}")
 
-    count_cleaned = 0
+    if isinstance(data, AmmoTable):
+        # En la tabla solo hay que limpiar cada calibre distinto una vez
+        changed = data.map_category('caliber', lambda value: value.replace("Caliber", "").strip()
+                                    if isinstance(value, str) else value)
+        print(f"{Fore.GREEN}Limpieza completada. Se modificaron {int(changed.sum())} registros.")
+        return data
 
-    for item in data:
-        # Verificamos que el campo 'caliber' exista y sea una cadena de texto
-        if 'caliber' in item and isinstance(item['caliber'], str):
-            original_value = item['caliber']
+    count_cleaned = sum(_clean_caliber(item) for item in data)
 
-            # 1. Reemplazamos "Caliber" por una cadena vacía
-            cleaned_value = original_value.replace("Caliber", "")
+    print(f"{Fore.GREEN}Limpieza completada. Se modificaron {count_cleaned} registros.")
 
-            # 2. Manejo de posibles espacios extra (opcional pero recomendado)
-            cleaned_value = cleaned_value.strip()
+    # Retornar la lista de datos modificada
+    return data
 
-            # 3. Asignamos el valor limpio de nuevo al diccionario
-            item['caliber'] = cleaned_value
 
-            # Si el valor cambió, incrementamos el contador
-            if original_value != cleaned_value:
-                count_cleaned += 1
+def _clean_caliber(item: dict) -> bool:
+    """Limpia el 'caliber' de una bala. Retorna True si el valor cambió."""
+    # Verificamos que el campo 'caliber' exista y sea una cadena de texto
+    if 'caliber' in item and isinstance(item['caliber'], str):
+        original_value = item['caliber']
 
-    print(f"{Fore.GREEN}Limpieza completada. Se modificaron {count_cleaned} registros.")
+        # 1. Reemplazamos "Caliber" por una cadena vacía
+        cleaned_value = original_value.replace("Caliber", "")
 
-    # Retornar la lista de datos modificada
-    return data
+        # 2. Manejo de posibles espacios extra (opcional pero recomendado)
+        cleaned_value = cleaned_value.strip()
+
+        # 3. Asignamos el valor limpio de nuevo al diccionario
+        item['caliber'] = cleaned_value
+
+        return original_value != cleaned_value
+    return False
 
 
 def statistical_analitic(score: list) -> list:
 
     Q1 = np.percentile(score, 25)
     Q3 = np.percentile(score, 75)
-    IQR = Q3 - Q1
-    maxScoreValue = Q3 + (1.5 * IQR)
+    maxScoreValue = iqr_fence(Q1, Q3)
     print(f"{maxScoreValue}")
     return maxScoreValue
 
 
+def iqr_fence(Q1: float, Q3: float) -> float:
+    """Valla superior de Tukey (Q3 + 1.5 * IQR): el 'techo' con el que se normaliza."""
+    IQR = Q3 - Q1
+    return Q3 + (1.5 * IQR)
+
+
+@metrics.instrumented("tl.normalize_and_update_scores", count_input=True)
 def normalize_and_update_scores(bullets_list: list[dict[str]]) -> list[dict[str]]:
     """
     Toma una lista de balas con 'meta_score' calculado, normaliza estos puntajes
@@ -59,7 +91,10 @@ def normalize_and_update_scores(bullets_list: list[dict[str]]) -> list[dict[str]
     """
     print("Normalizando scores")
     if not bullets_list:
-        return []
+        return bullets_list if isinstance(bullets_list, AmmoTable) else []
+
+    if isinstance(bullets_list, AmmoTable):
+        return _normalize_table(bullets_list)
 
     # 1. Encontrar el puntaje máximo (El "Techo" del Meta actual)
     # Extraemos todos los scores. Si la lista está vacía o el max es 0, evitamos errores.
@@ -83,70 +118,228 @@ def normalize_and_update_scores(bullets_list: list[dict[str]]) -> list[dict[str]
 
     # 2. Iterar, Normalizar y Actualizar
     for bullet in bullets_list:
-        raw_score = bullet.get('finalScore', 0)
-
-        # Fórmula de Normalización: (Valor / Máximo) * 100
-        # Esto nos da un porcentaje de efectividad comparado con la mejor bala.
-        normalized = (raw_score / max_score) * 100
-        # Guardamos el valor redondeado a 1 decimal
-        bullet['normalized'] = round(normalized, 1)
-
-        # 3. Asignación Automática de Tier (Opcional pero útil)
-        if normalized >= 95:
-            tier = 'S+' # La crème de la crème (Meta absoluto)
-        elif normalized >= 85:
-            tier = 'S'  # Excelente
-        elif normalized >= 70:
-            tier = 'A'  # Muy bueno
-        elif normalized >= 50:
-            tier = 'B'  # Decente / Budget
-        elif normalized >= 30:
-            tier = 'C'  # Malo
-        else:
-            tier = 'D'  # "Scav tier" (Inusable)
-
-        bullet['tier'] = tier
+        _normalize_bullet(bullet, max_score)
 
     # Retornamos la lista ordenada por el puntaje normalizado (de mayor a menor)
     return bullets_list
 
+
+def _normalize_bullet(bullet: dict, max_score: float) -> dict:
+    """Asigna 'normalized' y 'tier' a una bala respecto al techo 'max_score'."""
+    raw_score = bullet.get('finalScore', 0)
+
+    # Fórmula de Normalización: (Valor / Máximo) * 100
+    # Esto nos da un porcentaje de efectividad comparado con la mejor bala.
+    normalized = (raw_score / max_score) * 100
+    # Guardamos el valor redondeado a 1 decimal
+    bullet['normalized'] = round(normalized, 1)
+
+    # 3. Asignación Automática de Tier (Opcional pero útil)
+    bullet['tier'] = next((tier for threshold, tier in TIER_THRESHOLDS if normalized >= threshold),
+                          LOWEST_TIER)
+    return bullet
+
+
+def _normalize_table(table: AmmoTable) -> AmmoTable:
+    """Versión columnar de normalize_and_update_scores: mismos valores, sin recorrer dicts."""
+    scores = table.column('finalScore')
+    max_score = statistical_analitic(scores)
+
+    if max_score == 0:
+        print("Advertencia: El puntaje máximo es 0. No se puede normalizar.")
+        return table
+
+    print(f"Normalizando datos... (Puntaje Máximo de Referencia: {max_score:.2f})")
+
+    normalized, codes = normalize_scores(scores, max_score)
+    set_normalization(table, normalized, codes)
+    return table
+
+
+# Valores de la categoría 'tier' en la tabla: el código de cada tier es su posición
+TIER_CODES = [tier for _, tier in TIER_THRESHOLDS] + [LOWEST_TIER]
+
+
+def normalize_scores(scores: np.ndarray, max_score: float) -> tuple[np.ndarray, np.ndarray]:
+    """'normalized' (redondeado a 1 decimal) y código de tier (índice en TIER_CODES) de cada score."""
+    normalized = (scores / max_score) * 100
+    # round() de Python para que el redondeo sea idéntico al de la lista de dicts
+    rounded = np.array([round(value, 1) for value in normalized.tolist()], dtype=np.float64)
+
+    conditions = [normalized >= threshold for threshold, _ in TIER_THRESHOLDS]
+    codes = np.select(conditions, list(range(len(TIER_THRESHOLDS))), default=len(TIER_THRESHOLDS))
+    return rounded, codes.astype(np.int32)
+
+
+def set_normalization(table: AmmoTable, normalized: np.ndarray, codes: np.ndarray) -> AmmoTable:
+    table.set_column('normalized', normalized)
+    table.columns['tier'] = codes
+    table.categories['tier'] = list(TIER_CODES)
+    table._remember('tier')
+    return table
+
+# Campos numéricos que intervienen en el finalScore y su valor por defecto
+# (el mismo que usaba cada item.get(...) del cálculo original).
+SCORE_FIELDS = {
+    'damage': 0,
+    'projectileCount': 1,
+    'fragmentationChance': 0,
+    'penetrationPower': 0,
+    'penetrationChance': 0,
+    'penetrationPowerDeviation': 0,
+    'armorDamage': 0,
+    'lightBleedModifier': 0,
+    'heavyBleedModifier': 0,
+    'staminaBurnPerDamage': 0,
+    'accuracyModifier': 0,
+    'recoilModifier': 0,
+}
+
+
+def _score_item(item: dict) -> float:
+    """
+    Cálculo bala a bala del finalScore (fórmula original). Se usa solo para las balas
+    con campos no numéricos, donde el TypeError se traduce en un score de 0.
+    """
+    try:
+        rawDamage = item.get('damage', 0) * item.get('projectileCount', 1)
+        lethalScore = rawDamage * (1 + item.get('fragmentationChance', 0))
+        penetrationScore = ((item.get('penetrationPower', 0) * 4.0) + (item.get('penetrationChance', 0) * 20)
+                            - (item.get('penetrationPowerDeviation', 0)))
+        utilityScore = ((item.get('armorDamage', 0) * 1.5) + (item.get('lightBleedModifier', 0) * 50) +
+                        (item.get('heavyBleedModifier', 0) * 75) + (item.get('staminaBurnPerDamage', 0) * 150))
+        handlingScore = (item.get('accuracyModifier', 0) * 200) - (item.get('recoilModifier', 0) * 200)
+        return ((penetrationScore * 1.8) + (lethalScore * 0.8) + (utilityScore * 0.5) +
+                handlingScore)
+    except TypeError:
+        return 0
+
+
+# Tipos que se convierten a float64 igual que los trata _score_item (None -> NaN, que también se marca)
+_PLAIN_NUMBERS = {int, float, type(None)}
+
+
+def _score_columns(items: list[dict]) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """
+    Extrae los SCORE_FIELDS de todas las balas como columnas float64.
+    Retorna (columnas, sospechosas): las filas con valores que no son números
+    (None -> NaN, textos...) se marcan para calcularlas por la vía escalar.
+    """
+    try:
+        # Vía rápida: todas las balas traen todos los campos (lo normal tras la validación)
+        rows = list(map(itemgetter(*SCORE_FIELDS), items))
+    except KeyError:
+        rows = [tuple(item.get(field, default) for field, default in SCORE_FIELDS.items()) for item in items]
+
+    suspicious = np.zeros(len(items), dtype=bool)
+    # np.array(..., float64) acepta textos como "50" y bools: esas filas van por la vía escalar
+    if not set(map(type, chain.from_iterable(rows))) <= _PLAIN_NUMBERS:
+        suspicious = np.array([not all(type(v) in _PLAIN_NUMBERS for v in row) for row in rows], dtype=bool)
+    try:
+        matrix = np.array(rows, dtype=np.float64).reshape(len(items), len(SCORE_FIELDS))
+    except (TypeError, ValueError):
+        # Hay textos u otros objetos: solo las columnas con basura se revisan celda a celda
+        raw = np.array(rows, dtype=object).reshape(len(items), len(SCORE_FIELDS))
+        matrix = np.zeros(raw.shape, dtype=np.float64)
+        for col in range(raw.shape[1]):
+            try:
+                matrix[:, col] = raw[:, col].astype(np.float64)
+            except (TypeError, ValueError):
+                numeric = np.array([isinstance(v, (int, float)) for v in raw[:, col]], dtype=bool)
+                matrix[numeric, col] = raw[numeric, col].astype(np.float64)
+                suspicious |= ~numeric
+
+    suspicious |= np.isnan(matrix).any(axis=1)
+    columns = {field: matrix[:, col] for col, field in enumerate(SCORE_FIELDS)}
+    return columns, suspicious
+
+
+def compute_final_scores(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Calcula el finalScore de todas las balas a la vez a partir de sus columnas numéricas.
+    Las operaciones siguen el mismo orden que la fórmula original, así que el resultado
+    es idéntico al cálculo bala a bala.
+    """
+    rawDamage = columns['damage'] * columns['projectileCount']
+    lethalScore = rawDamage * (1 + columns['fragmentationChance'])
+    penetrationScore = ((columns['penetrationPower'] * 4.0) + (columns['penetrationChance'] * 20)
+                        - (columns['penetrationPowerDeviation']))
+    utilityScore = ((columns['armorDamage'] * 1.5) + (columns['lightBleedModifier'] * 50) +
+                    (columns['heavyBleedModifier'] * 75) + (columns['staminaBurnPerDamage'] * 150))
+    handlingScore = (columns['accuracyModifier'] * 200) - (columns['recoilModifier'] * 200)
+    return ((penetrationScore * 1.8) + (lethalScore * 0.8) + (utilityScore * 0.5) +
+            handlingScore)
+
+
+def cheapest_offer_index(owners: np.ndarray, prices: np.ndarray, n_items: int) -> np.ndarray:
+    """
+    Dadas todas las ofertas aplanadas (a qué bala pertenecen y su priceRUB), retorna
+    para cada bala la posición de su oferta más barata, o -1 si no tiene ninguna.
+    Ante empates gana la primera oferta, igual que en el bucle original.
+    """
+    best = np.full(n_items, -1, dtype=np.int64)
+    if len(owners) == 0:
+        return best
+
+    positions = np.arange(len(owners))
+    # Orden por bala, luego por precio y luego por posición: la primera de cada bala es el argmin
+    order = np.lexsort((positions, prices, owners))
+    first_owners, first_idx = np.unique(owners[order], return_index=True)
+    best[first_owners] = order[first_idx]
+    return best
+
+
+@metrics.instrumented("tl.calculate_finalScore", count_input=True)
 def calculate_finalScore(data: list):
 
     if not data:
         print(f"{Fore.RED}La lista de municiones está vacía. No hay datos para procesar.")
-        return
+        return data if isinstance(data, AmmoTable) else None
 
     print(f"\n{Fore.CYAN}Análisis, Cálculo y Ordenamiento de Municiones.{Style.RESET_ALL}")
 
-    # --- 1. Procesar y Calcular Campos ---
-    for item in data:
-        # a) Calcular finalScore 
-        if 'finalScore' not in item:
-            try:
-                rawDamage = item.get('damage', 0) * item.get('projectileCount', 1)
-                lethalScore = rawDamage * (1 + item.get('fragmentationChance', 0))
-                penetrationScore = ((item.get('penetrationPower', 0) * 4.0) + (item.get('penetrationChance', 0) * 20)
-                                    - (item.get('penetrationPowerDeviation', 0)))
-                utilityScore = ((item.get('armorDamage', 0) * 1.5) + (item.get('lightBleedModifier', 0) * 50) +
-                                (item.get('heavyBleedModifier', 0) * 75) + (item.get('staminaBurnPerDamage', 0) * 150))
-                handlingScore = (item.get('accuracyModifier', 0) * 200) - (item.get('recoilModifier', 0) * 200)
-                item['finalScore'] = ((penetrationScore * 1.8) + (lethalScore * 0.8) + (utilityScore * 0.5) +
-                                      handlingScore)
-            except TypeError:
-                item['finalScore'] = 0
-
-        # b) Encontrar el buyFor más bajo
-        min_buy = None
-
-        # Usamos 'priceRUB' para comparar y encontrar el precio más bajo en RUB
-        for buy_offer in item.get('buyFor', []):
-            if buy_offer.get('priceRUB'):
-                # Usamos item['buyFor'][0] como un valor inicial si no hay 'min_buy' aún
-                if min_buy is None or buy_offer['priceRUB'] < min_buy['priceRUB']:
-                    min_buy = buy_offer
-
-        # Almacenar solo la información relevante del precio más bajo
-        if min_buy:
+    if isinstance(data, AmmoTable):
+        return _calculate_finalScore_table(data)
+
+    _score_records(data)
+    print(f"{Fore.GREEN}Campos 'finalScore' y 'minBuyPrice' calculados/encontrados.")
+
+    return data
+
+
+def batch_final_scores(items: list[dict]) -> list[float]:
+    """finalScore de un lote de balas (vectorizado, con la vía escalar para las filas raras)."""
+    columns, suspicious = _score_columns(items)
+    scores = compute_final_scores(columns).tolist()
+    # Las filas con campos no numéricos siguen la vía escalar (TypeError -> 0)
+    for index in np.flatnonzero(suspicious).tolist():
+        scores[index] = _score_item(items[index])
+    return scores
+
+
+def _score_records(data: list[dict]) -> list[dict]:
+    """'finalScore' (si falta) y 'minBuyPrice' de una lista de balas, sin mensajes."""
+    # --- 1. Calcular finalScore en bloque (solo las balas que aún no lo tienen) ---
+    pending = [item for item in data if 'finalScore' not in item]
+    if pending:
+        for item, score in zip(pending, batch_final_scores(pending)):
+            item['finalScore'] = score
+
+    # --- 2. Encontrar el buyFor más bajo de cada bala con un argmin vectorizado ---
+    # Usamos 'priceRUB' para comparar; las ofertas sin 'priceRUB' (o a 0) se ignoran
+    buy_lists = [item.get('buyFor') or [] for item in data]
+    offers = list(chain.from_iterable(buy_lists))
+    owners = np.repeat(np.arange(len(data)), [len(offers_of_item) for offers_of_item in buy_lists])
+    prices = np.array([buy_offer.get('priceRUB') or 0 for buy_offer in offers], dtype=np.float64)
+    usable = np.flatnonzero(prices != 0)
+    best = cheapest_offer_index(owners[usable], prices[usable], len(data))
+    # Los índices devueltos son sobre las ofertas útiles; los traducimos a 'offers'
+    best = np.where(best >= 0, usable[best] if len(usable) else -1, -1)
+
+    # Almacenar solo la información relevante del precio más bajo
+    for item, offer_index in zip(data, best.tolist()):
+        if offer_index >= 0:
+            min_buy = offers[offer_index]
             item['minBuyPrice'] = {
                 'price': min_buy.get('price'),
                 'currency': min_buy.get('currency'),
@@ -155,13 +348,141 @@ def calculate_finalScore(data: list):
         else:
             item['minBuyPrice'] = {'price': 'N/A', 'currency': 'N/A', 'source': 'N/A'}
 
+    return data
+
+
+def _calculate_finalScore_table(table: AmmoTable) -> AmmoTable:
+    """Versión columnar de calculate_finalScore: las columnas ya están en arrays."""
+    # --- 1. finalScore (solo las filas que aún no lo tienen) ---
+    columns = {field: table.column(field) for field in SCORE_FIELDS}
+    scores = compute_final_scores(columns)
+    # NaN = valor no numérico en la bala (ver AmmoTable): 0, como el TypeError de _score_item
+    scores[np.isnan(np.column_stack(list(columns.values()))).any(axis=1)] = 0
+    if 'finalScore' in table:
+        current = table.column('finalScore')
+        scores = np.where(np.isnan(current), scores, current)
+    table.set_column('finalScore', scores)
+
+    # --- 2. buyFor más barato (argmin vectorizado sobre las ofertas aplanadas) ---
+    prices = table.trades['buyFor']['priceRUB']
+    usable = np.flatnonzero(prices != 0)
+    best = cheapest_offer_index(table.trade_owners('buyFor')[usable], prices[usable], len(table))
+    table.set_column(MIN_BUY_FIELD, np.where(best >= 0, usable[best] if len(usable) else -1, -1))
+
     print(f"{Fore.GREEN}Campos 'finalScore' y 'minBuyPrice' calculados/encontrados.")
+    return table
 
+
+# --- PERFILES DE PUNTUACIÓN (profiles.py) ---
+
+def profile_features(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """Matriz (balas × profiles.FEATURES) a partir de las columnas de SCORE_FIELDS."""
+    lethal = columns['damage'] * columns['projectileCount'] * (1 + columns['fragmentationChance'])
+    return np.column_stack([lethal if feature == 'lethal' else columns[feature]
+                            for feature in profiles.FEATURES])
+
+
+def profile_score_matrix(columns: dict[str, np.ndarray], suspicious: np.ndarray = None,
+                         profile_weights: dict[str, dict[str, float]] = None) -> np.ndarray:
+    """
+    finalScore de cada bala en cada perfil (balas × perfiles) con un único producto de matrices.
+    Las filas con campos no numéricos puntúan 0, como en _score_item.
+    """
+    weights = np.array(profiles.weight_rows(profile_weights), dtype=np.float64)
+    features = profile_features(columns)
+    bad = np.isnan(features).any(axis=1)
+    if suspicious is not None:
+        bad |= suspicious
+    scores = np.nan_to_num(features) @ weights
+    scores[bad] = 0
+    return scores
+
+
+def profile_fences(scores: np.ndarray) -> np.ndarray:
+    """Valla Q3 + 1.5 * IQR de cada perfil (una por columna)."""
+    if not len(scores):
+        return np.zeros(scores.shape[1])
+    Q1, Q3 = np.percentile(scores, [25, 75], axis=0)
+    return iqr_fence(Q1, Q3)
+
+
+def profile_documents(scores: np.ndarray, fences: np.ndarray, names: list[str] = None) -> list[dict]:
+    """Subdocumento profiles.PROFILE_FIELD de cada bala: {perfil: {finalScore, normalized, tier}}."""
+    names = list(profiles.PROFILES) if names is None else names
+    per_profile = []
+    for col, fence in enumerate(fences.tolist()):
+        values = {'finalScore': scores[:, col].tolist()}
+        if fence != 0:
+            normalized, codes = normalize_scores(scores[:, col], fence)
+            values['normalized'] = normalized.tolist()
+            values['tier'] = [TIER_CODES[code] for code in codes.tolist()]
+        per_profile.append(values)
+    return [{name: {field: values[row] for field, values in profile_values.items()}
+             for name, profile_values in zip(names, per_profile)}
+            for row in range(len(scores))]
+
+
+@metrics.instrumented("tl.score_profiles", count_input=True)
+def score_profiles(data, profile_weights: dict[str, dict[str, float]] = None):
+    """Añade a cada bala el campo profiles.PROFILE_FIELD con todos los perfiles evaluados a la vez."""
+    if not data:
+        return data
+    profile_weights = profiles.PROFILES if profile_weights is None else profile_weights
+
+    if isinstance(data, AmmoTable):
+        columns = {field: data.column(field) for field in SCORE_FIELDS}
+        scores = profile_score_matrix(columns, data.raw_mask(SCORE_FIELDS), profile_weights)
+    else:
+        columns, suspicious = _score_columns(data)
+        scores = profile_score_matrix(columns, suspicious, profile_weights)
+
+    documents = profile_documents(scores, profile_fences(scores), list(profile_weights))
+    if isinstance(data, AmmoTable):
+        data.set_column(profiles.PROFILE_FIELD, documents)
+    else:
+        for item, document in zip(data, documents):
+            item[profiles.PROFILE_FIELD] = document
+    print(f"{Fore.GREEN}Perfiles calculados: {', '.join(profile_weights)}.")
     return data
 
 
+def _print_ammo_table(table: AmmoTable) -> AmmoTable:
+    """Versión columnar de print_ammo: ordena con lexsort y solo decodifica al imprimir."""
+    # Rango alfabético de cada categoría para ordenar igual que con los textos
+    ranks = []
+    for field in ('ammoType', 'caliber'):
+        categories = table.categories[field]
+        rank = np.empty(len(categories), dtype=np.int64)
+        rank[np.argsort(np.array(categories, dtype=object), kind='stable')] = np.arange(len(categories))
+        ranks.append(rank[table.column(field)])
+
+    order = np.lexsort((-table.column('finalScore'), ranks[1], ranks[0]))
+    sorted_table = table.take(order)
+
+    print("\nOrdenado por: Tipo > Calibre > Daño Total (Mayor a Menor)\n")
+    print(f"{'NOMBRE':<30} | {'TIPO':<10} | {'CALIBRE':<15} | {'SCORE TOTAL':>12} | {'PRECIO MÁS BAJO':<20}")
+    print("-" * 90)
+
+    for ammo in sorted_table.iter_records():
+        price_info = ammo['minBuyPrice']
+        price_display = f"{price_info['price']} {price_info['currency']} ({price_info['source']})"
+        print(
+            f"{ammo['name'][:28]:<30} | "
+            f"{ammo['ammoType']:<10} | "
+            f"{ammo['caliber']:<15} | "
+            f"{ammo['tier']:>12} | "
+            f"{price_display:<20}"
+        )
+    print("-" * 90)
+
+    return sorted_table
+
+
 def print_ammo(data: list):
 
+    if isinstance(data, AmmoTable):
+        return _print_ammo_table(data)
+
     # --- 2. Ordenar por Múltiples Criterios (La lógica de ordenamiento no cambia) ---
     sorted_ammo = sorted(
         data,
@@ -196,3 +517,102 @@ def print_ammo(data: list):
     print("-" * 90)
 
     return sorted_ammo
+
+
+# --- MODO STREAMING ---
+# Para volcados que no caben en memoria: las balas pasan por lotes de STREAM_BATCH_SIZE
+# y nunca se materializa la lista completa. La normalización necesita Q1/Q3 de todos
+# los finalScore, así que se hacen dos pasadas sobre el origen: la primera solo calcula
+# los scores y los resume en un QuantileSketch; la segunda limpia, puntúa y asigna
+# 'normalized' y 'tier' según van saliendo las balas (p. ej. hacia upload_to_mongodb_2).
+STREAM_BATCH_SIZE = 1024
+
+
+def _batches(records, size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_clean_caliber_data(records):
+    """Generador: versión de clean_caliber_data bala a bala."""
+    for item in records:
+        _clean_caliber(item)
+        yield item
+
+
+def iter_final_scores(records, batch_size: int = STREAM_BATCH_SIZE):
+    """Generador: versión de calculate_finalScore que puntúa por lotes de 'batch_size'."""
+    for batch in _batches(records, batch_size):
+        yield from _score_records(batch)
+
+
+def stream_score_fence(records, batch_size: int = STREAM_BATCH_SIZE,
+                       compression: int = DEFAULT_COMPRESSION) -> tuple[float, QuantileSketch, np.ndarray]:
+    """
+    Primera pasada: valla Q3 + 1.5 * IQR de los finalScore, con memoria acotada.
+    Retorna (valla, sketch de los finalScore, vallas de cada perfil de profiles.PROFILES).
+    """
+    sketch = QuantileSketch(compression)
+    profile_sketches = [QuantileSketch(compression) for _ in profiles.PROFILES]
+    with metrics.stage("tl.stream_score_fence"):
+        for batch in _batches(records, batch_size):
+            # Como en _score_records: solo se puntúan las balas que aún no tienen finalScore
+            pending = [item for item in batch if 'finalScore' not in item]
+            sketch.update([item['finalScore'] for item in batch if 'finalScore' in item])
+            if pending:
+                sketch.update(batch_final_scores(pending))
+            columns, suspicious = _score_columns(batch)
+            scores = profile_score_matrix(columns, suspicious)
+            for col, profile_sketch in enumerate(profile_sketches):
+                profile_sketch.update(scores[:, col])
+        metrics.count("records", len(sketch))
+    Q1, Q3 = sketch.quantiles((0.25, 0.75))
+    fences = np.array([iqr_fence(*profile_sketch.quantiles((0.25, 0.75))) if len(profile_sketch) else 0.0
+                       for profile_sketch in profile_sketches])
+    return iqr_fence(Q1, Q3), sketch, fences
+
+
+def stream_normalized(open_records, batch_size: int = STREAM_BATCH_SIZE,
+                      compression: int = DEFAULT_COMPRESSION):
+    """
+    Generador con el pipeline completo (limpieza, finalScore, minBuyPrice, normalized, tier,
+    perfiles y simulación contra blindaje) en streaming. 'open_records' es una función sin argumentos que devuelve un
+    iterable nuevo con los registros cada vez que se llama (p. ej. crypt.iter_decrypted_records).
+    Cada bala sale con los mismos campos y en el mismo orden que en el pipeline en memoria
+    (calculate_finalScore, score_profiles, simulate_armor y normalize_and_update_scores).
+
+    Error: las vallas salen de un QuantileSketch. Con menos de 10 * 'compression' balas
+    (2000 por defecto) no se comprime nada y el resultado es idéntico al del pipeline en
+    memoria. Por encima, el error relativo de cada valla queda por debajo del 0.2% con
+    compression=200, así que 'normalized' (general y de cada perfil) puede desviarse hasta
+    normalized * 0.002 (+0.1 por el redondeo) y 'tier' solo cambia en balas que quedan a esa
+    distancia de un umbral de TIER_THRESHOLDS. finalScore, minBuyPrice y la simulación son exactos.
+    """
+    max_score, sketch, fences = stream_score_fence(open_records(), batch_size, compression)
+    normalize = bool(len(sketch)) and max_score != 0
+    if normalize:
+        print(f"Normalizando datos en streaming ({len(sketch)} balas, "
+              f"Puntaje Máximo de Referencia: {max_score:.2f})")
+    else:
+        print("Advertencia: El puntaje máximo es 0. No se puede normalizar.")
+
+    # Sin etapa de métricas propia: este tramo corre dentro de la etapa de quien consume
+    sim_cache = armor_sim.load_cache()
+    for batch in _batches(iter_clean_caliber_data(open_records()), batch_size):
+        columns, suspicious = _score_columns(batch)
+        documents = profile_documents(profile_score_matrix(columns, suspicious), fences)
+        # Mismo orden de pasos (y de claves) que el pipeline en memoria
+        for bullet, document in zip(_score_records(batch), documents):
+            bullet[profiles.PROFILE_FIELD] = document
+        armor_sim.simulate_armor(batch, sim_cache)
+        for bullet in batch:
+            if normalize:
+                _normalize_bullet(bullet, max_score)
+            yield bullet
+    armor_sim.save_cache(sim_cache)
@@ -1,22 +1,309 @@
+import argparse
+import json
+import os
+import random
+import signal
+import threading
+import time
+from datetime import datetime, timezone
 import e
-import tl
 import crypt
 import mondongo
+import metrics
+# tl y ammo_table (numpy) solo hacen falta al procesar datos: se importan ahí
 
+try:
+    import fcntl  # Bloqueo entre procesos (no existe en Windows)
+except ImportError:
+    fcntl = None
 
-def update_database():
+# --- MODO DAEMON (update.py --daemon) ---
+UPDATE_INTERVAL = float(os.environ.get("UPDATE_INTERVAL", "300"))  # Segundos entre ejecuciones
+UPDATE_JITTER = float(os.environ.get("UPDATE_JITTER", "30"))       # Variación aleatoria (+-) del intervalo
+STATUS_FILE = os.environ.get("UPDATE_STATUS_FILE", "update_status.json")
+LOCK_FILE = os.environ.get("UPDATE_LOCK_FILE", "update.lock")
+UPDATE_BUSY = "busy"  # Otra ejecución de update_database sigue en marcha
+
+
+def _process_snapshot() -> str:
+    """
+    Pipeline completo sobre 'ade.bin': limpieza, scores, normalización y smart update.
+
+    Con el estado de la ejecución anterior (normalizer.py) solo se re-normalizan las balas
+    necesarias y solo se envían a Mongo las que cambiaron. Si Mongo tiene otra versión de
+    datos que la que dejamos, el estado no vale y se compara todo.
+    """
+    import numpy as np
+    import tl
+    import normalizer
+    import profiles
+    import armor_sim
+    from ammo_table import AmmoTable
 
-    print("UPDATING DATABASE WITH SMART UPDATE...")
-    e.fetch_and_save_ammo_data()
     # crypt.encrypt_and_cleanup()
-    data = crypt.load_and_decrypt_data()
+    records = crypt.load_and_decrypt_data()
+    source_hashes = {item.get("id"): mondongo.content_hash(item) for item in records}
+    data = AmmoTable.from_records(records)
     data = tl.clean_caliber_data(data)
     data = tl.calculate_finalScore(data)
-    data = tl.normalize_and_update_scores(data)
+    data = tl.score_profiles(data)
+    data = armor_sim.simulate_armor(data)
+
+    db = mondongo.get_db()
+    state = normalizer.load_state()
+    if state and state.get("data_version") != mondongo.get_data_version(db):
+        print("NORMALIZER STATE OUT OF DATE, FULL COMPARISON")
+        state = None
+    # Hash de todo lo que llega al documento aparte de finalScore/normalized/tier: el
+    # registro de origen, los perfiles (cuyas vallas se mueven por su cuenta) y la simulación
+    derived = (profiles.PROFILE_FIELD,) + armor_sim.SIM_FIELDS
+    row_hashes = [mondongo.content_hash({"source": source_hashes.get(item_id), **dict(zip(derived, values))})
+                  for item_id, *values in zip(data.column("id"), *(data.column(field) for field in derived))
+                  ] if len(data) else []
+    data, dirty, new_state, summary = normalizer.normalize_incremental(data, row_hashes, state)
+    print(f"NORMALIZED: {summary}")
+
     print(f"UPDATINGMONGO")
-    mondongo.smart_update_mongodb_2(data)
+    if state is None:
+        results = mondongo.smart_update_mongodb_2(data)
+    elif dirty.any():
+        results = mondongo.smart_update_mongodb_2(data.take(np.flatnonzero(dirty)), partial=True)
+    else:
+        results = {"estado": "Éxito"}
+    if results.get("estado") == "ERROR":
+        # Si Mongo no se actualizó, la próxima ejecución no debe saltarse estos datos
+        print(f"MONGO UPDATE FAILED: {results.get('mensaje')}")
+        crypt.clear_fingerprint()
+        normalizer.clear_state()
+        return e.FETCH_ERROR
+    # Sin estado (primera vez o tras un error) la vista de la web se rehace entera
+    if not _refresh_view(None if state is None else results.get("grupos_afectados", [])):
+        return e.FETCH_ERROR
+    new_state["data_version"] = mondongo.get_data_version(db)
+    normalizer.save_state(new_state)
+    return e.FETCH_OK
+
+
+def _refresh_view(groups) -> bool:
+    """
+    Reconstruye la vista de la web (mondongo.refresh_view) para 'groups' (None = entera).
+    Si falla, olvida el estado del normalizador y la huella de la descarga: la próxima
+    ejecución compara todo y la rehace entera.
+    """
+    import normalizer
+
+    view = mondongo.refresh_view(groups)
+    if view.get("estado") == "ERROR":
+        print(f"VIEW UPDATE FAILED: {view.get('mensaje')}")
+        crypt.clear_fingerprint()
+        normalizer.clear_state()
+        return False
+    return True
+
+
+def update_prices() -> str:
+    """
+    Refresco ligero: solo precios. finalScore, normalized y tier no dependen del precio,
+    así que solo se recalcula 'minBuyPrice' de las balas cuyas ofertas cambiaron.
+    """
+    status, changed, merged = e.fetch_prices()
+    if status != e.FETCH_OK:
+        return status
+
+    import tl
+    from ammo_table import AmmoTable
+
+    data = tl.calculate_finalScore(AmmoTable.from_records(changed))
+    version_before = mondongo.get_data_version(mondongo.get_db())
+    results = mondongo.update_prices_mongodb(data)
+    if results.get("estado") == "ERROR":
+        # El snapshot se queda con los precios anteriores: la próxima ejecución vuelve
+        # a ver estas balas como cambiadas y reintenta la escritura
+        print(f"MONGO UPDATE FAILED: {results.get('mensaje')}")
+        crypt.clear_fingerprint()
+        return e.FETCH_ERROR
+    e.save_prices(merged)
+    # La escritura de precios cambia la versión de datos: el estado de la normalización
+    # sigue valiendo (los precios no influyen en ella)
+    _restamp_normalizer_state(version_before)
+    if not _refresh_view(results["grupos_afectados"]):
+        return e.FETCH_ERROR
+    if results["ids_faltantes"]:
+        # Mongo no tiene alguna de estas balas: el snapshot sí, pasamos el pipeline completo
+        print(f"{len(results['ids_faltantes'])} BULLETS MISSING IN MONGO, PROCESSING FULL SNAPSHOT")
+        return _process_snapshot()
+    return status
+
+
+def _restamp_normalizer_state(version_before: int):
+    """
+    Marca el estado de normalizer.py con la versión de datos actual de Mongo, solo si
+    estaba al día antes de escribir los precios ('version_before').
+    """
+    import normalizer
+
+    state = normalizer.load_state()
+    if state and state.get("data_version") == version_before:
+        state["data_version"] = mondongo.get_data_version(mondongo.get_db())
+        normalizer.save_state(state)
+
+
+def update_database(mode: str = "auto") -> str:
+    """
+    mode: 'full' (consulta completa con stats), 'prices' (solo precios) o 'auto'
+    (completa si han pasado STATS_REFRESH_INTERVAL segundos desde la última, si no precios).
+    """
+    print("UPDATING DATABASE WITH SMART UPDATE...")
+    mondongo.ensure_indexes()
+
+    if mode == "prices" or (mode == "auto" and not e.full_refresh_due()):
+        status = update_prices()
+        if status != e.FETCH_NEEDS_FULL:
+            print("ALL DONE!")
+            return status
+        print("PRICE REFRESH NOT POSSIBLE, RUNNING FULL UPDATE")
+
+    status = e.fetch_and_save_ammo_data()
+    if status == e.FETCH_NO_CHANGE:
+        # Misma respuesta que en la ejecución anterior: Mongo ya está al día
+        print("NO CHANGES UPSTREAM, SKIPPING UPDATE")
+        return e.FETCH_NO_CHANGE
+    if _process_snapshot() == e.FETCH_ERROR:
+        return e.FETCH_ERROR
     print("ALL DONE!")
+    return status
+
+
+def run_exclusive(mode: str = "auto", lock_file: str = LOCK_FILE) -> str:
+    """
+    update_database() sin solapes: si otra ejecución (de este u otro proceso) tiene
+    el bloqueo, no hace nada y retorna UPDATE_BUSY.
+    """
+    with open(lock_file, "a") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("ANOTHER UPDATE IS RUNNING, SKIPPING")
+                return UPDATE_BUSY
+        # Informe de métricas de esta ejecución (metrics.py), solo si de verdad se ejecuta
+        metrics.start_run(mode)
+        status = e.FETCH_ERROR
+        try:
+            status = update_database(mode)
+            return status
+        finally:
+            metrics.finish_run(status)
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_status(status: dict, status_file: str = STATUS_FILE):
+    """Escribe el estado del daemon de forma atómica (nunca queda un JSON a medias)."""
+    tmp = f"{status_file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp, status_file)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def run_daemon(mode: str = "auto", interval: float = UPDATE_INTERVAL, jitter: float = UPDATE_JITTER,
+               status_file: str = STATUS_FILE):
+    """
+    Proceso residente: ejecuta update_database cada 'interval' +- 'jitter' segundos,
+    manteniendo caliente la sesión HTTP y el pool de MongoDB entre ciclos.
+    SIGTERM/SIGINT terminan el ciclo en curso y salen limpiamente.
+    """
+    import fetch_client
+    import mongo_client
+
+    stop = threading.Event()
+
+    def _request_stop(signum, frame):
+        print(f"SIGNAL {signal.Signals(signum).name} RECEIVED, STOPPING AFTER CURRENT RUN")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    status = {"state": "starting", "pid": os.getpid(), "started_at": _now(), "mode": mode,
+              "interval": interval, "runs": 0, "failures": 0, "last_run": None, "next_run_at": None}
+    write_status(status, status_file)
+    print(f"UPDATE DAEMON STARTED (interval {interval:.0f}s +- {jitter:.0f}s, mode {mode})")
+
+    try:
+        while not stop.is_set():
+            status["state"] = "running"
+            write_status(status, status_file)
+
+            started = time.time()
+            last_run = {"started_at": _now(), "started_at_ts": started}
+            try:
+                last_run["status"] = run_exclusive(mode)
+            except Exception as error:  # Un ciclo fallido no debe tumbar el daemon
+                print(f"UPDATE FAILED: {error!r}")
+                last_run.update(status=e.FETCH_ERROR, error=repr(error))
+            finished = time.time()
+            last_run.update(finished_at=_now(), finished_at_ts=finished, duration_s=round(finished - started, 3))
+
+            status["runs"] += 1
+            status["failures"] += last_run["status"] == e.FETCH_ERROR
+            status["last_run"] = last_run
+
+            delay = max(0.0, interval + random.uniform(-jitter, jitter) - (finished - started))
+            status.update(state="idle", next_run_at=datetime.fromtimestamp(finished + delay, timezone.utc).isoformat())
+            write_status(status, status_file)
+            print(f"UPDATE STATUS: {last_run['status']} (next run in {delay:.0f}s)")
+            stop.wait(delay)
+    finally:
+        status.update(state="stopped", next_run_at=None, stopped_at=_now())
+        write_status(status, status_file)
+        fetch_client.close_session()
+        mongo_client.close_client()
+        print("UPDATE DAEMON STOPPED")
+
+
+def check_health(status_file: str = STATUS_FILE, max_age: float = None) -> bool:
+    """
+    True si el daemon está vivo y su última ejecución terminó hace menos de 'max_age'
+    segundos (por defecto, 3 intervalos). Pensado para el healthcheck de Docker.
+    """
+    try:
+        with open(status_file, "r", encoding="utf-8") as f:
+            status = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    if status.get("state") == "stopped":
+        return False
+    if status.get("state") in ("starting", "running") and not status.get("last_run"):
+        return True  # Primera ejecución aún en curso
+    max_age = max_age if max_age is not None else 3 * status.get("interval", UPDATE_INTERVAL)
+    last_run = status.get("last_run") or {}
+    return time.time() - last_run.get("finished_at_ts", 0) < max_age
 
 
 if __name__ == "__main__":
-    update_database()
+    parser = argparse.ArgumentParser(description="Actualiza MongoDB con los datos de tarkov.dev.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--full", dest="mode", action="store_const", const="full",
+                       help="Fuerza la consulta completa (stats + precios).")
+    group.add_argument("--prices", dest="mode", action="store_const", const="prices",
+                       help="Solo precios (si no es posible, hace la consulta completa).")
+    parser.set_defaults(mode="auto")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Se queda residente y actualiza cada UPDATE_INTERVAL +- UPDATE_JITTER segundos.")
+    parser.add_argument("--interval", type=float, default=UPDATE_INTERVAL)
+    parser.add_argument("--jitter", type=float, default=UPDATE_JITTER)
+    parser.add_argument("--health", action="store_true",
+                        help="Sale con código 0 si el daemon está sano según su fichero de estado.")
+    args = parser.parse_args()
+
+    if args.health:
+        raise SystemExit(0 if check_health() else 1)
+    if args.daemon:
+        run_daemon(args.mode, args.interval, args.jitter)
+    else:
+        print(f"UPDATE STATUS: {run_exclusive(args.mode)}")